@@ -0,0 +1,186 @@
+# Universal Control Server - Request body parsing
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""\
+Request body parsing for the UCServer library.
+
+This module contains a small single-pass XML extractor used by the resource
+handlers to read the bodies of PUT and POST requests. Rather than building a
+full document tree the caller declares which elements (and which attributes of
+those elements) it is interested in, and the extractor records only those as
+the document is parsed by expat. Everything else in the document is checked
+for well-formedness and then discarded.
+
+The extractor enforces a limit on the size of the document and on the depth
+to which elements may be nested, and rejects documents containing a DTD (and
+so any entity declarations). Any failure is reported by raising
+UCServer.Exceptions.InvalidSyntax.
+
+It is unlikely that a server implementor will need to use this module
+directly, although implementors of out of tree resources may find the
+method UCResourceHandler.extract_body (which uses it) convenient.
+"""
+
+__version__ = "0.6.0"
+
+__all__ = ["ExtractedElement",
+           "ExtractedBody",
+           "extract",
+           ]
+
+#Standard Python imports
+import xml.parsers.expat
+
+#imports from elsewhere in this package
+from Exceptions import InvalidSyntax, RequestTooLarge
+
+
+# The default limits applied to documents by extract
+MAX_SIZE  = 64*1024
+MAX_DEPTH = 16
+
+
+class ExtractedElement(object):
+    """This class holds a single element found by the extractor. It has three members:
+
+      name       -- the (qualified) name of the element.
+      attributes -- a dictionary of those of the element's attributes which were declared for extraction
+                    and were present on the element, as unicode strings.
+      parent     -- the closest ancestor of the element which was itself declared for extraction, or None
+                    if there is no such ancestor.
+    """
+
+    __slots__ = ('name','attributes','parent')
+
+    def __init__(self, name, attributes, parent):
+        self.name       = name
+        self.attributes = attributes
+        self.parent     = parent
+
+    def has(self, key):
+        """Returns True if the element had the named attribute."""
+        return key in self.attributes
+
+    def get(self, key, default=None):
+        """Returns the value of the named attribute, or default if the element did not have it."""
+        return self.attributes.get(key, default)
+
+    def within(self, ancestor):
+        """Returns True if the given ExtractedElement is an ancestor of this one."""
+        parent = self.parent
+        while parent is not None:
+            if parent is ancestor:
+                return True
+            parent = parent.parent
+        return False
+
+
+class ExtractedBody(object):
+    """This class holds the result of a call to extract. Declared elements which were found in the document
+    can be retrieved, in document order, with the method elements."""
+
+    __slots__ = ('found',)
+
+    def __init__(self):
+        self.found = dict()
+
+    def elements(self, name, within=None):
+        """Returns a list of the extracted elements with the given name, in document order. If within is
+        an ExtractedElement then only those elements which are descendants of it are returned."""
+        found = self.found.get(name, [])
+        if within is None:
+            return list(found)
+        return [ element for element in found if element.within(within) ]
+
+
+def extract(body, declarations, max_size=MAX_SIZE, max_depth=MAX_DEPTH):
+    """This function parses the string body as an XML document in a single pass and returns an ExtractedBody
+    containing the elements declared in declarations.
+
+    The parameter declarations should be a dictionary-like object of the form:
+
+          { ELEMENT NAME AS STRING : ( ATTRIBUTE NAME AS STRING,
+                                       ... ),
+            ...
+          }
+
+    Only the listed attributes are recorded for each element. RequestTooLarge is raised if the document is longer
+    than max_size bytes, and InvalidSyntax if it is not well-formed, nests elements more than max_depth deep, or
+    contains a DTD.
+    """
+
+    if len(body) > max_size:
+        raise RequestTooLarge("Request body too large")
+
+    result = ExtractedBody()
+    stack  = []  # one entry per open element: the closest declared ExtractedElement (or None)
+
+    def start_element(name, attrs):
+        if len(stack) >= max_depth:
+            raise InvalidSyntax("XML nested too deeply")
+
+        parent = stack[-1] if stack else None
+        if name in declarations:
+            element = ExtractedElement(name,
+                                       dict([ (key, attrs[key]) for key in declarations[name] if key in attrs ]),
+                                       parent)
+            result.found.setdefault(name, []).append(element)
+            stack.append(element)
+        else:
+            stack.append(parent)
+
+    def end_element(name):
+        stack.pop()
+
+    def reject_dtd(*args):
+        raise InvalidSyntax("DTDs are not permitted")
+
+    parser = xml.parsers.expat.ParserCreate()
+    parser.StartElementHandler     = start_element
+    parser.EndElementHandler       = end_element
+    parser.StartDoctypeDeclHandler = reject_dtd
+    parser.EntityDeclHandler       = reject_dtd
+
+    try:
+        parser.Parse(body, True)
+    except InvalidSyntax:
+        raise
+    except:
+        raise InvalidSyntax("Could not parse XML")
+
+    return result
@@ -0,0 +1,198 @@
+# Universal Control Server - Search result caching
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+
+"""\
+Search result caching for the UCServer library.
+
+This module contains the cache which the 'uc/search' resources place in
+front of the content object set by the server implementor. Clients on the
+same network often make identical searches within a few seconds of each
+other (such as "now and next" on every channel), and these are answered from
+the cache rather than by asking the content object again.
+
+Entries are keyed on the resource searched and the normalised parameters of
+the search. Searches which did not give an explicit 'start' (and so search
+from the current time) are keyed on a "now" bucket of a fixed length instead,
+so that all such searches in the same bucket share an entry. Entries expire
+after a short time, the cache holds a bounded number of them, and concurrent
+identical searches which miss the cache wait for a single call to the content
+object rather than each making their own. Results which the content object
+marks as incomplete (a list returned with more results but a continuation of
+None) are handed to the searches waiting for them but are not stored.
+
+The server implementor should call UCServer.UCServer.content_changed whenever
+the programmes it serves change, which empties the cache.
+
+It is unlikely that a server implementor will need to use this module
+directly.
+"""
+
+__version__ = "0.6.0"
+
+__all__ = ["SearchCache",
+           "TTL",
+           "MAX_ENTRIES",
+           "NOW_BUCKET",
+           ]
+
+#Standard Python imports
+import threading
+import collections
+import datetime
+import time
+
+
+# The default lifetime of an entry in seconds, number of entries kept, and length of the "now" bucket in seconds
+TTL         = 30
+MAX_ENTRIES = 256
+NOW_BUCKET  = 60
+
+
+class Flight(object):
+    """A call to the content object which is in progress, and which other threads may wait for."""
+
+    __slots__ = ('done', 'result')
+
+    def __init__(self):
+        self.done   = threading.Event()
+        self.result = None
+
+
+class SearchCache:
+    """This class holds the results of recent searches.
+
+    Results are held in the form returned by the methods of the content object (a list of tuples of a list of
+    programmes and a boolean), but without any continuations, since a continuation can only be used by a
+    single request.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, ttl=TTL, max_entries=MAX_ENTRIES, now_bucket=NOW_BUCKET):
+        self.ttl         = ttl
+        self.max_entries = max_entries
+        self.now_bucket  = now_bucket
+        self.lock        = threading.Lock()
+        self.entries     = collections.OrderedDict()  # key -> (expiry time, results)
+        self.flights     = dict()                     # key -> Flight
+        self.generation  = 0
+
+    def key(self, resource, params, explicit_start=True):
+        """Returns the key for a search of the given resource with the given parameters (as returned by
+        UCSearchResourceHandler.parse_query). If explicit_start is False then the search's start time is replaced
+        by the current "now" bucket."""
+
+        def normalise(value):
+            if isinstance(value, list):
+                return tuple([ normalise(v) for v in value ])
+            if isinstance(value, datetime.datetime):
+                return value.isoformat()
+            return value
+
+        items = [ (k, normalise(params[k])) for k in params if k not in ('cursor', 'start') ]
+        if explicit_start:
+            items.append(('start', normalise(params['start'])))
+        else:
+            items.append(('now', int(time.time()) // self.now_bucket))
+
+        return (resource, tuple(sorted(items)))
+
+    def get(self, key, compute):
+        """Returns the results stored for the given key, or if there are none calls compute (with no parameters) to
+        get them, stores them and returns them. If another thread is already computing the results for the same key
+        then this waits for it instead (and computes them itself should the other thread fail).
+
+        Results returned from the cache have no continuations, but the thread which calls compute is given its
+        results exactly as compute returned them."""
+
+        with self.lock:
+            self.__expire()
+            entry = self.entries.pop(key, None)
+            if entry is not None and entry[0] > time.time():
+                self.entries[key] = entry
+                return entry[1]
+
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+            generation = self.generation
+
+        if not leader:
+            flight.done.wait()
+            if flight.result is not None:
+                return flight.result
+            return compute()
+
+        try:
+            results = compute()
+            flight.result = self.__strip(results)
+        finally:
+            with self.lock:
+                del self.flights[key]
+                if flight.result is not None and generation == self.generation and self.__complete(results):
+                    self.entries[key] = (time.time() + self.ttl, flight.result)
+                    while len(self.entries) > self.max_entries:
+                        self.entries.popitem(last=False)
+            flight.done.set()
+
+        return results
+
+    def invalidate(self):
+        """Discards every entry. Results being computed when this is called are returned to their callers but
+        not stored."""
+        with self.lock:
+            self.entries.clear()
+            self.generation += 1
+
+    def __strip(self, results):
+        return [ tuple(result[:2]) for result in results ]
+
+    def __complete(self, results):
+        return not any([ (len(result) > 2 and result[1] and result[2] is None) for result in results ])
+
+    def __expire(self):
+        """Must be called with the lock held. Entries which have been moved to the end by a lookup may outlive
+        this, so lookups must check the expiry time too."""
+        now = time.time()
+        while self.entries:
+            key = next(iter(self.entries))
+            if self.entries[key][0] > now:
+                break
+            del self.entries[key]
@@ -0,0 +1,151 @@
+# Universal Control Server - Search result cursors
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+
+"""\
+Search result cursors for the UCServer library.
+
+This module contains the cache used by the 'uc/search' resources to let a
+client page through a long list of results without the server regenerating
+(and discarding) every earlier result for each page, as happens when paging
+with the 'offset' parameter.
+
+When a content source returns a continuation along with a page of results
+(see the documentation of UCServer.UCServer.set_content) the server stores it
+in a CursorCache and returns an opaque token in the 'cursor' attribute of the
+<results> element. A client which passes that token back as the 'cursor'
+parameter of the same search gets the next page directly from the stored
+continuation.
+
+Cursors are short lived, the cache holds a bounded number of them, and each
+one can only be resumed once. Every token also encodes the offset of the page
+it refers to, so a request with a cursor which has expired (or been used, or
+been evicted) is answered as if it had given that offset instead. Results
+which come without continuations (such as those answered from the search
+cache) are given a token made by CursorCache.token, which is never stored
+and so is always answered in this way.
+
+It is unlikely that a server implementor will need to use this module
+directly.
+"""
+
+__version__ = "0.6.0"
+
+__all__ = ["CursorCache",
+           "TTL",
+           "MAX_CURSORS",
+           ]
+
+#Standard Python imports
+import threading
+import collections
+import random
+import time
+import re
+
+#imports from elsewhere in this package
+from Exceptions import InvalidSyntax
+
+
+# The default lifetime of a cursor in seconds, and number of cursors kept
+TTL         = 60
+MAX_CURSORS = 64
+
+TOKEN_PATTERN = re.compile(r'^([0-9a-f]{16})-([0-9]+)$')
+
+
+class CursorCache:
+    """This class holds the continuations of recent searches, keyed by opaque tokens. Each entry holds a key
+    identifying the search (so that a cursor cannot be used to resume a different search), the offset of the
+    next page and the continuation itself, which may be any object.
+
+    Entries are discarded once they are older than ttl seconds, and the least recently stored entries are
+    discarded when there are more than max_cursors.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, ttl=TTL, max_cursors=MAX_CURSORS):
+        self.ttl         = ttl
+        self.max_cursors = max_cursors
+        self.lock        = threading.Lock()
+        self.entries     = collections.OrderedDict()  # token -> (expiry time, search key, continuation)
+
+    def store(self, key, offset, continuation):
+        """Stores a continuation for the search identified by key, whose next page begins at the given offset,
+        and returns the token for it."""
+        token = self.token(offset)
+
+        with self.lock:
+            self.__expire()
+            self.entries[token] = (time.time() + self.ttl, key, continuation)
+            while len(self.entries) > self.max_cursors:
+                self.entries.popitem(last=False)
+
+        return token
+
+    def token(self, offset):
+        """Returns a new token for a page beginning at the given offset, without storing anything for it."""
+        return '%016x-%d' % (random.getrandbits(64), offset)
+
+    def resume(self, token, key):
+        """Returns a tuple of the offset encoded in the token and the continuation stored for it, removing it from
+        the cache. The continuation is None if the cursor has expired or was stored for a search other than the
+        one identified by key, in which case the cursor is left for that search. Raises InvalidSyntax if the token is malformed."""
+        match = TOKEN_PATTERN.match(token)
+        if match is None:
+            raise InvalidSyntax, "Malformed cursor"
+        offset = int(match.group(2))
+
+        with self.lock:
+            self.__expire()
+            entry = self.entries.get(token)
+            if entry is None or entry[1] != key:
+                return (offset, None)
+            del self.entries[token]
+
+        return (offset, entry[2])
+
+    def __expire(self):
+        """Must be called with the lock held."""
+        now = time.time()
+        while self.entries:
+            token = next(iter(self.entries))
+            if self.entries[token][0] > now:
+                break
+            del self.entries[token]
@@ -71,7 +71,9 @@ __version__ = "0.6.0"
 __all__ = ["InvalidSyntax",
            "CannotFind",
            "ProcessingFailed",
-           "NotImplemented"]
+           "NotImplemented",
+           "RequestTooLarge",
+           "ServiceUnavailable"]
 
 class UCException(Exception):
     """This class defines an exception which will cause a specified HTTP error to be returned
@@ -120,3 +122,17 @@ class NotImplemented(UCException):
     
 
 
+
+class RequestTooLarge(UCException):
+    """This exception can be raised to cause the currently processing request to return a
+    413 status.
+    """
+    name = 'Request Entity Too Large'
+    code = 413
+
+class ServiceUnavailable(UCException):
+    """This exception can be raised to cause the currently processing request to return a
+    503 status.
+    """
+    name = 'Service Unavailable'
+    code = 503
@@ -0,0 +1,321 @@
+# Universal Control Server - Precomputed indexes
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""\
+Precomputed indexes for the UCServer library.
+
+This module contains classes which the server uses to hold derived views of
+the dictionary-like data sources handed to it by the server implementor, so
+that the resource handlers do not have to recompute them on every request.
+Each index is built from the data source when it is set on the UCServer
+instance and rebuilt when the implementor reports that the data has changed.
+
+It is unlikely that a server implementor will need to use this module
+directly.
+"""
+
+__version__ = "0.6.0"
+
+__all__ = ["CategoryIndex",
+           "SourceListIndex",
+           ]
+
+#Standard Python imports
+import xml.sax.saxutils as saxutils
+import threading
+import bisect
+
+
+class CategoryIndex:
+    """This class holds an immutable index of a categories data source (in the format described in the
+    documentation of UCServer.UCServer.set_categories).
+
+    Once constructed the index is never modified, so the server replaces the whole object when the categories
+    change. This means that request threads which have already picked up a reference to the old index can
+    carry on using it safely. The index holds:
+
+      children -- a dictionary mapping each CATEGORY-ID (and the root, '') to a tuple of the CATEGORY-IDs
+                  of its children, in the order they appear in the data source.
+      leaves   -- a dictionary mapping each CATEGORY-ID to a frozenset of the CATEGORY-IDs of the leaf
+                  categories beneath it (a leaf category maps to a set containing only itself).
+      api_ids  -- a frozenset of those CATEGORY-IDs which are used in the API (ie. have a 'category-id').
+      content  -- the pre-rendered contents of the <categories> element returned by 'uc/categories'.
+    """
+
+    def __init__(self, categories):
+        children = dict()
+        for catid in categories:
+            parent = categories[catid]['parent'] if 'parent' in categories[catid] else None
+            children.setdefault(parent, []).append(catid)
+            children.setdefault(catid, [])
+
+        self.children = dict([ (catid, tuple(children[catid])) for catid in children ])
+        self.api_ids  = frozenset([ catid for catid in categories if 'category-id' in categories[catid] ])
+        self.leaves   = self.__leaf_closure(categories)
+        self.content  = self.__render(categories)
+
+    def descendant_leaves(self, catid):
+        """Returns a frozenset of the leaf categories beneath the given category, or raises a KeyError if
+        the category is not in the index."""
+        return self.leaves[catid]
+
+    def __leaf_closure(self, categories):
+        """Computes the leaf-descendant set of every node in a single post-order walk of the tree. Nodes
+        which are caught in a cycle of parent references are treated as leaves rather than looping forever."""
+
+        leaves = dict()
+        for root in categories:
+            if root in leaves:
+                continue
+
+            stack = [ (root, False) ]
+            visiting = set()
+            while stack:
+                (catid, expanded) = stack.pop()
+                if catid in leaves:
+                    continue
+                if expanded:
+                    visiting.discard(catid)
+                    kids = [ kid for kid in self.children[catid] if kid in leaves ]
+                    if not kids:
+                        leaves[catid] = frozenset((catid,))
+                    else:
+                        leaves[catid] = frozenset().union(*[ leaves[kid] for kid in kids ])
+                else:
+                    visiting.add(catid)
+                    stack.append((catid, True))
+                    for kid in self.children[catid]:
+                        if kid not in leaves and kid not in visiting:
+                            stack.append((kid, False))
+
+        return leaves
+
+    def __render(self, categories):
+        """Renders the contents of the <categories> element for the tree rooted at ''. The returned string is
+        in the same form that the UCCategoriesResourceHandler places directly after the element name, ie. either
+        '/' or '>...</categories'."""
+
+        def render_branch(branch, seen):
+            attributes = ''
+            for key in ('logo-href','category-id'):
+                if key in categories[branch] and isinstance(categories[branch][key],basestring):
+                    attributes += ' %s="%s"' % (key, saxutils.escape(str(categories[branch][key])))
+
+            branchcontent = render_children(branch, seen | set((branch,)))
+            if branchcontent != '/':
+                branchcontent = '>%s</category' % branchcontent
+
+            return '<category name="%(name)s"%(attributes)s%(content)s>' % { 'name'       : saxutils.escape(str(categories[branch]['name'])),
+                                                                              'attributes' : attributes,
+                                                                              'content'    : branchcontent }
+
+        def render_children(root, seen):
+            branches = [ branch for branch in self.children.get(root, ()) if branch not in seen ]
+            if not branches:
+                return '/'
+            return ''.join([ render_branch(branch, seen) for branch in branches ])
+
+        content = render_children('', set())
+        if content != '/':
+            content = '>%s</categories' % content
+        return content
+
+
+class SourceListIndex:
+    """This class holds an index of the sources in each source list (in the formats described in the
+    documentation of UCServer.UCServer.set_source_lists and UCServer.UCServer.set_sources), kept sorted by
+    logical channel number.
+
+    For each list the index keeps a deduplicated tuple of sids in the order in which they should be
+    returned: sorted by 'lcn' (sources without one sort as -1) with ties left in the order in which they
+    appear in the list. Sorting keys are of the form (lcn, seq, sid) where seq is a counter assigned when
+    the sid is first seen in the list, so sids appended to the end of a list can be placed with a binary
+    search rather than a full sort.
+
+    The index keeps a snapshot of each list's 'sources' member and compares it on every lookup, so lists
+    which are altered in place without notification are still returned correctly. Changes to the 'lcn' of
+    a source cannot be seen this way, so the method source_changed must be called for those (this is
+    done by UCServer.UCServer.sources_changed).
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, source_lists, sources):
+        self.source_lists = source_lists
+        self.sources      = sources
+        self.lock         = threading.Lock()
+
+        self.snapshots = dict()  # list id -> tuple of the list's 'sources' when last indexed
+        self.keys      = dict()  # list id -> sorted list of (lcn, seq, sid)
+        self.entries   = dict()  # list id -> dictionary of sid -> (lcn, seq, sid)
+        self.orders    = dict()  # list id -> tuple of sids in order
+        self.lists_for = dict()  # sid -> set of list ids containing it
+
+    def sids(self, lid):
+        """Returns a tuple of the sids in the given source list in lcn order with no duplicates. Raises a
+        KeyError if there is no such list."""
+        with self.lock:
+            self.__refresh(lid)
+            return self.orders[lid]
+
+    def sids_for_lists(self, lids):
+        """Returns a list of the sids in all of the given source lists, in the order in which the lists are
+        given, with each list in lcn order and each sid appearing only once (at its first occurrence). Raises
+        a KeyError if any of the lists does not exist."""
+        with self.lock:
+            for lid in lids:
+                self.__refresh(lid)
+
+            seen   = set()
+            result = []
+            for lid in lids:
+                for sid in self.orders[lid]:
+                    if sid not in seen:
+                        seen.add(sid)
+                        result.append(sid)
+            return result
+
+    def list_changed(self, lid=None):
+        """Brings the index of a list up to date with the list's current contents, or of all lists if lid is
+        None. Lists which no longer exist are dropped from the index."""
+        with self.lock:
+            if lid is None:
+                for old in [ old for old in self.snapshots if old not in self.source_lists ]:
+                    self.__drop(old)
+                for lid in self.source_lists:
+                    self.__refresh(lid)
+            elif lid not in self.source_lists:
+                if lid in self.snapshots:
+                    self.__drop(lid)
+            else:
+                self.__refresh(lid)
+
+    def source_changed(self, sid=None):
+        """Re-sorts a source within every list which contains it, to take account of a change to (or removal
+        of) its 'lcn'. If sid is None then every list is re-sorted."""
+        with self.lock:
+            if sid is None:
+                for lid in self.snapshots.keys():
+                    self.__rebuild(lid, self.snapshots[lid])
+                return
+
+            lcn = self.__lcn(sid)
+            for lid in self.lists_for.get(sid, ()):
+                old = self.entries[lid][sid]
+                if old[0] == lcn:
+                    continue
+
+                keys = self.keys[lid]
+                del keys[bisect.bisect_left(keys, old)]
+                new = (lcn, old[1], sid)
+                bisect.insort(keys, new)
+                self.entries[lid][sid] = new
+                self.orders[lid] = tuple([ key[2] for key in keys ])
+
+    def __lcn(self, sid):
+        if sid in self.sources and 'lcn' in self.sources[sid]:
+            return self.sources[sid]['lcn']
+        return -1
+
+    def __refresh(self, lid):
+        """Must be called with the lock held."""
+        current = tuple(self.source_lists[lid]['sources'])
+        if lid in self.snapshots and self.snapshots[lid] == current:
+            return
+
+        if lid not in self.snapshots or not self.__update(lid, current):
+            self.__rebuild(lid, current)
+
+    def __update(self, lid, current):
+        """Attempts to bring a list's index up to date by removing sids which have left the list and inserting
+        those which have been appended to its end. Returns False if the list has been reordered in some other
+        way, in which case the caller must rebuild it. Must be called with the lock held."""
+
+        old     = self.snapshots[lid]
+        present = set(current)
+        kept    = [ sid for sid in old if sid in present ]
+
+        if tuple(kept) != current[:len(kept)]:
+            return False
+
+        keys    = self.keys[lid]
+        entries = self.entries[lid]
+
+        for sid in set(old) - present:
+            del keys[bisect.bisect_left(keys, entries[sid])]
+            del entries[sid]
+            self.lists_for[sid].discard(lid)
+
+        seq = max([ entry[1] for entry in entries.values() ]) + 1 if entries else 0
+        for sid in current[len(kept):]:
+            if sid in entries:
+                continue
+            entries[sid] = (self.__lcn(sid), seq, sid)
+            bisect.insort(keys, entries[sid])
+            self.lists_for.setdefault(sid, set()).add(lid)
+            seq += 1
+
+        self.snapshots[lid] = current
+        self.orders[lid]    = tuple([ key[2] for key in keys ])
+        return True
+
+    def __rebuild(self, lid, current):
+        """Must be called with the lock held."""
+        if lid in self.entries:
+            for sid in self.entries[lid]:
+                self.lists_for[sid].discard(lid)
+
+        entries = dict()
+        for sid in current:
+            if sid not in entries:
+                entries[sid] = (self.__lcn(sid), len(entries), sid)
+                self.lists_for.setdefault(sid, set()).add(lid)
+
+        self.entries[lid]   = entries
+        self.keys[lid]      = sorted(entries.values())
+        self.snapshots[lid] = current
+        self.orders[lid]    = tuple([ key[2] for key in self.keys[lid] ])
+
+    def __drop(self, lid):
+        """Must be called with the lock held."""
+        for sid in self.entries[lid]:
+            self.lists_for[sid].discard(lid)
+        del self.snapshots[lid]
+        del self.keys[lid]
+        del self.entries[lid]
+        del self.orders[lid]
@@ -72,6 +72,7 @@ __version__ = "0.6.0"
 #Standard Python imports
 import socket
 import urllib
+import urlparse
 import time
 import datetime
 import threading
@@ -80,10 +81,13 @@ import xml.sax.saxutils as saxutils
 import traceback
 import re
 import random
+import itertools
 
 #imports from elsewhere in this package
 from Exceptions import *
 from Exceptions import UCException
+import BodyParsing
+import Cursors
 
 
 # This global data member will hold the global singleton UCServer.UCServer instance, which will be set by methods
@@ -114,6 +118,11 @@ class UCResourceHandler:
                         (digest authentication is only employed if this member AND the auth member of the server object
                         are BOTH set to True)
 
+    and may override the class variables:
+
+      max_body_size  -- the largest request body (in bytes) which the resource will accept.
+      max_body_depth -- the deepest nesting of elements which the resource will accept in a request body.
+
     Concrete subclasses may wish to override the default member functions do_GET, do_POST, do_PUT, do_DELETE,
     and notify. See below for what the default implementations do.
 
@@ -126,6 +135,9 @@ class UCResourceHandler:
     data = { 'resource' : '' }
     auth = True
 
+    max_body_size  = BodyParsing.MAX_SIZE
+    max_body_depth = BodyParsing.MAX_DEPTH
+
     lock = threading.RLock() 
 
     def __init__(self,handler,path,query,params,head=False):
@@ -211,12 +223,12 @@ class UCResourceHandler:
                 if not self.handler.check_authentication(body):
                     return
 
-        the request body will be stored as a string in the 'body' variable. It can be turned into
-        an XML 'dom' object with the call:
+        the request body will be stored as a string in the 'body' variable. The elements and attributes
+        needed from it can be extracted with the call:
 
-            body = self.parse_body(body)
+            body = self.extract_body(body, { 'element' : ('attribute', ...), ... })
         
-        which will read the request body into an xml dom object, and if there is a parsing error will 
+        which will return a BodyParsing.ExtractedBody object, and if there is a parsing error will
         return a 400 code.
 
         A response can be sent back to the client by using the following code:
@@ -241,12 +253,12 @@ class UCResourceHandler:
                 if not self.handler.check_authentication(body):
                     return
 
-        the request body will be stored as a string in the 'body' variable. It can be turned into
-        an XML 'dom' object with the call:
+        the request body will be stored as a string in the 'body' variable. The elements and attributes
+        needed from it can be extracted with the call:
 
-            body = self.parse_body(body)
+            body = self.extract_body(body, { 'element' : ('attribute', ...), ... })
         
-        which will read the request body into an xml dom object, and if there is a parsing error will 
+        which will return a BodyParsing.ExtractedBody object, and if there is a parsing error will
         return a 400 code.
 
         A response can be sent back to the client by using the following code:
@@ -334,20 +346,42 @@ class UCResourceHandler:
 
 
     def retrieve_body(self):
-        """This method retrieves the body of the request"""
-        
+        """This method retrieves the body of the request. Bodies longer than the class variable max_body_size
+        are refused with a 413 without being read."""
+
+        if "Content-Length" not in self.handler.headers:
+            return ''
+
+        try:
+            bytes = int(self.handler.headers["Content-Length"])
+        except:
+            raise InvalidSyntax("Invalid Content-Length")
+
+        if bytes < 0:
+            raise InvalidSyntax("Invalid Content-Length")
+        if bytes > self.max_body_size:
+            raise RequestTooLarge()
+
         try:
-            if "Content-Length" in self.handler.headers:
-                bytes = int(self.handler.headers["Content-Length"])
-                return self.handler.rfile.read(bytes)
+            return self.handler.rfile.read(bytes)
         except:
             print traceback.format_exc()
             raise InvalidSyntax("Could not read body")
-        return ''
+
+    def extract_body(self,body,declarations):
+        """This method parses the body of the request in a single pass, extracting only the declared elements
+        and attributes (see BodyParsing.extract for the format of declarations). It returns a
+        BodyParsing.ExtractedBody object."""
+
+        return BodyParsing.extract(body, declarations, max_size=self.max_body_size, max_depth=self.max_body_depth)
 
     def parse_body(self,body):
-        """This method parses the body of the request as an XML dom"""
+        """This method parses the body of the request as an XML dom. It is retained for the use of out of tree
+        resources, the handlers in this module use the cheaper extract_body."""
         
+        if len(body) > self.max_body_size:
+            raise RequestTooLarge()
+
         try:
             return xml.dom.minidom.parseString(body)
         except:
@@ -651,13 +685,12 @@ class UCPowerResourceHandler (UCResourceHandler):
             if not self.handler.check_authentication(body):
                 return
 
-        dom = self.parse_body(body)
+        body = self.extract_body(body, { 'power' : ('state',) })
 
-        list = dom.getElementsByTagName('power')
+        list = body.elements('power')
 
         if len(list) == 1:
-            state = str(list[0].getAttribute('state'))
-            dom.unlink()
+            state = str(list[0].get('state',''))
             
             if state == "on":
                 if not uc_server.standby:
@@ -679,8 +712,6 @@ class UCPowerResourceHandler (UCResourceHandler):
                 raise ProcessingFailed()
             else:
                 raise ProcessingFailed()
-        else:
-            dom.unlink()
         raise InvalidSyntax()
 
     def standby_do_PUT(self):
@@ -894,35 +925,36 @@ class UCOutputsIdResourceHandler(UCResourceHandler):
         elif body == '':
             raise InvalidSyntax
         else:
-            dom = self.parse_body(body)
-            data = dict()
+            body = self.extract_body(body, { 'programme'          : ('sid','cid'),
+                                             'app'                : ('sid','cid'),
+                                             'component-override' : ('mcid','type'), })
 
-            list1 = dom.getElementsByTagName('programme')
-            list2 = dom.getElementsByTagName('app')
+            list1 = body.elements('programme')
+            list2 = body.elements('app')
             if len(list2) == 0 and len(list1) == 1:
                 op = list1[0]
                 type = 'programme'
 
-                if op.hasAttribute('sid'):
-                    sid = op.getAttribute('sid')
+                if op.has('sid'):
+                    sid = op.get('sid')
                 else:
                     raise InvalidSyntax
 
-                if op.hasAttribute('cid'):
-                    cid = op.getAttribute('cid')
+                if op.has('cid'):
+                    cid = op.get('cid')
                 else:
                     raise InvalidSyntax
             
-                list1 = op.getElementsByTagName('component-override')
+                list1 = body.elements('component-override', within=op)
                 for c in list1:
-                    if c.hasAttribute('mcid'):
-                        mcid = c.getAttribute('mcid')
+                    if c.has('mcid'):
+                        mcid = c.get('mcid')
                     else:
                         raise InvalidSyntax
 
-                    if c.hasAttribute('type'):
+                    if c.has('type'):
                        components.append({ 'mcid' : mcid,
-                                           'type' : c.getAttribute('type')})
+                                           'type' : c.get('type')})
                     else:
                         raise InvalidSyntax
 
@@ -930,13 +962,13 @@ class UCOutputsIdResourceHandler(UCResourceHandler):
                 op = list2[0]
                 type = 'app'
                 
-                if op.hasAttribute('sid'):
-                    sid = op.getAttribute('sid')
+                if op.has('sid'):
+                    sid = op.get('sid')
                 else:
                     raise InvalidSyntax
 
-                if op.hasAttribute('cid'):
-                    cid = op.getAttribute('cid')
+                if op.has('cid'):
+                    cid = op.get('cid')
                 else:
                     raise InvalidSyntax
             else:
@@ -1041,25 +1073,25 @@ class UCOutputsIdSettingsResourceHandler(UCResourceHandler):
 
         output = uc_server.outputs[id]
 
-        dom = self.parse_body(body)
+        body = self.extract_body(body, { 'settings' : ('volume','mute','aspect') })
 
-        list = dom.getElementsByTagName('settings')
+        list = body.elements('settings')
         data = dict()
         if len(list) == 1:
-            if list[0].hasAttribute('volume'):
-                match = re.match('^(\+|\-)?(\d*)(\.(\d+))?$',list[0].getAttribute('volume'))
+            if list[0].has('volume'):
+                match = re.match('^(\+|\-)?(\d*)(\.(\d+))?$',list[0].get('volume'))
                 if match is None:
                     raise InvalidSyntax
                 frac = (match.group(4) if match.group(4) is not None else '')
                 data['volume'] = 10000*int(match.group(2)) + int((frac + '0000')[:4])
-            if list[0].hasAttribute('mute'):
-                mute = list[0].getAttribute('mute')
+            if list[0].has('mute'):
+                mute = list[0].get('mute')
                 try:
                     data['mute'] = parse_bool(mute)
                 except:
                     raise InvalidSyntax
-            if list[0].hasAttribute('aspect'):
-                aspect = list[0].getAttribute('aspect')
+            if list[0].has('aspect'):
+                aspect = list[0].get('aspect')
                 if aspect not in ('source','4:3','14:9','16:9','16:10','21:9'):
                     raise InvalidSyntax
                 data['aspect'] = aspect
@@ -1112,8 +1144,8 @@ class UCOutputsIdPlayheadResourceHandler(UCResourceHandler):
         output = uc_server.outputs[id]
 
         attributes = ''
-        for key in ('length',):
-            if key in output['playhead']:
+        for key in ('length','drift',):
+            if key in output['playhead'] and output['playhead'][key] is not None:
                 attributes += ' %s="%s"' % (key,saxutils.escape('%01.3f' % float(output['playhead'][key])))
 
         if ('playback' in output 
@@ -1192,14 +1224,17 @@ class UCOutputsIdPlayheadResourceHandler(UCResourceHandler):
         if 'playhead' not in uc_server.outputs[id] or uc_server.outputs[id]['playhead'] is None:
             raise InvalidSyntax
 
-        dom = self.parse_body(body)
+        body = self.extract_body(body, { 'playhead'  : ('timestamp',),
+                                         'aposition' : ('position',),
+                                         'rposition' : ('position',),
+                                         'playback'  : ('speed',), })
 
-        list = dom.getElementsByTagName('playhead')
+        list = body.elements('playhead')
         if len(list) != 1:
             raise InvalidSyntax('Failed to parse playhead')
 
         try:
-            timestamp = parse_iso(list[0].getAttribute('timestamp'))
+            timestamp = parse_iso(list[0].get('timestamp',''))
         except:
             pass
 
@@ -1207,35 +1242,35 @@ class UCOutputsIdPlayheadResourceHandler(UCResourceHandler):
         playhead = dict()
 
         ph = list[0]
-        list = ph.getElementsByTagName('aposition')
+        list = body.elements('aposition', within=ph)
         if len(list) > 1:
             raise InvalidSyntax('Failed to parse position')
         elif len(list) == 1:
             try:
-                playhead['aposition'] = { 'position'           : float(list[0].getAttribute('position')),
+                playhead['aposition'] = { 'position'           : float(list[0].get('position','')),
                                           'position_timestamp' : timestamp }
             except:
                 raise InvalidSyntax('Failed to parse position')
         else:
-            list = ph.getElementsByTagName('rposition')
+            list = body.elements('rposition', within=ph)
             if len(list) != 1:
                 raise InvalidSyntax('Failed to parse position')
             else:
                 try:
-                    playhead['aposition'] = { 'position'           : float(list[0].getAttribute('position')),
+                    playhead['aposition'] = { 'position'           : float(list[0].get('position','')),
                                               'position_timestamp' : timestamp }
                 except:
                     raise InvalidSyntax('Failed to parse position')
 
-        list = ph.getElementsByTagName('playback')
+        list = body.elements('playback', within=ph)
         if len(list) == 1:
             pb = list[0]
                 
             speed = 0.0
             
-            if pb.hasAttribute('speed'):
+            if pb.has('speed'):
                 try:
-                    speed = float(pb.getAttribute('speed'))
+                    speed = float(pb.get('speed'))
                 except:
                     raise InvalidSyntax('invalid speed')
 
@@ -1253,7 +1288,6 @@ class UCOutputsIdPlayheadResourceHandler(UCResourceHandler):
         except:
             raise
         
-        dom.unlink()
         return self.return_bodyless()
 
 
@@ -1265,7 +1299,14 @@ class UCRemoteResourceHandler(UCResourceHandler):
 
     def send_button_press(code):
 
-    which takes a button code as a string."""
+    which takes a button code as a string. A POST may give several button codes, which
+    are pressed in the order given: if the object also responds to the method
+
+    def send_button_presses(codes):
+
+    which takes a list of button codes, then they are passed to it all at once, and
+    otherwise they are passed to send_button_press one at a time. A POST giving more than
+    max_buttons button codes is refused with a 413 status before any are passed on."""
 
     representation = """\
 <response resource="%(resource)s"><remote%(content)s></response>
@@ -1273,6 +1314,9 @@ class UCRemoteResourceHandler(UCResourceHandler):
 
     data = { 'resource' : 'uc/remote',}
 
+    # The largest number of button codes accepted in a single request
+    max_buttons = 256
+
     def do_GET(self):
         """This methods handles GET requests by checking authentication and then returning the data stored
         in the controls member of the global UCServer instance."""
@@ -1310,13 +1354,16 @@ class UCRemoteResourceHandler(UCResourceHandler):
             if not self.handler.check_authentication(body):
                 return
 
-        if 'button' not in self.params or len(self.params['button']) != 1:
+        if 'button' not in self.params or len(self.params['button']) == 0:
             raise InvalidSyntax('Button missing')
 
-        button = self.params['button'][0]
+        buttons = self.params['button']
+        if len(buttons) > self.max_buttons:
+            raise RequestTooLarge, "Too many buttons"
 
-        if not re.match('^(((\w+(\-+\w+)*(\.\w+(\-+\w+)*)*)?:([a-zA-Z0-9_\-\.~]|%[0-9a-fA-F]{2})+)|:):([a-zA-Z0-9_\-\.~]|%[0-9a-fA-F]{2})+$',button):
-            raise InvalidSyntax
+        for button in buttons:
+            if not re.match('^(((\w+(\-+\w+)*(\.\w+(\-+\w+)*)*)?:([a-zA-Z0-9_\-\.~]|%[0-9a-fA-F]{2})+)|:):([a-zA-Z0-9_\-\.~]|%[0-9a-fA-F]{2})+$',button):
+                raise InvalidSyntax
 
         output = None
         if 'output' in self.params:
@@ -1328,7 +1375,13 @@ class UCRemoteResourceHandler(UCResourceHandler):
         if uc_server.button_handler is None:
             raise ProcessingFailed()
             
-        uc_server.button_handler.send_button_press(button, output=output)
+        if len(buttons) == 1:
+            uc_server.button_handler.send_button_press(buttons[0], output=output)
+        elif hasattr(uc_server.button_handler, 'send_button_presses'):
+            uc_server.button_handler.send_button_presses(buttons, output=output)
+        else:
+            for button in buttons:
+                uc_server.button_handler.send_button_press(button, output=output)
         
         return self.return_bodyless()
 
@@ -1433,20 +1486,12 @@ class UCSourceListsIdResourceHandler(UCResourceHandler):
             raise CannotFind()
 
         content = '/'
-        if len(uc_server.source_lists[list]['sources']) != 0:
+        src_ids = uc_server.source_list_index.sids(list)
+        if len(src_ids) != 0:
             content = '>'
-            
-            def lcn(obj):
-                if 'lcn' in obj:
-                    return obj['lcn']
-                else:
-                    return -1
-
-            src_ids = uc_server.source_lists[list]['sources']
-            srcs = sorted([ uc_server.sources[id] for id in src_ids ],key=lcn)
 
-            for src in srcs:
-                content += self.parse_source(src['id'])
+            for id in src_ids:
+                content += self.parse_source(id)
 
             content += '</sources'
 
@@ -1684,10 +1729,14 @@ class UCSearchResourceHandler(UCResourceHandler):
                                      'start',
                                      'end',
                                      'days']):
-        """This method parses the query parameters according to Section 4.18.1 of the spec"""
+        """This method parses the query parameters according to Section 4.18.1 of the spec. The parameter
+        'cursor' (see UCSearchResourceHandler.search) is accepted whatever the value of valid. The boolean
+        parameter 'typeahead' is an extension, and is only accepted if it is included in valid."""
 
         global uc_server
 
+        valid = list(valid) + ['cursor',]
+
         params = { 'results'     : (False, 1, 'int>=1'),
                    'offset'      : (False, 0, 'int'),
                    'sid'         : (True,  None, 'id'),
@@ -1704,6 +1753,8 @@ class UCSearchResourceHandler(UCResourceHandler):
                    'start'       : (False, None, 'iso'),
                    'end'         : (False, None, 'iso'),
                    'days'        : (False, None, 'int>=1'),
+                   'typeahead'   : (False, None, 'bool'),
+                   'cursor'      : (False, None, '%'),
                    }
 
         retvals = dict([ (key, params[key][1]) for key in params if params[key][1] is not None ])
@@ -1782,23 +1833,101 @@ class UCSearchResourceHandler(UCResourceHandler):
         return retvals
 
     @classmethod
-    def respond(cls,resource,handler,contents, head=False):
-        representation = """<response resource="%(resource)s">%(content)s</response>
-"""
-        
+    def search(cls,resource_handler,resource,params,get,cache=True):
+        """This method carries out a search and sends the response, handling the parameter 'cursor'. The
+        parameter resource is the path of the resource (without the query string), params is the dictionary
+        returned by parse_query, and get is a callable which takes params and returns a list of results in
+        the form returned by the methods of the content object set with UCServer.UCServer.set_content.
+
+        If every list of results which has more="true" was returned with a continuation then the server keeps
+        them and includes a cursor in the response, so that the next page can be taken from them directly. If
+        they were not (as when the results come from the search cache, which keeps no continuations) the
+        response still includes a cursor, which only encodes the offset of the next page. A request which
+        carries a cursor that has been forgotten, or had no continuations, is answered using the offset it
+        encodes. No cursor is given if any of the lists is incomplete (see UCServer.UCServer.set_content).
+
+        Unless cache is False the results are looked up in (and stored in) the server's search cache, see
+        UCServer.Caches. This should only be turned off for searches whose results depend on more than the
+        programmes the content object holds, such as searches of outputs.
+
+        If resource_handler has an attribute collect holding a list then no response is sent; instead a tuple
+        of the resource, the lists of results and the cursor is appended to it. This is how
+        UCSearchBatchResourceHandler gathers the results of its sub-queries."""
+
+        global uc_server
+
+        key = (resource,
+               tuple(sorted([ (k, tuple(v)) for (k,v) in resource_handler.params.items() if k not in ('cursor','offset') ])))
+
+        contents = None
+        if 'cursor' in params:
+            (params['offset'], continuations) = uc_server.cursors.resume(params['cursor'], key)
+            if continuations is not None:
+                contents = [ cls.take(continuation, params['results']) for continuation in continuations ]
+        if contents is None:
+            if cache:
+                contents = uc_server.search_cache.get(uc_server.search_cache.key(resource, params, 'start' in resource_handler.params),
+                                                      lambda : get(params))
+            else:
+                contents = get(params)
+
+        cursor = None
+        if (any([ content[1] for content in contents ])
+            and not any([ (content[1] and len(content) > 2 and content[2] is None) for content in contents ])):
+            continuations = [ (content[2] if content[1] and len(content) > 2 else None) for content in contents ]
+            if all([ continuation is not None for (content, continuation) in zip(contents, continuations) if content[1] ]):
+                cursor = uc_server.cursors.store(key, params['offset'] + params['results'], continuations)
+            else:
+                cursor = uc_server.cursors.token(params['offset'] + params['results'])
+
+        if isinstance(getattr(resource_handler, 'collect', None), list):
+            resource_handler.collect.append((resource + resource_handler.reconstructParams(), contents, cursor))
+            return
+
+        return cls.respond(resource + resource_handler.reconstructParams(), resource_handler.handler, contents, head=resource_handler.head, cursor=cursor)
+
+    @classmethod
+    def take(cls,continuation,results):
+        """Takes the next page of results from a continuation (which may be None), returning it in the same
+        form as a content source would."""
+        if continuation is None:
+            return ([],False)
+
+        continuation = iter(continuation)
+        res = [ item for (i,item) in zip(xrange(results),continuation) ]
+        try:
+            following = continuation.next()
+        except StopIteration:
+            return (res,False)
+        return (res,True,itertools.chain((following,),continuation))
+
+    @classmethod
+    def render_results(cls,contents,cursor=None):
+        """Returns the <results> elements for the given lists of results as a string."""
         lists = ''
         for content in contents:
             elements = ''
             for item in content[0]:
                 elements += encodeContent(item)
 
+            attributes = 'more="%s"' % (bool_to_xml_string(content[1]),)
+            if content[1] and cursor is not None:
+                attributes += ' cursor="%s"' % (saxutils.escape(cursor),)
+
             if elements == '':
-                lists += '<results more="%s"/>' % (bool_to_xml_string(content[1]),)
+                lists += '<results %s/>' % (attributes,)
             else:
-                lists += '<results more="%s">%s</results>' % (bool_to_xml_string(content[1]),elements,)            
+                lists += '<results %s>%s</results>' % (attributes,elements,)            
+
+        return lists
+
+    @classmethod
+    def respond(cls,resource,handler,contents, head=False, cursor=None):
+        representation = """<response resource="%(resource)s">%(content)s</response>
+"""
 
         string = representation % {'resource' : saxutils.escape(resource),
-                                   'content'  : lists}
+                                   'content'  : cls.render_results(contents, cursor)}
         
         handler.send_response(200)
         handler.send_header('Content-Length',len(string))
@@ -1822,6 +1951,174 @@ class UCSearchResourceHandler(UCResourceHandler):
         return self.return_bodyless()
 
 
+class UCSearchBatchResourceHandler(UCResourceHandler):
+    """This class handles requests to the 'uc/search/batch' resource, which allows a client to make several
+    searches in a single request. The body of a POST request takes the form:
+
+        <batch>
+          <query href="uc/search/sources/0001?results=5"/>
+          <query href="uc/search/text/news?results=10&amp;offset=10"/>
+          ...
+        </batch>
+
+    where each href is the path (and query string) of one of the other uc/search resources. Each query is
+    parsed, validated and dispatched exactly as a GET request to that resource would be (so in standby each
+    fails as it would on its own), and they are carried out concurrently on the server's shared pool of
+    worker threads (see UCServer.Workers). The response contains a <query> element for each, in the order in which they were given,
+    holding the <results> elements which the GET request would have returned, or, if it would have failed,
+    no content and an attribute error giving its status code. A query which has not finished within
+    deadline seconds, or which could not be started because the pool was busy, fails with a 503 status.
+    GET requests return a 204 response."""
+
+    representation = """<response resource="%(resource)s">%(content)s</response>
+"""
+
+    data = { 'resource' : 'uc/search/batch',}
+
+    # The largest number of queries accepted in a single request, and the time in seconds allowed for them
+    max_queries = 32
+    deadline    = 10.0
+
+    def do_GET(self):
+        """This method returns a 204 response."""
+
+        if self.auth:
+            if not self.handler.check_authentication(''):
+                return
+
+        return self.return_bodyless()
+
+    def do_POST(self):
+        """This method carries out each of the queries in the body concurrently and returns their results."""
+
+        global uc_server
+
+        body = self.retrieve_body()
+
+        if self.auth:
+            if not self.handler.check_authentication(body):
+                return
+
+        body = self.extract_body(body, { 'query' : ('href',), })
+
+        hrefs = [ element.get('href') for element in body.elements('query') ]
+        if len(hrefs) == 0:
+            raise InvalidSyntax, "No queries"
+        if len(hrefs) > self.max_queries:
+            raise RequestTooLarge, "Too many queries"
+
+        # Everything which needs the real request handler is done here, in the thread handling the request, so
+        # that each worker is given only its own stand-in (see SearchBatchQuery)
+        queries = [ self.prepare(href) for href in hrefs ]
+
+        finished = uc_server.workers.run([ query.run for query in queries if not isinstance(query, int) ],
+                                         deadline=self.deadline)
+        finished = iter(finished)
+
+        content = ''
+        for (href, query) in zip(hrefs, queries):
+            if isinstance(query, int):
+                outcome = query
+            elif not finished.next():
+                outcome = ServiceUnavailable.code
+            else:
+                for message in query.messages:
+                    self.handler.log_message(message)
+                outcome = query.outcome
+
+            if isinstance(outcome, tuple):
+                (resource, contents, cursor) = outcome
+                content += '<query href="%s">%s</query>' % (saxutils.escape(href, { '"' : '&quot;' }),
+                                                            UCSearchResourceHandler.render_results(contents, cursor))
+            else:
+                content += '<query href="%s" error="%d"/>' % (saxutils.escape(href, { '"' : '&quot;' }), outcome)
+
+        return self.return_body(self.representation % { 'resource' : saxutils.escape(self.data['resource']),
+                                                        'content'  : content, })
+
+    def prepare(self, href):
+        """Finds the resource handler class for a single href, returning a SearchBatchQuery which will carry it
+        out, or the status code with which it fails if it is not one of the search resources."""
+
+        parse = urlparse.urlparse(href)
+        path  = parse.path.strip('/').split('/')
+        if len(path) < 4 or path[:2] != ['uc','search'] or path[2] == 'batch':
+            return CannotFind.code
+
+        cls = self.handler.handle_resource(path, dict(), resources)
+        if cls is None or cls is GET204Handler:
+            return CannotFind.code
+
+        return SearchBatchQuery(cls, path, '?' + urllib.unquote(parse.query), urlparse.parse_qs(parse.query),
+                                self.handler.standby)
+
+
+class SearchBatchQuery:
+    """A single sub-query of a batch search (see UCSearchBatchResourceHandler), which is carried out on one of
+    the server's worker threads.
+
+    It stands in for the UCHandler which would have been given to the resource handler had the query been made
+    as a GET request of its own, so that it can be dispatched in exactly the same way -- to standby_do_GET if the
+    server was in standby when the batch was received, otherwise to do_GET -- without the worker touching the
+    real request. The batch request has already been authenticated by the time this is made, so each
+    sub-query is too. An error sent by the resource handler and any messages it logs are kept for the thread
+    handling the batch, which logs them once the query has finished.
+
+    Once run has returned outcome holds either a tuple of the resource, the lists of results and the cursor, as
+    collected by UCSearchResourceHandler.search, or the status code with which the query failed."""
+
+    def __init__(self, cls, path, query, params, standby):
+        self.cls      = cls
+        self.path     = path
+        self.query    = query
+        self.params   = params
+        self.standby  = standby
+        self.outcome  = None
+        self.messages = []
+
+    def run(self):
+        try:
+            handler = self.cls(self, self.path, self.query, self.params)
+            handler.collect = []
+
+            if self.standby:
+                if hasattr(handler,'standby_do'):
+                    handler.standby_do('GET')
+                else:
+                    handler.standby_do_GET()
+            else:
+                if hasattr(handler,'do'):
+                    handler.do('GET')
+                else:
+                    handler.do_GET()
+
+            if self.outcome is None:
+                if len(handler.collect) != 1:
+                    raise ProcessingFailed, "Search returned no results"
+                self.outcome = handler.collect[0]
+        except ProcessingFailed as e:
+            self.log_message(traceback.format_exc())
+            self.outcome = e.code
+        except UCException as e:
+            self.outcome = e.code
+        except:
+            self.log_message(traceback.format_exc())
+            self.outcome = ProcessingFailed.code
+
+    def check_authentication(self, body, iteration=None, nc_limit=None, timeout=None):
+        return True
+
+    def send_error(self, code, message=None):
+        if self.outcome is None:
+            self.outcome = code
+
+    def log_message(self, format, *args):
+        if len(args) > 0:
+            self.messages.append(format % args)
+        else:
+            self.messages.append(format)
+
+
 class GET204Handler(UCResourceHandler):
     """This class handles GET requests by returning a 204"""
 
@@ -1867,9 +2164,9 @@ class UCSearchOutputsIdResourceHandler(UCResourceHandler):
 
         params = UCSearchResourceHandler.parse_query(self.params,['results','offset','interactive','AV','start','end','days'])
 
-        content = uc_server.content.get_output(term,params)
-
-        return UCSearchResourceHandler.respond(self.data['resource'] % (term,) + self.reconstructParams(), self.handler,content,head=self.head)
+        return UCSearchResourceHandler.search(self, self.data['resource'] % (term,), params,
+                                              lambda params : uc_server.content.get_output(term,params),
+                                              cache=False)
 
 class UCSearchSourcesIdResourceHandler(UCResourceHandler):
     """This class handles requests to the 'uc/search/sources/{id}' resources."""
@@ -1911,9 +2208,8 @@ class UCSearchSourcesIdResourceHandler(UCResourceHandler):
                                                                   'end',
                                                                   'days'])
 
-        content = uc_server.content.get_sources(term,params)
-
-        return UCSearchResourceHandler.respond(self.data['resource'] % (terms,) + self.reconstructParams(), self.handler,content,head=self.head)
+        return UCSearchResourceHandler.search(self, self.data['resource'] % (terms,), params,
+                                              lambda params : uc_server.content.get_sources(term,params))
 
 class UCSearchSourcelistsIdResourceHandler(UCResourceHandler):
     """This class handles requests to the 'uc/search/source-lists/{id}' resources."""
@@ -1939,23 +2235,7 @@ class UCSearchSourcelistsIdResourceHandler(UCResourceHandler):
         if not all([ t in uc_server.source_lists for t in lists ]):
             raise CannotFind
 
-        def __lcn(obj):
-            if 'lcn' in obj:
-                return obj['lcn']
-            else:
-                return -1
-
-        sources = reduce(lambda x,y : x+y, 
-                         [ sorted([ sid for sid in uc_server.source_lists[lid]['sources'] ], 
-                                  key=lambda sid : (uc_server.sources[sid]['lcn'] if 'lcn' in uc_server.sources[sid] else -1)) 
-                           for lid in uc_server.source_lists ])
-
-        print sources
-        
-        term = []
-        for s in sources:
-            if s not in term:
-                term.append(s)
+        term = uc_server.source_list_index.sids_for_lists(lists)
 
         params = UCSearchResourceHandler.parse_query(self.params,['results',
                                                                   'offset',
@@ -1973,12 +2253,15 @@ class UCSearchSourcelistsIdResourceHandler(UCResourceHandler):
                                                                   'end',
                                                                   'days'])
 
-        content = uc_server.content.get_sources(term,params)
-
-        return UCSearchResourceHandler.respond(self.data['resource'] % (terms,) + self.reconstructParams(), self.handler,content,head=self.head)
+        return UCSearchResourceHandler.search(self, self.data['resource'] % (terms,), params,
+                                              lambda params : uc_server.content.get_sources(term,params))
 
 class UCSearchTextIdResourceHandler(UCResourceHandler):
-    """This class handles requests to the 'uc/search/text/{id}' resources."""
+    """This class handles requests to the 'uc/search/text/{id}' resources.
+
+    In addition to the parameters in the spec these accept 'typeahead', which when true asks the content object
+    for a quick search suitable for making as the user types (matching the starts of words, and ranked by how
+    soon the programmes start) rather than a complete one."""
 
     representation = """
 """
@@ -2015,11 +2298,11 @@ class UCSearchTextIdResourceHandler(UCResourceHandler):
                                                                   'AV',
                                                                   'start',
                                                                   'end',
-                                                                  'days'])
-
-        content = uc_server.content.get_text(term,params)
+                                                                  'days',
+                                                                  'typeahead'])
 
-        return UCSearchResourceHandler.respond(self.data['resource'] % (terms,) + self.reconstructParams(), self.handler,content,head=self.head)
+        return UCSearchResourceHandler.search(self, self.data['resource'] % (terms,), params,
+                                              lambda params : uc_server.content.get_text(term,params))
 
 class UCSearchGlobalcontentidIdResourceHandler(UCResourceHandler):
     """This class handles requests to the 'uc/search/global-content-id/{id}' resources."""
@@ -2052,9 +2335,8 @@ class UCSearchGlobalcontentidIdResourceHandler(UCResourceHandler):
                                                                   'end',
                                                                   'days'])
 
-        content = uc_server.content.get_gcid(term,params)
-
-        return UCSearchResourceHandler.respond(self.data['resource'] % (terms,) + self.reconstructParams(), self.handler,content,head=self.head)
+        return UCSearchResourceHandler.search(self, self.data['resource'] % (terms,), params,
+                                              lambda params : uc_server.content.get_gcid(term,params))
 
 class UCSearchGlobalseriesidIdResourceHandler(UCResourceHandler):
     """This class handles requests to the 'uc/search/global-series-id/{id}' resources."""
@@ -2087,9 +2369,8 @@ class UCSearchGlobalseriesidIdResourceHandler(UCResourceHandler):
                                                                   'end',
                                                                   'days'])
 
-        content = uc_server.content.get_gsid(term,params)
-
-        return UCSearchResourceHandler.respond(self.data['resource'] % (terms,) + self.reconstructParams(), self.handler,content,head=self.head)
+        return UCSearchResourceHandler.search(self, self.data['resource'] % (terms,), params,
+                                              lambda params : uc_server.content.get_gsid(term,params))
 
 class UCSearchGlobalappidIdResourceHandler(UCResourceHandler):
     """This class handles requests to the 'uc/search/global-app-id/{id}' resources."""
@@ -2122,9 +2403,8 @@ class UCSearchGlobalappidIdResourceHandler(UCResourceHandler):
                                                                   'end',
                                                                   'days'])
 
-        content = uc_server.content.get_gaid(term,params)
-
-        return UCSearchResourceHandler.respond(self.data['resource'] % (terms,) + self.reconstructParams(), self.handler,content,head=self.head)
+        return UCSearchResourceHandler.search(self, self.data['resource'] % (terms,), params,
+                                              lambda params : uc_server.content.get_gaid(term,params))
 
 
 class UCSearchCategoriesIdResourceHandler(UCResourceHandler):
@@ -2144,23 +2424,13 @@ class UCSearchCategoriesIdResourceHandler(UCResourceHandler):
             if not self.handler.check_authentication(''):
                 return
 
-        term = self.path[-1]
+        catid = self.path[-1]
 
-        cats = [ catid for catid in uc_server.categories if 'category-id' in uc_server.categories[catid] ]
-        if term not in cats:
+        index = uc_server.category_index
+        if catid not in index.api_ids:
             raise CannotFind
 
-        def childcats(cat):
-            children = [ catid for catid in uc_server.categories if 'parent' in uc_server.categories[catid] and uc_server.categories[catid]['parent'] == cat ]
-            if not children:
-                return [cat,]
-            else:
-                retvals = []
-                for child in children:
-                    retvals.extend(childcats(child))
-                return retvals
-
-        term = list(set(childcats(term)))
+        term = list(index.descendant_leaves(catid))
 
         params = UCSearchResourceHandler.parse_query(self.params,['results',
                                                                   'offset',
@@ -2178,9 +2448,8 @@ class UCSearchCategoriesIdResourceHandler(UCResourceHandler):
                                                                   'end',
                                                                   'days'])
 
-        content = uc_server.content.get_categories(term,params)
-
-        return UCSearchResourceHandler.respond(self.data['resource'] % (term,) + self.reconstructParams(), self.handler,content,head=self.head)
+        return UCSearchResourceHandler.search(self, self.data['resource'] % (catid,), params,
+                                              lambda params : uc_server.content.get_categories(term,params))
 
 class UCCategoriesResourceHandler(UCResourceHandler):
     """This class handles requests to the 'uc/categories' resource. It gets its data not from its
@@ -2202,32 +2471,7 @@ class UCCategoriesResourceHandler(UCResourceHandler):
             if not self.handler.check_authentication(''):
                 return
 
-        def generate_category_hierarchy(root):
-            branches = filter(lambda x : uc_server.categories[x]['parent'] == root,
-                              uc_server.categories)
-
-            content = '/'
-            if len(branches) != 0:
-                content = ''
-                for branch in branches:
-                    attributes = ''
-                    for key in ('logo-href','category-id'):
-                        if key in uc_server.categories[branch] and isinstance(uc_server.categories[branch][key],basestring):
-                            attributes += ' %s="%s"' % (key, saxutils.escape(str(uc_server.categories[branch][key])))
-                    
-                    branchcontent = generate_category_hierarchy(branch)
-                    if branchcontent != '/':
-                        branchcontent = '>%s</category' % branchcontent
-
-                    content += '<category name="%(name)s"%(attributes)s%(content)s>' % { 'name'       : saxutils.escape(str(uc_server.categories[branch]['name'])),
-                                                                                         'attributes' : attributes,
-                                                                                         'content'    : branchcontent }
-            return content
-
-
-        content = generate_category_hierarchy('')
-        if content != '/':
-            content = '>%s</categories' % content
+        content = uc_server.category_index.content
 
         self.return_body(self.representation % {'resource' : saxutils.escape(self.resource),
                                                 'content'  : content})
@@ -2912,6 +3156,7 @@ resource_options = {
                 '*' : (UCSourcesSrefResourceHandler, dict()),
                 })),
     'search' : (('uc','search'),  (UCSearchResourceHandler, {
+                'batch' : (UCSearchBatchResourceHandler, dict()),
                 'outputs' : (GET204Handler, {
                         '*' : (UCSearchOutputsIdResourceHandler, dict()),
                         }),
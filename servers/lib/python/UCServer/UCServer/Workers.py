@@ -0,0 +1,151 @@
+# Universal Control Server - Worker threads
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+
+"""\
+Worker threads for the UCServer library.
+
+This module contains the pool of worker threads which the server uses to
+carry out work for a request concurrently, such as the sub-queries of a
+'uc/search/batch' request. The pool is shared by every request, so the number
+of threads doing such work is bounded however many requests arrive at once.
+
+The pool has a fixed number of threads and a bounded queue of work waiting
+for them. Each call to WorkerPool.run is given a deadline: work which has not
+started by then is skipped, and the caller is told which of its calls did not
+finish (including any which could not be queued because the queue was full)
+so that it can report them as failed rather than waiting for them.
+
+It is unlikely that a server implementor will need to use this module
+directly.
+"""
+
+__version__ = "0.6.0"
+
+__all__ = ["WorkerPool",
+           "WORKERS",
+           "BACKLOG",
+           "DEADLINE",
+           ]
+
+#Standard Python imports
+import threading
+import Queue
+import traceback
+import time
+
+
+# The default number of worker threads, number of calls which may wait for a worker, and deadline in seconds
+WORKERS  = 8
+BACKLOG  = 64
+DEADLINE = 10.0
+
+
+class Task(object):
+    """A single call queued on the pool."""
+
+    __slots__ = ('call', 'cancel', 'done')
+
+    def __init__(self, call, cancel):
+        self.call   = call
+        self.cancel = cancel
+        self.done   = threading.Event()
+
+
+class WorkerPool:
+    """This class is a bounded pool of daemon worker threads.
+
+    The parameters are as follows:
+
+    workers  -- the number of worker threads.
+    backlog  -- the largest number of calls which may wait for a worker.
+    deadline -- the default time in seconds which run will wait for its calls to finish.
+    log      -- if not None a callable which is passed a message when a call raises an exception.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, workers=WORKERS, backlog=BACKLOG, deadline=DEADLINE, log=None):
+        self.deadline = deadline
+        self.log      = log
+        self.queue    = Queue.Queue(backlog)
+        self.threads  = []
+
+        for i in range(0, workers):
+            thread = threading.Thread(target=self.__work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def run(self, calls, deadline=None):
+        """Calls each of the given callables (with no parameters) on the pool and waits until they have finished or
+        the deadline has passed. Returns a list of booleans, in the same order as calls, which are True for those
+        calls which finished in time. Calls which have not started by the deadline are skipped, and those which
+        could not be queued at all are never made. The return values of the calls are discarded, and exceptions
+        they raise are logged, so a callable should record its result itself."""
+
+        cancel = threading.Event()
+        tasks  = [ Task(call, cancel) for call in calls ]
+
+        queued = []
+        for task in tasks:
+            try:
+                self.queue.put_nowait(task)
+            except Queue.Full:
+                break
+            queued.append(task)
+
+        end = time.time() + (deadline if deadline is not None else self.deadline)
+        for task in queued:
+            task.done.wait(max(0, end - time.time()))
+
+        finished = [ task.done.is_set() for task in tasks ]
+        cancel.set()
+        return finished
+
+    def __work(self):
+        while True:
+            task = self.queue.get()
+            try:
+                if not task.cancel.is_set():
+                    task.call()
+            except:
+                if self.log is not None:
+                    self.log(traceback.format_exc())
+            finally:
+                task.done.set()
@@ -79,6 +79,34 @@ use to implementors directly:
    will need to make use of this module unless they are implementing complex
    out of tree resources (in which case see the documentation of that
    module).
+
+-- UCServer.BodyParsing
+   This module contains internal code used by the server to extract the data
+   it needs from the XML bodies of PUT and POST requests, it is unlikely that
+   the server implementor will need to make use of this module unless they
+   are implementing out of tree resources which accept request bodies.
+
+-- UCServer.Indexes
+   This module contains internal code used by the server to hold precomputed
+   indexes of the data sources set by the server implementor (such as the
+   category tree), it is highly unlikely that the server implementor will need
+   to make use of this module.
+
+-- UCServer.Cursors
+   This module contains internal code used by the server to hold the state
+   of paged searches between requests, it is highly unlikely that the server
+   implementor will need to make use of this module.
+
+-- UCServer.Caches
+   This module contains internal code used by the server to cache the
+   results of recent searches, it is highly unlikely that the server
+   implementor will need to make use of this module (but see the method
+   UCServer.UCServer.content_changed).
+
+-- UCServer.Workers
+   This module contains internal code used by the server to carry out work
+   for a request concurrently on a bounded pool of threads, it is highly
+   unlikely that the server implementor will need to make use of this module.
 """
 
 __version__ = "0.6.0"
@@ -104,6 +132,10 @@ from Exceptions import *
 from Exceptions import UCException
 from HTTPHandling import *
 import ResourceHandlers
+import Indexes
+import Cursors
+import Caches
+import Workers
 
 from currentipaddress import currentipaddress
 
@@ -235,6 +267,7 @@ class UCServer:
         self.outputs       = dict() 
         self.source_lists  = dict()
         self.sources       = dict()
+        self.source_list_index = Indexes.SourceListIndex(self.source_lists, self.sources)
         self.ids_for_sref  = dict()
         self.ids_for_lcn   = dict()
         self.brands        = dict()
@@ -242,6 +275,10 @@ class UCServer:
         self.main_output   = None
         self.content       = None
         self.categories    = dict()
+        self.category_index= Indexes.CategoryIndex(self.categories)
+        self.cursors       = Cursors.CursorCache()
+        self.search_cache  = Caches.SearchCache()
+        self.workers       = Workers.WorkerPool(log=lambda message : self.log_message("%s", message))
         self.button_handler= None
         self.realm         = realm
 
@@ -347,11 +384,16 @@ class UCServer:
                                                             
                                                             OPTIONALLY,
                                                             'length'   : FLOAT,
+                                                            'drift'    : FLOAT,
                                                             },
                                      },
              ...}
 
 
+             The 'drift' element of a playhead is an extension: the largest error in seconds which the server expects
+             in a position extrapolated from the playhead before it next checks the playhead, reported in the
+             attribute drift of the <playhead> element.
+
              The 'programme' element of an output object will be set by the code of this library in response to
              PUT requests to the relevent output resource. A 'selector' MUST also respond to the calls:
 
@@ -396,8 +438,13 @@ class UCServer:
                                        ),             
                   ... 
                 }
+
+        The server keeps an index of each list's sources sorted by lcn. Changes to the membership of a list
+        are picked up automatically, but calling source_lists_changed when they happen avoids the work being
+        done during the next request.
         """
         self.source_lists = source_lists
+        self.source_list_index = Indexes.SourceListIndex(self.source_lists, self.sources)
 
     def set_sources(self,sources):
         """This method is used to set a data source which contains information about the
@@ -425,8 +472,28 @@ class UCServer:
                              },
                              ...
             }            
+
+        If the 'lcn' of a source is later changed (or a source is added or removed) then the method
+        sources_changed must be called so that the server's source-list index can be updated.
         """
         self.sources = sources
+        self.source_list_index = Indexes.SourceListIndex(self.source_lists, self.sources)
+
+    def source_lists_changed(self,list_id=None):
+        """This method may be called by the server implementor whenever the sources in one of the source-lists
+        passed to set_source_lists are altered (or list_id may be left as None if several lists, or the set of
+        lists itself, have changed). It updates the server's index of the lists, but does not itself trigger a
+        notifiable change.
+        """
+        self.source_list_index.list_changed(list_id)
+
+    def sources_changed(self,sid=None):
+        """This method should be called by the server implementor whenever a source in the object passed to
+        set_sources is added, removed, or has its 'lcn' altered (or sid may be left as None if many sources have
+        changed). It updates the server's index of the source-lists, but does not itself trigger a notifiable
+        change.
+        """
+        self.source_list_index.source_changed(sid)
 
     def set_controls(self,controls):
         """This method is used to set which control profiles the box responds to. The parameter must be a 
@@ -468,7 +535,8 @@ class UCServer:
                                      'AV',          # bool
                                      'start',       # datetime.datetime
                                      'end',         # datetime.datetime
-                                     'days'         # integer
+                                     'days',        # integer
+                                     'typeahead'    # bool (get_text only, a quick search made as the user types)
         each of which stores a local 
         
         The returned objects should be list of 2-tuples containing a dictionary-like objects of the form:
@@ -539,8 +607,28 @@ class UCServer:
                           }
 
         and a boolean indicating if there are more results available.
+
+        Optionally a list for which there are more results may be returned as a 3-tuple instead, the third
+        member of which is an iterable yielding the results which follow those returned (in order, after the
+        offset has been applied). The server keeps these for a short time, and if a client asks for the next
+        page using the cursor it was given then the page is taken from them without calling the content
+        object again. A list returned as a 3-tuple whose third member is None (with the boolean True) is
+        taken to be incomplete, for instance because a source did not answer in time: it is sent with
+        more="true" but no cursor, and the results it is part of are not cached.
+
+        The results of searches are cached for a short time, so the method content_changed should be called
+        whenever the programmes available from the content object change.
         """                      
         self.content = content
+        self.search_cache.invalidate()
+
+    def content_changed(self):
+        """This method should be called by the server implementor whenever the programmes available from the
+        object passed to set_content change (for instance when new guide data arrives or a recording is made or
+        deleted). It discards the cached results of earlier searches, but does not itself trigger a notifiable
+        change.
+        """
+        self.search_cache.invalidate()
 
     def set_categories(self,categories):
         """This method is used to provide the information used by the "uc/categories" resource (and also the
@@ -561,8 +649,13 @@ class UCServer:
         value for their 'id' key. CATEGORY-ID strings which are not used by the API may be any string, those
         which are to be used by the API (ie. those which also appear as the value for the 'id' key) must conform
         to the requirements of an id-component according to the UC Spec.
+
+        The server builds an index of the category tree (and a pre-rendered "uc/categories" document) from this
+        object when it is set, so the object must not be changed in place afterwards: to change the categories
+        call this method again with the new object.
         """
         self.categories = categories
+        self.category_index = Indexes.CategoryIndex(categories)
 
     def set_button_handler(self,button_handler):
         """This method is used to assign an object to process simulated button pushes (as used by uc/remote resource).
@@ -571,6 +664,11 @@ class UCServer:
           def send_button_press(code, output=None)
 
         Which takes a keycode as a string as its first parameter, and as an optional second paramter takes an output-id.
+        It may also respond to the method:
+
+          def send_button_presses(codes, output=None)
+
+        Which takes a list of keycodes, to be pressed in order, in place of calling send_button_press for each of them.
         """
         self.button_handler = button_handler
 
@@ -0,0 +1,57 @@
+# Tests for the UC Server library
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+"""\
+Unit tests for the modules of the UCServer library which do not need a
+running server. Run them from the directory above this one with:
+
+    python -m unittest discover -s tests -t .
+
+The other libraries UCServer imports are found in the directories next to
+this library's, so they need not be installed.
+"""
+
+import os
+import sys
+
+# ensure UCServer and the libraries it imports are findable in the path for importing,
+# without needing to be installed:
+lib = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for name in ("UCServer", "UCAuthenticationServer", "HTTPAuthenticationServer", "BasicCORSServer", "Zeroconf"):
+    if os.path.join(lib, name) not in sys.path:
+        sys.path.insert(0, os.path.join(lib, name))
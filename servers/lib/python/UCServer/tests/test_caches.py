@@ -0,0 +1,202 @@
+# Tests for the UC Server library - Caches
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import unittest
+import threading
+import datetime
+import time
+
+from UCServer.Caches import SearchCache
+
+
+class SearchCacheTest(unittest.TestCase):
+
+    def compute(self, results, calls, wait=None):
+        def call():
+            calls.append(1)
+            if wait is not None:
+                wait.wait()
+            return results
+        return call
+
+    def test_hit_is_stored_without_continuations(self):
+        cache = SearchCache()
+        calls = []
+        continuation = iter([ 'c' ])
+
+        first  = cache.get('key', self.compute([ ([ 'a', 'b' ], True, continuation) ], calls))
+        second = cache.get('key', self.compute([ ([ 'x' ], False) ], calls))
+
+        self.assertEqual(first, [ ([ 'a', 'b' ], True, continuation) ])
+        self.assertEqual(second, [ ([ 'a', 'b' ], True) ])
+        self.assertEqual(len(calls), 1)
+
+    def test_incomplete_results_are_not_stored(self):
+        cache = SearchCache()
+        calls = []
+
+        cache.get('key', self.compute([ ([ 'a' ], True, None) ], calls))
+        cache.get('key', self.compute([ ([ 'a' ], True, None) ], calls))
+
+        self.assertEqual(len(calls), 2)
+
+    def test_invalidate_discards_entries(self):
+        cache = SearchCache()
+        calls = []
+
+        cache.get('key', self.compute([ ([ 'old' ], False) ], calls))
+        cache.invalidate()
+        results = cache.get('key', self.compute([ ([ 'new' ], False) ], calls))
+
+        self.assertEqual(results, [ ([ 'new' ], False) ])
+        self.assertEqual(len(calls), 2)
+
+    def test_results_computed_across_invalidate_are_not_stored(self):
+        cache   = SearchCache()
+        calls   = []
+        release = threading.Event()
+
+        thread = threading.Thread(target=cache.get, args=('key', self.compute([ ([ 'stale' ], False) ], calls, release)))
+        thread.start()
+        while not calls:
+            time.sleep(0.001)
+        cache.invalidate()
+        release.set()
+        thread.join()
+
+        results = cache.get('key', self.compute([ ([ 'fresh' ], False) ], calls))
+        self.assertEqual(results, [ ([ 'fresh' ], False) ])
+
+    def test_concurrent_misses_share_one_computation(self):
+        cache   = SearchCache()
+        calls   = []
+        release = threading.Event()
+        results = []
+
+        def get():
+            results.append(cache.get('key', self.compute([ ([ 'a' ], False) ], calls, release)))
+
+        threads = [ threading.Thread(target=get) for n in range(8) ]
+        for thread in threads:
+            thread.start()
+        while not calls:
+            time.sleep(0.001)
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [ [ ([ 'a' ], False) ] ] * 8)
+
+    def test_waiters_compute_for_themselves_when_the_leader_fails(self):
+        cache   = SearchCache()
+        release = threading.Event()
+        started = threading.Event()
+        errors  = []
+        results = []
+
+        def fail():
+            started.set()
+            release.wait()
+            raise ValueError("content object failed")
+
+        def lead():
+            try:
+                cache.get('key', fail)
+            except ValueError:
+                errors.append(1)
+
+        def follow():
+            results.append(cache.get('key', lambda : [ ([ 'b' ], False) ]))
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait()
+        follower = threading.Thread(target=follow)
+        follower.start()
+        time.sleep(0.05)
+        release.set()
+        leader.join()
+        follower.join()
+
+        self.assertEqual(errors, [ 1 ])
+        self.assertEqual(results, [ [ ([ 'b' ], False) ] ])
+
+    def test_expiry(self):
+        cache = SearchCache(ttl=0.05)
+        calls = []
+
+        cache.get('key', self.compute([ ([ 'a' ], False) ], calls))
+        time.sleep(0.1)
+        cache.get('key', self.compute([ ([ 'a' ], False) ], calls))
+
+        self.assertEqual(len(calls), 2)
+
+    def test_least_recently_used_evicted_when_full(self):
+        cache = SearchCache(max_entries=2)
+        calls = []
+
+        cache.get('a', self.compute([], calls))
+        cache.get('b', self.compute([], calls))
+        cache.get('a', self.compute([], calls))
+        cache.get('c', self.compute([], calls))
+        self.assertEqual(len(calls), 3)
+
+        cache.get('a', self.compute([], calls))
+        self.assertEqual(len(calls), 3)
+        cache.get('b', self.compute([], calls))
+        self.assertEqual(len(calls), 4)
+
+    def test_key(self):
+        cache = SearchCache(now_bucket=3600)
+        start = datetime.datetime(2011, 1, 1, 12, 0)
+        params = { 'results' : 10, 'offset' : 0, 'sid' : [ 'a', 'b' ], 'start' : start, 'cursor' : 'x' }
+
+        self.assertEqual(cache.key('uc/search/sources', params),
+                         cache.key('uc/search/sources', dict(params, cursor='y')))
+        self.assertNotEqual(cache.key('uc/search/sources', params),
+                            cache.key('uc/search/text', params))
+        self.assertNotEqual(cache.key('uc/search/sources', params),
+                            cache.key('uc/search/sources', dict(params, offset=10)))
+        self.assertEqual(cache.key('uc/search/sources', params, False),
+                         cache.key('uc/search/sources', dict(params, start=start + datetime.timedelta(days=1)), False))
+
+
+if __name__ == "__main__":
+    unittest.main()
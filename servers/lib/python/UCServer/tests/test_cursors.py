@@ -0,0 +1,108 @@
+# Tests for the UC Server library - Cursors
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import unittest
+import threading
+import time
+
+from UCServer.Cursors import CursorCache
+from UCServer.Exceptions import InvalidSyntax
+
+
+class CursorCacheTest(unittest.TestCase):
+
+    def test_resume_returns_offset_and_continuation_once(self):
+        cursors = CursorCache()
+        token = cursors.store('search', 20, 'continuation')
+
+        self.assertEqual(cursors.resume(token, 'search'), (20, 'continuation'))
+        self.assertEqual(cursors.resume(token, 'search'), (20, None))
+
+    def test_resume_with_another_key_leaves_the_cursor(self):
+        cursors = CursorCache()
+        token = cursors.store('search', 10, 'continuation')
+
+        self.assertEqual(cursors.resume(token, 'other search'), (10, None))
+        self.assertEqual(cursors.resume(token, 'search'), (10, 'continuation'))
+
+    def test_unstored_token_encodes_its_offset(self):
+        cursors = CursorCache()
+        self.assertEqual(cursors.resume(cursors.token(30), 'search'), (30, None))
+
+    def test_malformed_token(self):
+        cursors = CursorCache()
+        for token in ('', 'abc', '0123456789abcdef', '0123456789abcdef--1', 'ZZZZZZZZZZZZZZZZ-1'):
+            self.assertRaises(InvalidSyntax, cursors.resume, token, 'search')
+
+    def test_expiry(self):
+        cursors = CursorCache(ttl=0.05)
+        token = cursors.store('search', 5, 'continuation')
+        time.sleep(0.1)
+        self.assertEqual(cursors.resume(token, 'search'), (5, None))
+
+    def test_oldest_evicted_when_full(self):
+        cursors = CursorCache(max_cursors=2)
+        tokens = [ cursors.store('search', n, n) for n in (1, 2, 3) ]
+
+        self.assertEqual(cursors.resume(tokens[0], 'search'), (1, None))
+        self.assertEqual(cursors.resume(tokens[1], 'search'), (2, 2))
+        self.assertEqual(cursors.resume(tokens[2], 'search'), (3, 3))
+
+    def test_concurrent_resume_hands_out_continuation_once(self):
+        cursors = CursorCache()
+        token   = cursors.store('search', 1, 'continuation')
+        results = []
+        start   = threading.Event()
+
+        def resume():
+            start.wait()
+            results.append(cursors.resume(token, 'search')[1])
+
+        threads = [ threading.Thread(target=resume) for n in range(16) ]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count('continuation'), 1)
+        self.assertEqual(results.count(None), 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,146 @@
+# Tests for the UC Server library - Workers
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# This code may be used under the terms of either of the following
+# licences:
+#
+# 1) GPLv2:
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; either version 2 of the License, or
+#   (at your option) any later version.
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+#
+# 2) Apache 2.0:
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+
+import unittest
+import threading
+import time
+
+from UCServer.Workers import WorkerPool
+from UCServer.ResourceHandlers import SearchBatchQuery, UCResourceHandler
+from UCServer.Exceptions import CannotFind
+
+
+class WorkerPoolTest(unittest.TestCase):
+
+    def test_runs_calls_concurrently(self):
+        pool    = WorkerPool(workers=4)
+        threads = set()
+
+        def call():
+            threads.add(threading.current_thread())
+            time.sleep(0.05)
+
+        began    = time.time()
+        finished = pool.run([ call ] * 4)
+
+        self.assertEqual(finished, [ True ] * 4)
+        self.assertEqual(len(threads), 4)
+        self.assertTrue(time.time() - began < 0.15)
+
+    def test_deadline(self):
+        pool    = WorkerPool(workers=1)
+        release = threading.Event()
+        made    = []
+
+        finished = pool.run([ release.wait, lambda : made.append(1) ], deadline=0.05)
+        release.set()
+        pool.run([ lambda : None ])
+
+        self.assertEqual(finished, [ False, False ])
+        self.assertEqual(made, [])
+
+    def test_calls_which_cannot_be_queued_are_not_made(self):
+        pool    = WorkerPool(workers=1, backlog=1)
+        release = threading.Event()
+        made    = []
+
+        blocker = threading.Thread(target=pool.run, args=([ release.wait ],))
+        blocker.start()
+        time.sleep(0.05)
+
+        finished = pool.run([ lambda : made.append(1), lambda : made.append(2) ], deadline=0.2)
+        release.set()
+        blocker.join()
+
+        self.assertEqual(finished, [ False, False ])
+        self.assertEqual(made, [])
+
+    def test_exceptions_are_logged(self):
+        messages = []
+        pool     = WorkerPool(workers=1, log=messages.append)
+
+        def fail():
+            raise ValueError("call failed")
+
+        self.assertEqual(pool.run([ fail, lambda : None ]), [ True, True ])
+        self.assertEqual(len(messages), 1)
+        self.assertTrue('call failed' in messages[0])
+
+
+class SearchHandler(UCResourceHandler):
+    """Stands in for one of the uc/search resource handlers."""
+
+    data = { 'resource' : 'uc/search/test' }
+
+    def do_GET(self):
+        if not self.handler.check_authentication(''):
+            return
+        if self.path[-1] == 'missing':
+            raise CannotFind
+        if self.path[-1] == 'broken':
+            self.handler.log_message('broken %s', 'search')
+            raise ValueError("search failed")
+        self.collect.append((self.resource, [ ([ self.path[-1] ], False) ], None))
+
+
+class SearchBatchQueryTest(unittest.TestCase):
+
+    def run_query(self, name, standby=False):
+        query = SearchBatchQuery(SearchHandler, [ 'uc', 'search', 'test', name ], '?results=1', { 'results' : [ '1' ] }, standby)
+        query.run()
+        return query
+
+    def test_results_are_collected(self):
+        query = self.run_query('found')
+        self.assertEqual(query.outcome, ('uc/search/test?results=1', [ ([ 'found' ], False) ], None))
+        self.assertEqual(query.messages, [])
+
+    def test_standby_dispatches_to_standby_do_GET(self):
+        self.assertEqual(self.run_query('found', standby=True).outcome, 405)
+
+    def test_errors_give_status_codes(self):
+        self.assertEqual(self.run_query('missing').outcome, 404)
+
+        query = self.run_query('broken')
+        self.assertEqual(query.outcome, 500)
+        self.assertEqual(query.messages[0], 'broken search')
+        self.assertTrue('search failed' in query.messages[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -48,6 +48,20 @@ cdef keycode(Display *dpy, key_string):
     kc = XKeysymToKeycode(dpy, ks)
     return <int>kc
 
+cdef presses(Display *dpy, key):
+    """the keycodes to press, in order, for a Tk-style key name"""
+    if key == '-':
+        key = 'minus'
+    if key.isupper():
+        key = "Shift-%s" % key
+
+    codes = []
+    for k in key.split('-'):
+        if k in ['Shift','Alt','Control']:
+            k = '%s_L' % k
+        codes.append(keycode(dpy, k))
+    return codes
+
 cdef class XTest:
     cdef Display *dpy
     def __init__(self, display=":0.0"):
@@ -75,23 +89,39 @@ cdef class XTest:
         cdef Display *d
         d = self.dpy
 
-        if key == '-':
-            key = 'minus'
-        if key.isupper():
-            key = "Shift-%s" % key
-
-        presses = []
-        for k in key.split('-'):
-            if k in ['Shift','Alt','Control']:
-                k = '%s_L' % k
-            presses.append(keycode(self.dpy, k))
+        codes = presses(d, key)
 
         if down:
-            for k in presses:
+            for k in codes:
                 XTestFakeKeyEvent(d, k, True, CurrentTime)
         if up:
-            for k in presses[::-1]:
+            for k in codes[::-1]:
+                XTestFakeKeyEvent(d, k, False, CurrentTime)
+        XFlush(d)
+
+    def fakeKeySequence(self, keys, delay=0):
+        """keys is a list of keys in the form taken by fakeKeyEvent,
+        which are each pressed and released in turn.
+
+        All of the keys are looked up before any are sent, so a key with
+        no symbol raises ValueError without any being pressed. The events
+        are then sent together, with the X server waiting delay
+        milliseconds before processing each key after the first, so
+        pacing the keys does not hold up the caller.
+        """
+        cdef Display *d
+        d = self.dpy
+
+        sequence = [ presses(d, key) for key in keys ]
+
+        pause = 0
+        for codes in sequence:
+            for k in codes:
+                XTestFakeKeyEvent(d, k, True, pause)
+                pause = 0
+            for k in codes[::-1]:
                 XTestFakeKeyEvent(d, k, False, CurrentTime)
+            pause = delay
         XFlush(d)
       
     def fakeButtonEvent(self, button, is_press):
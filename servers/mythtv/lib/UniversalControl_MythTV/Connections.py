@@ -0,0 +1,168 @@
+# MythTV Universal Control Server - Connections
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Connections
+
+Pools of the handles used to talk to MythTV (database handles, backend
+protocol connections and the frontend control connection), so that they are
+made once and reused rather than being set up afresh for every operation.
+
+A handle is borrowed from a pool for the duration of a with statement:
+
+    with connections.db() as db:
+        guides = list(db.searchGuide(chanid=...))
+
+If the body raises one of the pool's fatal exceptions the handle is thrown
+away rather than returned. A handle which has been idle for a while, or whose
+borrower raised any other exception (which may have come from a broken
+handle, such as a database error), is checked before it is lent out again. When making a new handle fails the pool
+waits before trying again, doubling the wait after each failure up to a
+limit, and until then raises Unavailable at once instead of trying.
+"""
+
+import threading
+import contextlib
+import time
+
+__all__ = [ "Pool",
+            "Connections",
+            "Unavailable", ]
+
+
+class Unavailable(Exception):
+    """Raised when a handle is asked for whilst the pool is waiting to retry after a failure."""
+    pass
+
+
+class Pool:
+    """A pool of up to size handles made by calling factory.
+
+    The parameters are as follows:
+
+    name           -- used in log messages.
+    factory        -- a callable which makes a new handle, raising an exception if it cannot.
+    check          -- if not None a callable which is passed a handle which has been idle for at least check_interval
+                      seconds, or whose last borrower raised an exception, before it is lent out, and should raise an
+                      exception if the handle is no longer usable.
+    size           -- the largest number of handles which may be lent out at once. Borrowers wait for a handle if
+                      this many are in use, so a pool of size 1 serialises access to a single handle.
+    check_interval -- as described above.
+    backoff        -- a tuple of the first and longest waits, in seconds, before trying to make a handle again.
+    fatal          -- a tuple of the exception classes which mean that a handle should be thrown away.
+    log            -- if not None a callable which is passed a message when a handle cannot be made.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, name, factory, check=None, size=4, check_interval=30.0, backoff=(0.5, 8.0), fatal=(Exception,), log=None):
+        self.name           = name
+        self.factory        = factory
+        self.check          = check
+        self.check_interval = check_interval
+        self.backoff        = backoff
+        self.fatal          = fatal
+        self.log            = log
+
+        self.lock      = threading.Lock()
+        self.slots     = threading.BoundedSemaphore(size)
+        self.idle      = []     # (handle, time returned, suspect) for the handles not lent out, most recent last
+        self.failures  = 0
+        self.retry_at  = 0.0
+
+    @contextlib.contextmanager
+    def __call__(self, force=False):
+        """Lends out a handle for the duration of a with statement. If force is True then a new handle is made if one
+        is needed even if the pool is waiting to retry."""
+
+        self.slots.acquire()
+        try:
+            handle = self.__checkout(force)
+            try:
+                yield handle
+            except self.fatal:
+                raise
+            except:
+                self.__checkin(handle, suspect=True)
+                raise
+            else:
+                self.__checkin(handle)
+        finally:
+            self.slots.release()
+
+    def reset(self):
+        """Throws away all idle handles and forgets any failures, so that the next borrower makes a new handle."""
+        with self.lock:
+            self.idle     = []
+            self.failures = 0
+            self.retry_at = 0.0
+
+    def __checkin(self, handle, suspect=False):
+        with self.lock:
+            self.idle.append((handle, time.time(), suspect))
+
+    def __checkout(self, force):
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                (handle, returned, suspect) = self.idle.pop()
+
+            if self.check is None or (not suspect and time.time() - returned < self.check_interval):
+                return handle
+            try:
+                self.check(handle)
+            except:
+                continue
+            return handle
+
+        with self.lock:
+            if not force and time.time() < self.retry_at:
+                raise Unavailable, "%s unavailable" % self.name
+
+        try:
+            handle = self.factory()
+        except:
+            with self.lock:
+                self.failures += 1
+                self.retry_at = time.time() + min(self.backoff[1], self.backoff[0]*(2**(self.failures - 1)))
+                failures = self.failures
+            if self.log is not None:
+                self.log("Could not connect to %s (%d consecutive failures)" % (self.name, failures))
+            raise
+
+        with self.lock:
+            self.failures = 0
+            self.retry_at = 0.0
+        return handle
+
+
+class Connections:
+    """The pools of MythTV handles used by the server.
+
+    db_factory, backend_factory and frontend_factory make a database handle, a backend connection and a frontend
+    control connection respectively. The pools are available as the attributes db, backend and frontend; the frontend
+    pool holds a single connection, since commands sent to the frontend must not be interleaved.
+    """
+
+    def __init__(self, db_factory, backend_factory, frontend_factory, db_check=None, frontend_check=None, fatal=(Exception,), log=None):
+        self.db       = Pool('database', db_factory, check=db_check, size=4, fatal=fatal, log=log)
+        self.backend  = Pool('backend', backend_factory, size=2, fatal=fatal, log=log)
+        self.frontend = Pool('frontend', frontend_factory, check=frontend_check, size=1, fatal=fatal, log=log)
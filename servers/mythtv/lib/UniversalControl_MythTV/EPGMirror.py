@@ -0,0 +1,454 @@
+# MythTV Universal Control Server - Local EPG Mirror
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Local EPG Mirror
+
+A SQLite copy of the parts of the MythTV database which the server searches:
+the programme guide and the MythNetVision articles. Searches
+are made against the mirror, so their latency does not depend on the load on
+the MythTV backend.
+
+The mirror is brought up to date by calls to EPGMirror.sync (which
+EPGMirror.start makes periodically from a background thread). Each call is
+incremental:
+
+ -- The guide is synced a day at a time. Every pass re-reads the current day
+    and one further day, rotating through the days ahead, and compares a
+    fingerprint of each row with the mirror's copy so that only changed rows
+    are written. Rows which ended long enough ago are expired.
+ -- Articles are compared by fingerprint and only changed ones are written.
+
+Times are stored as MythTV local times, exactly as the backend reports them.
+
+The backend itself is reached through an object passed to the constructor,
+which must provide the methods:
+
+    guide(**kwargs)  -- returns an iterable of guide entries, taking the same
+                        keyword parameters as MythDB.searchGuide.
+    articles()       -- returns an iterable of rows of the
+                        internetcontentarticles table.
+
+The mirror is kept in WAL mode, so that searches do not wait for a sync (or
+for each other): syncs write through a single connection, whilst searches
+borrow one of a pool of read-only connections, each of which sees the mirror
+as it was after the last sync to complete. WAL needs a database file, so a
+mirror asked to live in memory is kept in a temporary file instead, which is
+removed when the server exits.
+
+A mirror can also be created from a dump of another with EPGMirror.from_dump,
+in which case it is a fixture: it never syncs, and so never needs a backend.
+"""
+
+import threading
+import sqlite3
+import datetime
+import traceback
+import tempfile
+import atexit
+import os
+
+from Connections import Pool
+
+__all__ = [ "EPGMirror",
+            "GuideRow",
+            "ArticleRow", ]
+
+
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+def format_time(when):
+    """Converts a datetime into the form in which times are stored in the mirror."""
+    if when is None:
+        return None
+    if isinstance(when, basestring):
+        return when[:19]
+    return when.strftime(TIME_FORMAT)
+
+def parse_time(text):
+    """Converts a time stored in the mirror back into a datetime."""
+    if text is None:
+        return None
+    return datetime.datetime(int(text[0:4]), int(text[5:7]), int(text[8:10]),
+                             int(text[11:13]), int(text[14:16]), int(text[17:19]))
+
+def text_value(value):
+    """Converts an attribute of a backend row into the unicode string stored in the mirror."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.decode('utf-8', 'replace')
+    return unicode(value)
+
+def contains(text, term):
+    """The SQL function uccontains, which tests whether the upper-cased text contains the term (as the text searches of
+    Programmes.filterprogrammes do)."""
+    if text is None or term is None:
+        return False
+    return term in text.upper()
+
+
+def temporary_database():
+    """Returns the filename of a new temporary file to hold a mirror, which will be removed (along with the WAL
+    files SQLite keeps beside it) when the interpreter exits."""
+    (fd, path) = tempfile.mkstemp(prefix='ucepg-', suffix='.sqlite')
+    os.close(fd)
+
+    def remove():
+        for filename in (path, path + '-wal', path + '-shm'):
+            try:
+                os.remove(filename)
+            except OSError:
+                pass
+
+    atexit.register(remove)
+    return path
+
+
+class Row(object):
+    """Base class for the rows returned by the mirror. Subclasses list their columns in the class variables
+    columns (all columns) and times (those which hold datetimes), and the rows are built by from_backend and
+    from_mirror."""
+
+    __slots__ = ()
+    columns   = ()
+    times     = ()
+
+    def __init__(self, **kwargs):
+        for column in self.columns:
+            setattr(self, column, kwargs.get(column))
+
+    @classmethod
+    def from_backend(cls, row):
+        """Builds a row from an object returned by the backend."""
+        values = dict()
+        for column in cls.columns:
+            value = getattr(row, column, None)
+            if column not in cls.times and column not in ('chanid', 'filesize'):
+                value = text_value(value)
+            values[column] = value
+        return cls(**values)
+
+    @classmethod
+    def from_mirror(cls, values):
+        """Builds a row from a tuple of values read from the mirror (in the order of cls.columns)."""
+        row = cls()
+        for (column, value) in zip(cls.columns, values):
+            if column in cls.times:
+                value = parse_time(value)
+            setattr(row, column, value)
+        return row
+
+    def values(self):
+        """Returns a tuple of the values of the row in the form in which they are stored in the mirror."""
+        return tuple([ (format_time(getattr(self, column)) if column in self.times else getattr(self, column))
+                       for column in self.columns ])
+
+
+class GuideRow(Row):
+    """A programme guide entry, with the attributes used by Programmes.programme_from_guide."""
+    __slots__ = ('chanid', 'starttime', 'endtime', 'title', 'subtitle', 'description', 'category',
+                 'programid', 'seriesid', 'videoprop', 'audioprop', 'subtitletypes')
+    columns   = __slots__
+    times     = ('starttime', 'endtime')
+
+
+class ArticleRow(Row):
+    """A MythNetVision article."""
+    __slots__ = ('url', 'feedtitle', 'title', 'description', 'thumbnail', 'mediaURL', 'date')
+    columns   = __slots__
+    times     = ('date',)
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS program (
+    chanid        INTEGER NOT NULL,
+    starttime     TEXT NOT NULL,
+    endtime       TEXT NOT NULL,
+    title         TEXT,
+    subtitle      TEXT,
+    description   TEXT,
+    category      TEXT,
+    programid     TEXT,
+    seriesid      TEXT,
+    videoprop     TEXT,
+    audioprop     TEXT,
+    subtitletypes TEXT,
+    PRIMARY KEY (chanid, starttime)
+);
+CREATE INDEX IF NOT EXISTS program_endtime   ON program (endtime);
+CREATE INDEX IF NOT EXISTS program_starttime ON program (starttime);
+CREATE INDEX IF NOT EXISTS program_programid ON program (programid);
+CREATE INDEX IF NOT EXISTS program_seriesid  ON program (seriesid);
+CREATE INDEX IF NOT EXISTS program_category  ON program (category);
+
+CREATE TABLE IF NOT EXISTS netvision (
+    url           TEXT PRIMARY KEY,
+    feedtitle     TEXT,
+    title         TEXT,
+    description   TEXT,
+    thumbnail     TEXT,
+    mediaURL      TEXT,
+    date          TEXT,
+    feed          TEXT
+);
+CREATE INDEX IF NOT EXISTS netvision_feed ON netvision (feed);
+"""
+
+
+class EPGMirror:
+    """A local SQLite mirror of the MythTV guide and MythNetVision articles.
+
+    The parameters are as follows:
+
+    backend  -- the object through which the MythTV database is read (see the module documentation). May be None
+                for a fixture.
+    path     -- the filename of the SQLite database, by default a temporary file (see the module documentation).
+    days     -- how many days of guide data ahead of the current day to keep.
+    history  -- a timedelta, how long after they have ended guide entries are kept.
+    feed_id  -- a callable which turns a MythNetVision feed title into the sid used for it. By default the title
+                is used unchanged.
+    readers  -- the largest number of searches which may read the mirror at once.
+
+    The member sequences is a dictionary mapping each of the table names 'program' and 'netvision' to a
+    number which is increased every time a sync changes that table, and sequence is the sum of these. Callables added
+    with add_listener are called with a set of the changed table names after every sync which changes anything.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, backend=None, path=':memory:', days=14, history=datetime.timedelta(days=1), feed_id=None, readers=4):
+        if path == ':memory:':
+            path = temporary_database()
+
+        self.backend  = backend
+        self.path     = path
+        self.days     = days
+        self.history  = history
+        self.feed_id  = feed_id if feed_id is not None else (lambda title : title)
+        self.fixture  = False
+
+        self.lock      = threading.RLock()
+        self.listeners = []
+        self.sequences = { 'program'    : 0,
+                           'netvision'  : 0, }
+        self.next_day  = 1
+        self.thread    = None
+
+        # self.db is only used by syncs (and whilst holding self.lock), searches use a connection from self.readers
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+        self.readers = Pool('EPG mirror', self.__reader, size=readers, fatal=(sqlite3.DatabaseError,))
+
+    @classmethod
+    def from_dump(cls, filename, feed_id=None):
+        """Creates an in-memory fixture mirror from an SQL dump (as written by dump). The fixture will not sync."""
+        mirror = cls(backend=None, feed_id=feed_id)
+        with open(filename) as f:
+            script = f.read()
+        with mirror.lock:
+            mirror.db.executescript("DROP TABLE program; DROP TABLE netvision; DROP TABLE IF EXISTS recordings; DROP TABLE IF EXISTS sync_state;")
+            mirror.db.executescript(script)
+            mirror.db.executescript(SCHEMA)
+            mirror.db.commit()
+        mirror.fixture = True
+        return mirror
+
+    def dump(self, filename):
+        """Writes an SQL dump of the mirror to the given file, suitable for loading with from_dump."""
+        with self.lock:
+            with open(filename, 'w') as f:
+                for line in self.db.iterdump():
+                    f.write(('%s\n' % line).encode('utf-8'))
+
+    @property
+    def sequence(self):
+        return sum(self.sequences.values())
+
+    def add_listener(self, listener):
+        """Adds a callable which will be called with a set of table names after every sync which changes them."""
+        with self.lock:
+            self.listeners.append(listener)
+
+    def start(self, period=60, log=None):
+        """Starts a daemon thread which calls sync every period seconds. Exceptions raised by sync are passed (as a
+        formatted traceback) to log if it is not None. Does nothing for a fixture."""
+        if self.fixture or self.thread is not None:
+            return
+
+        mirror = self
+
+        class SyncThread(threading.Thread):
+            daemon = True
+
+            def run(self):
+                condition = threading.Condition()
+                while True:
+                    try:
+                        mirror.sync()
+                    except:
+                        if log is not None:
+                            log(traceback.format_exc())
+                    with condition:
+                        condition.wait(period)
+
+        self.thread = SyncThread()
+        self.thread.start()
+
+    def sync(self, now=None):
+        """Makes one incremental pass over the backend, returning a set of the names of the tables changed."""
+        if self.fixture:
+            return set()
+
+        if now is None:
+            now = datetime.datetime.now()
+
+        changed = set()
+        if self.sync_guide(now):
+            changed.add('program')
+        if self.sync_articles():
+            changed.add('netvision')
+
+        with self.lock:
+            for table in changed:
+                self.sequences[table] += 1
+            listeners = list(self.listeners)
+
+        if changed:
+            for listener in listeners:
+                listener(changed)
+        return changed
+
+    def sync_guide(self, now):
+        """Syncs the current day of the guide and the next day in the rotation, and expires old entries. If the mirror
+        holds no guide data then every day is synced at once. Returns the number of rows changed."""
+
+        today   = datetime.datetime(now.year, now.month, now.day)
+        horizon = today + datetime.timedelta(days=self.days + 1)
+        changes = 0
+
+        with self.lock:
+            empty = self.db.execute("SELECT COUNT(*) FROM program").fetchone()[0] == 0
+
+        if empty:
+            windows = [ (now - self.history, horizon), ]
+        else:
+            day = today + datetime.timedelta(days=self.next_day)
+            self.next_day = (self.next_day % self.days) + 1
+            windows = [ (now - self.history, today + datetime.timedelta(days=1)),
+                        (day, day + datetime.timedelta(days=1)), ]
+
+        # A window holds every entry showing at some point within it, both in the backend and in the mirror. Windows
+        # may overlap, since rows in the overlap are compared against the same backend data each time.
+        for (start, end) in windows:
+            rows = [ GuideRow.from_backend(guide) for guide in self.backend.guide(endafter=start, startbefore=end) ]
+            changes += self.__apply('program', ('chanid', 'starttime'), rows,
+                                    "endtime > ? AND starttime < ?", (format_time(start), format_time(end)))
+
+        with self.lock:
+            cursor = self.db.execute("DELETE FROM program WHERE endtime < ?", (format_time(now - self.history),))
+            changes += cursor.rowcount
+            self.db.commit()
+
+        return changes
+
+    def sync_articles(self):
+        """Brings the netvision table up to date with the backend's articles. Returns the number of rows changed."""
+        rows = [ ArticleRow.from_backend(article) for article in self.backend.articles() ]
+        return self.__apply('netvision', ('url',), rows, "1", (), extra={ 'feed' : lambda row : self.feed_id(row.feedtitle) })
+
+    def __apply(self, table, key_columns, rows, where, args, extra=None):
+        """Makes the rows of table matching the where clause equal to rows, writing only those rows which differ.
+        Returns the number of rows changed."""
+
+        cls     = rows[0].__class__ if rows else { 'program' : GuideRow, 'netvision' : ArticleRow }[table]
+        extra   = extra if extra is not None else dict()
+        columns = list(cls.columns) + extra.keys()
+        keyidx  = [ columns.index(column) for column in key_columns ]
+
+        wanted = dict()
+        for row in rows:
+            values = row.values() + tuple([ extra[column](row) for column in extra ])
+            wanted[tuple([ values[i] for i in keyidx ])] = values
+
+        with self.lock:
+            existing = dict()
+            for values in self.db.execute("SELECT %s FROM %s WHERE %s" % (', '.join(columns), table, where), args):
+                existing[tuple([ values[i] for i in keyidx ])] = tuple(values)
+
+            changes = 0
+            for key in wanted:
+                if key not in existing or existing[key] != wanted[key]:
+                    self.db.execute("INSERT OR REPLACE INTO %s (%s) VALUES (%s)" % (table, ', '.join(columns), ', '.join(['?']*len(columns))),
+                                    wanted[key])
+                    changes += 1
+            for key in existing:
+                if key not in wanted:
+                    self.db.execute("DELETE FROM %s WHERE %s" % (table, ' AND '.join([ '%s=?' % column for column in key_columns ])), key)
+                    changes += 1
+            self.db.commit()
+
+        return changes
+
+    def search_guide(self, chanid=None, endafter=None, startbefore=None, programid=None, seriesid=None, category=None):
+        """Returns a list of GuideRows, sorted by start time, matching all of the given parameters (which take the same
+        meanings as in MythDB.searchGuide, with times in MythTV local time)."""
+        clauses = []
+        args    = []
+        for (clause, value) in (("chanid=?",       chanid),
+                                ("endtime>?",      format_time(endafter)),
+                                ("starttime<?",    format_time(startbefore)),
+                                ("programid=?",    programid),
+                                ("seriesid=?",     seriesid),
+                                ("category=?",     category)):
+            if value is not None:
+                clauses.append(clause)
+                args.append(value)
+
+        return self.query_guide(' AND '.join(clauses) if clauses else '1', args, order='starttime, chanid')
+
+    def query_guide(self, where, args=(), order='starttime, chanid', limit=None, offset=None):
+        """Returns a list of GuideRows from the program table matching an arbitrary where clause."""
+        sql = "SELECT %s FROM program WHERE %s ORDER BY %s" % (', '.join(GuideRow.columns), where, order)
+        args = list(args)
+        if limit is not None:
+            sql += " LIMIT ? OFFSET ?"
+            args += [ limit, offset if offset is not None else 0 ]
+        with self.readers() as db:
+            return [ GuideRow.from_mirror(values) for values in db.execute(sql, args) ]
+
+    def articles(self, feed=None):
+        """Returns a list of ArticleRows, for the given feed (as returned by feed_id) if it is not None."""
+        with self.readers() as db:
+            if feed is None:
+                cursor = db.execute("SELECT %s FROM netvision ORDER BY rowid" % (', '.join(ArticleRow.columns),))
+            else:
+                cursor = db.execute("SELECT %s FROM netvision WHERE feed=? ORDER BY rowid" % (', '.join(ArticleRow.columns),), (feed,))
+            return [ ArticleRow.from_mirror(values) for values in cursor ]
+
+    def __reader(self):
+        """Makes a read-only connection to the mirror for the pool of readers."""
+        db = sqlite3.connect(self.path, check_same_thread=False)
+        db.create_function('uccontains', 2, contains)
+        db.execute("PRAGMA query_only=ON")
+        return db
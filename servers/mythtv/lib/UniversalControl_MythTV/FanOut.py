@@ -0,0 +1,171 @@
+# MythTV Universal Control Server - Fan Out
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Fan Out
+
+A small bounded pool of worker threads used by the content layer to gather
+results from several sources at once, so that a search over many channels
+waits for the slowest source rather than for all of them in turn.
+
+Each call to FanOut.run or FanOut.prefetch is given a deadline. Work which has
+not finished by then is abandoned: anything not yet started is skipped, and
+anything in progress is asked to stop at the next opportunity, while the
+caller carries on with whatever results it has. A source which fails is
+logged and treated in the same way as one which was abandoned, so that one
+broken source does not fail the whole search.
+
+Callables run on the pool must not themselves use the same pool, since they
+could then wait forever for a worker which is waiting for them.
+"""
+
+import threading
+import Queue
+import itertools
+import traceback
+import time
+import sys
+
+__all__ = [ "FanOut", ]
+
+
+class Task(object):
+    """A single callable queued on the pool."""
+
+    __slots__ = ('call', 'cancel', 'done', 'result', 'exc_info')
+
+    def __init__(self, call, cancel):
+        self.call     = call
+        self.cancel   = cancel
+        self.done     = threading.Event()
+        self.result   = None
+        self.exc_info = None
+
+    def run(self):
+        try:
+            if not self.cancel.is_set():
+                self.result = self.call()
+        except:
+            self.exc_info = sys.exc_info()
+        finally:
+            self.done.set()
+
+
+class Page(object):
+    """The items prefetched from a single source, and the iterator to continue with if there are more."""
+
+    __slots__ = ('items', 'rest')
+
+    def __init__(self):
+        self.items = []
+        self.rest  = None
+
+
+class FanOut:
+    """A bounded pool of daemon worker threads.
+
+    The parameters are as follows:
+
+    workers  -- the number of worker threads. If it is 0 then everything is run in the calling thread.
+    deadline -- the default time in seconds which run and prefetch will wait for results.
+    log      -- if not None a callable which is passed a message whenever work is abandoned or fails.
+    """
+
+    def __init__(self, workers=8, deadline=5.0, log=None):
+        self.deadline = deadline
+        self.log      = log
+        self.queue    = Queue.Queue()
+        self.threads  = []
+
+        for i in range(0, workers):
+            thread = threading.Thread(target=self.__work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def run(self, calls, deadline=None, default=None):
+        """Calls each of the given callables on the pool and returns a list of their return values in the same order.
+        Any callable which has not returned by the deadline is abandoned, and any which raises an exception is logged,
+        and default is used in place of the value of either."""
+
+        cancel = threading.Event()
+        tasks  = [ Task(call, cancel) for call in calls ]
+
+        if not self.threads:
+            for task in tasks:
+                task.run()
+        else:
+            for task in tasks:
+                self.queue.put(task)
+
+        end = time.time() + (deadline if deadline is not None else self.deadline)
+        for task in tasks:
+            task.done.wait(max(0, end - time.time()))
+
+        if not all([ task.done.is_set() for task in tasks ]):
+            cancel.set()
+            if self.log is not None:
+                self.log("Abandoned %d of %d sources after the deadline" % (len([ task for task in tasks if not task.done.is_set() ]), len(tasks)))
+
+        failed = [ task for task in tasks if task.done.is_set() and task.exc_info is not None ]
+        if self.log is not None:
+            for task in failed:
+                self.log("Source failed, treating it as empty:\n%s" % ''.join(traceback.format_exception(*task.exc_info)))
+
+        return [ (task.result if task.done.is_set() and task.exc_info is None else default) for task in tasks ]
+
+    def prefetch(self, sources, limit, deadline=None):
+        """Takes a list of callables, each of which returns an iterable, and reads up to limit items from each of them
+        on the pool. Returns a tuple of a list of iterables in the same order, each of which yields the items prefetched
+        from the corresponding source followed (if the limit was reached) by the rest of the source, read in the calling
+        thread, and a boolean which is False if any source was cut short. A source which has not reached the limit by
+        the deadline, or which fails, is cut short at the items read so far."""
+
+        cancel = threading.Event()
+        pages  = [ Page() for source in sources ]
+
+        def fetch(source, page):
+            def call():
+                iterator = iter(source())
+                for item in iterator:
+                    page.items.append(item)
+                    if len(page.items) >= limit:
+                        page.rest = iterator
+                        break
+                    if cancel.is_set():
+                        break
+            return call
+
+        done = self.run([ fetch(source, page) for (source, page) in zip(sources, pages) ], deadline=deadline, default=False)
+        if False in done:
+            cancel.set()
+
+        return ([ (itertools.chain(list(page.items), page.rest) if (completed is not False and page.rest is not None) else list(page.items))
+                  for (page, completed) in zip(pages, done) ],
+                False not in done)
+
+    def __work(self):
+        while True:
+            task = self.queue.get()
+            try:
+                task.run()
+            except:
+                if self.log is not None:
+                    self.log(traceback.format_exc())
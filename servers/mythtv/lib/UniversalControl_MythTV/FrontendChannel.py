@@ -0,0 +1,245 @@
+# MythTV Universal Control Server - Frontend Channel
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Frontend Channel
+
+A single daemon thread which sends commands to the frontend on behalf of the
+rest of the server, so that the threads handling HTTP requests hand their
+commands over and carry on rather than waiting for the frontend.
+
+Commands are queued, and each call which queues one returns a Future which is
+given the result when the command has been sent. The worker takes everything
+queued at once and sends it over the one frontend connection (borrowed from
+the frontend pool of Connections) without letting go of it in between.
+
+A command may be queued with a key, in which case it replaces any command with
+the same key which is still waiting to be sent, and the callers which queued
+both are given the result of the later one. So when a volume slider is
+dragged or the playhead scrubbed only the most recent volume or seek is sent,
+and callers asking the same question at once (such as the location) share a
+single query. The queue is bounded: a command which would overfill it is
+failed at once with Full rather than held.
+"""
+
+import threading
+import traceback
+import sys
+
+__all__ = [ "FrontendChannel",
+            "Future",
+            "Full",
+            "Timeout", ]
+
+
+class Full(Exception):
+    """Given to the future of a command which could not be queued because the queue was full."""
+    pass
+
+
+class Timeout(Exception):
+    """Raised by Future.result when the command has not finished in time."""
+    pass
+
+
+class Future(object):
+    """The result of a command, which will be available once the command has been sent."""
+
+    __slots__ = ('event', 'value', 'exc_info', 'callbacks', 'lock')
+
+    def __init__(self):
+        self.event     = threading.Event()
+        self.value     = None
+        self.exc_info  = None
+        self.callbacks = []
+        self.lock      = threading.Lock()
+
+    def done(self):
+        return self.event.is_set()
+
+    def failed(self):
+        """Returns True if the command has finished and raised an exception."""
+        return self.event.is_set() and self.exc_info is not None
+
+    def result(self, timeout=None):
+        """Returns the result of the command, waiting up to timeout seconds (or for as long as it takes if timeout is
+        None) for it. Raises the exception raised by the command if there was one, or Timeout."""
+        if not self.event.wait(timeout):
+            raise Timeout, "Frontend command not finished"
+        if self.exc_info is not None:
+            raise self.exc_info[0], self.exc_info[1], self.exc_info[2]
+        return self.value
+
+    def add_done_callback(self, callback):
+        """Arranges for callback to be called with the future when it is done (at once if it already is)."""
+        with self.lock:
+            if not self.event.is_set():
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def set_result(self, value):
+        self.value = value
+        self.__finish()
+
+    def set_exception(self, exc_info):
+        """Sets the exception raised by the command, as a tuple as returned by sys.exc_info."""
+        self.exc_info = exc_info
+        self.__finish()
+
+    def __finish(self):
+        with self.lock:
+            self.event.set()
+            (callbacks, self.callbacks) = (self.callbacks, [])
+        for callback in callbacks:
+            try:
+                callback(self)
+            except:
+                traceback.print_exc()
+
+
+class Command(object):
+    """A queued command, and the futures of the callers waiting for it."""
+
+    __slots__ = ('key', 'call', 'futures')
+
+    def __init__(self, key, call, future):
+        self.key     = key
+        self.call    = call
+        self.futures = [ future ]
+
+
+class FrontendChannel(threading.Thread):
+    """A daemon thread which sends queued commands to the frontend.
+
+    The parameters are as follows:
+
+    pool      -- the Pool (see Connections) of frontend connections.
+    connected -- if not None a callable which is passed True after a batch of commands has been sent over a connection
+                 borrowed from the pool (once it has been returned), and False when there is no frontend to borrow one
+                 from.
+    size      -- the largest number of commands which may wait to be sent.
+    log       -- if not None a callable which is passed a message when a command fails.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    daemon = True
+
+    def __init__(self, pool, connected=None, size=64, log=None):
+        threading.Thread.__init__(self)
+        self.pool      = pool
+        self.connected = connected
+        self.size      = size
+        self.log       = log
+        self.condition = threading.Condition()
+        self.queue     = []      # the commands waiting to be sent, oldest first
+        self.keyed     = dict()  # key -> the command in queue with that key
+        self.sent      = 0
+        self.coalesced = 0
+
+    def send(self, call, key=None):
+        """Queues call, which will be passed the frontend connection, and returns a Future for its result. If key is
+        not None then any command with the same key which is still queued is replaced by this one."""
+        future = Future()
+        with self.condition:
+            if key is not None and key in self.keyed:
+                command = self.keyed[key]
+                command.call = call
+                command.futures.append(future)
+                self.coalesced += 1
+                return future
+
+            if len(self.queue) >= self.size:
+                try:
+                    raise Full, "Frontend command queue full"
+                except Full:
+                    future.set_exception(sys.exc_info())
+                return future
+
+            command = Command(key, call, future)
+            self.queue.append(command)
+            if key is not None:
+                self.keyed[key] = command
+            self.condition.notify()
+        return future
+
+    def query(self, query):
+        """Queues a query, sharing the answer with any identical query still queued."""
+        return self.send(lambda fe : fe.sendQuery(query), key=('query', query))
+
+    def play(self, play, key=None):
+        """Queues a play command, whose result is True once it has been sent."""
+        return self.send(lambda fe : fe.sendPlay(play) or True, key=key)
+
+    def jump(self, jump, key=None):
+        """Queues a jump command, whose result is True once it has been sent."""
+        return self.send(lambda fe : fe.sendJump(jump) or True, key=key)
+
+    def pending(self):
+        """Returns the number of commands waiting to be sent."""
+        with self.condition:
+            return len(self.queue)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                batch = self.queue
+                self.queue = []
+                self.keyed = dict()
+            self.__send(batch)
+
+    def __send(self, batch):
+        """Sends a batch of commands over a single borrowed connection. If the connection fails then the command being
+        sent is failed, and so are the rest of the batch."""
+        borrowed = False
+        try:
+            with self.pool() as fe:
+                borrowed = True
+                while batch:
+                    command = batch.pop(0)
+                    try:
+                        result = command.call(fe)
+                    except self.pool.fatal:
+                        self.__fail(command, sys.exc_info())
+                        raise
+                    except:
+                        self.__fail(command, sys.exc_info())
+                    else:
+                        self.sent += 1
+                        for future in command.futures:
+                            future.set_result(result)
+        except:
+            exc_info = sys.exc_info()
+            for command in batch:
+                for future in command.futures:
+                    future.set_exception(exc_info)
+
+        # Reported only once the connection is back in the pool, since connected may borrow it itself
+        if self.connected is not None:
+            self.connected(borrowed)
+
+    def __fail(self, command, exc_info):
+        if self.log is not None:
+            self.log(''.join(traceback.format_exception(*exc_info)))
+        for future in command.futures:
+            future.set_exception(exc_info)
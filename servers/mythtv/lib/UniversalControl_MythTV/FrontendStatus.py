@@ -0,0 +1,241 @@
+# MythTV Universal Control Server - Frontend Status
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Frontend Status
+
+Parsers for the replies which the MythTV frontend's network control socket
+gives to the queries the server polls it with ('query location', 'query
+volume' and 'query livetv'). Each reply is turned into a record with typed
+attributes, so that the rest of the server does not need to know the format
+of the replies.
+
+The replies to 'query location' are matched against the patterns in
+LOCATION_PATTERNS in turn, and the first which matches decides the kind of
+the Location returned. All patterns are compiled once, when the module is
+loaded. The parsers never raise on a malformed reply: a reply which cannot be
+understood is returned as a Location of kind 'unknown', a volume of None or
+no live TV entries.
+"""
+
+import re
+import datetime
+
+__all__ = [ "Location",
+            "LiveTVEntry",
+            "LOCATION_PATTERNS",
+            "parse_location",
+            "parse_volume",
+            "parse_livetv", ]
+
+
+_CLOCK = r'\d+(?::\d\d?)+'
+_SPEED = r'pause|-?\d+(?:\.\d+)?x|-?\d+/\d+x'
+_ISO   = r'\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d'
+_RATE  = r'\d+(?:\.\d+)?'
+_TAIL  = r'(?: \(@?(?P<timestamp>\d\d:\d\d:\d\d(?:\.\d+)?)Z\))?(?: Subtitles: (?P<subtitles>.*))?\s*$'
+
+# The patterns tried against a reply to 'query location', in order, as (KIND, PATTERN) tuples. Eg.
+#    Playback LiveTV 6:57 of 7:03 1x 5168 2010-09-03T11:00:00 10429 /var/lib/mythtv/livetv/5168_20100903110000.mpg 25 (@15:31:54.109Z) Subtitles: *0:[None]* 1:[Subtitle 1: English]
+#    Playback Video 0:03 1x myth://Videos@127.0.0.1:6543/20080531_180000_bbcone_doctor_who.ts 94 25 (15:31:54.109Z) Subtitles: *0:[None]*
+#    game Sonic_the_Hedgehog Genesis
+LOCATION_PATTERNS = [ ('playback', re.compile(r'Playback (?P<mode>LiveTV|Recorded) (?P<position>' + _CLOCK + r') of (?P<length>' + _CLOCK + r') '
+                                              r'(?P<speed>' + _SPEED + r') (?P<chanid>\d+) (?P<starttime>' + _ISO + r') (?P<frame>\d+) '
+                                              r'(?P<filename>\S+) (?P<framerate>' + _RATE + r')' + _TAIL)),
+                      ('playback', re.compile(r'Playback (?P<mode>Video) (?P<position>' + _CLOCK + r')(?: of (?P<length>' + _CLOCK + r'))? '
+                                              r'(?P<speed>' + _SPEED + r') (?P<filename>\S+) (?P<frame>\d+) (?P<framerate>' + _RATE + r')' + _TAIL)),
+                      ('playback', re.compile(r'Playback (?P<mode>\S+)')),
+                      ('game',     re.compile(r'game (?P<game>.+) (?P<system>.+)$')),
+                      ('error',    re.compile(r'ERROR')),
+                      ('menu',     re.compile(r'(?P<location>[^\s]+)')),
+                      ]
+
+_SUBTITLE  = re.compile(r'(\*?)(\d+):\[(.*?)\]\*? *')
+_FRACTION  = re.compile(r'(-?\d+)/(\d+)x$')
+_VOLUME    = re.compile(r'\s*(\d{1,3})%')
+_LIVETV    = re.compile(r'\s*(\d+) (' + _ISO + r') (' + _ISO + r') (.+)')
+_TIMESTAMP = re.compile(r'(\d\d):(\d\d):(\d\d)(?:\.(\d+))?$')
+
+
+class Location(object):
+    """The frontend's location, as given by 'query location'.
+
+    kind is one of 'playback', 'game', 'menu', 'error' or 'unknown'. The other attributes are None unless they are
+    given by a reply of that kind:
+
+    mode      -- for playback, 'LiveTV', 'Recorded' or 'Video' (or whatever else the frontend said, in which case none
+                 of the attributes below are set).
+    position  -- the position in seconds, counting from the start.
+    length    -- the length in seconds.
+    speed     -- the playback speed, 0.0 when paused.
+    chanid    -- the chanid of a recording or of the live channel, an integer.
+    starttime -- the start time (local time) of a recording or of the live programme, a datetime.
+    frame     -- the frame number, an integer.
+    filename  -- the file or url being played.
+    framerate -- the number of frames per second, a float.
+    timestamp -- the time of day (UTC) at which the reply was made, as a tuple of hours, minutes, seconds and
+                 microseconds.
+    subtitles -- a list of (NUMBER, NAME, SELECTED) tuples, the first being the 'None' track.
+    game      -- for a game, the name of the game.
+    system    -- for a game, the name of the system.
+    location  -- for a menu, the name of the jump point.
+    """
+
+    __slots__ = ('kind', 'mode', 'position', 'length', 'speed', 'chanid', 'starttime', 'frame', 'filename',
+                 'framerate', 'timestamp', 'subtitles', 'game', 'system', 'location')
+
+    def __init__(self, kind, **kwargs):
+        self.kind = kind
+        for name in self.__slots__[1:]:
+            setattr(self, name, kwargs.get(name))
+
+    def subtitled(self):
+        """Returns True if a subtitle track other than the 'None' track is selected."""
+        return bool(self.subtitles) and not self.subtitles[0][2]
+
+    def __repr__(self):
+        return "Location(%s)" % ', '.join([ '%s=%r' % (name, getattr(self, name))
+                                            for name in self.__slots__ if getattr(self, name) is not None ])
+
+
+class LiveTVEntry(object):
+    """One line of the reply to 'query livetv': the programme showing on a channel, with its chanid (an integer),
+    starttime and endtime (datetimes in local time) and title."""
+
+    __slots__ = ('chanid', 'starttime', 'endtime', 'title')
+
+    def __init__(self, chanid, starttime, endtime, title):
+        self.chanid    = chanid
+        self.starttime = starttime
+        self.endtime   = endtime
+        self.title     = title
+
+    def __repr__(self):
+        return "LiveTVEntry(%r, %r, %r, %r)" % (self.chanid, self.starttime, self.endtime, self.title)
+
+
+def parse_location(reply):
+    """Parses a reply to 'query location' and returns a Location."""
+    if reply is None:
+        return Location('unknown')
+
+    for (kind, pattern) in LOCATION_PATTERNS:
+        match = pattern.match(reply)
+        if match is not None:
+            break
+    else:
+        return Location('unknown')
+
+    groups = match.groupdict()
+    if kind != 'playback' or 'position' not in groups:
+        return Location(kind, **groups)
+
+    return Location(kind,
+                    mode      = groups['mode'],
+                    position  = _seconds(groups['position']),
+                    length    = _seconds(groups['length']),
+                    speed     = _speed(groups['speed']),
+                    chanid    = (int(groups['chanid']) if groups.get('chanid') is not None else None),
+                    starttime = _datetime(groups.get('starttime')),
+                    frame     = int(groups['frame']),
+                    filename  = groups['filename'],
+                    framerate = float(groups['framerate']),
+                    timestamp = _timestamp(groups['timestamp']),
+                    subtitles = _subtitles(groups['subtitles']))
+
+
+def parse_volume(reply):
+    """Parses a reply to 'query volume' and returns the volume as a percentage, or None."""
+    if reply is None:
+        return None
+    match = _VOLUME.match(reply)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def parse_livetv(reply):
+    """Parses a reply to 'query livetv' and returns a list of LiveTVEntry objects, one for each line understood."""
+    if reply is None:
+        return []
+    entries = []
+    for line in reply.splitlines():
+        match = _LIVETV.match(line)
+        if match is None:
+            continue
+        starttime = _datetime(match.group(2))
+        endtime   = _datetime(match.group(3))
+        if starttime is None or endtime is None:
+            continue
+        entries.append(LiveTVEntry(int(match.group(1)), starttime, endtime, match.group(4)))
+    return entries
+
+
+def _seconds(clock):
+    """Converts a time such as '6:57' or '1:06:57' into seconds."""
+    if clock is None:
+        return None
+    seconds = 0
+    for part in clock.split(':'):
+        seconds = seconds*60 + int(part)
+    return seconds
+
+
+def _speed(speed):
+    """Converts a speed such as '1x', '1.5x', '-1/3x' or 'pause' into a float."""
+    if speed == 'pause':
+        return 0.0
+    match = _FRACTION.match(speed)
+    if match is not None:
+        if int(match.group(2)) == 0:
+            return None
+        return float(match.group(1))/float(match.group(2))
+    return float(speed[:-1])
+
+
+def _datetime(value):
+    """Converts an ISO time in the form YYYY-MM-DDTHH:MM:SS into a datetime, or None if it is not a valid time."""
+    if value is None:
+        return None
+    try:
+        return datetime.datetime(int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                                 int(value[11:13]), int(value[14:16]), int(value[17:19]))
+    except ValueError:
+        return None
+
+
+def _timestamp(value):
+    """Converts a time of day such as '15:31:54.109' into a tuple of hours, minutes, seconds and microseconds, or None
+    if it is not a valid time."""
+    if value is None:
+        return None
+    match = _TIMESTAMP.match(value)
+    (hours, minutes, seconds) = (int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    if hours > 23 or minutes > 59 or seconds > 59:
+        return None
+    return (hours, minutes, seconds, int(((match.group(4) or '') + '000000')[:6]))
+
+
+def _subtitles(value):
+    """Converts a list of subtitle tracks such as '*0:[None]* 1:[Subtitle 1: English]' into a list of (NUMBER, NAME,
+    SELECTED) tuples."""
+    if value is None:
+        return []
+    return [ (int(number), name, (star == '*')) for (star, number, name) in _SUBTITLE.findall(value) ]
@@ -0,0 +1,177 @@
+# MythTV Universal Control Server - Frontend Status Corpus
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Frontend Status Corpus
+
+Replies captured from MythTV frontends, for checking and timing the parsers
+in FrontendStatus. CORPUS maps the name of each query onto a list of
+(REPLY, EXPECTED) tuples, where EXPECTED is a dictionary of the attributes the
+parsed record should have (for 'location'), the volume (for 'volume') or the
+number of entries (for 'livetv').
+
+Run as a script it checks the corpus, fuzzes the parsers with mutated copies
+of the replies (which they should never raise on) and prints the time each
+parser takes per reply.
+"""
+
+import random
+import timeit
+
+from FrontendStatus import parse_location, parse_volume, parse_livetv
+
+__all__ = [ "CORPUS",
+            "check",
+            "fuzz",
+            "benchmark", ]
+
+
+CORPUS = { 'location' : [ ("Playback LiveTV 6:57 of 7:03 1x 5168 2010-09-03T11:00:00 10429 /var/lib/mythtv/livetv/5168_20100903110000.mpg 25 (@15:31:54.109Z) Subtitles: *0:[None]* 1:[Subtitle 1: English]",
+                           { 'kind' : 'playback', 'mode' : 'LiveTV', 'position' : 417, 'length' : 423, 'speed' : 1.0,
+                             'chanid' : 5168, 'frame' : 10429, 'framerate' : 25.0, 'timestamp' : (15, 31, 54, 109000),
+                             'subtitles' : [ (0, 'None', True), (1, 'Subtitle 1: English', False) ] }),
+                          ("Playback LiveTV 0:12 of 0:12 pause 1003 2011-02-14T19:30:00 301 /var/lib/mythtv/livetv/1003_20110214193000.mpg 25 (@19:30:12.5Z) Subtitles: *0:[None]*",
+                           { 'kind' : 'playback', 'mode' : 'LiveTV', 'position' : 12, 'length' : 12, 'speed' : 0.0,
+                             'timestamp' : (19, 30, 12, 500000) }),
+                          ("Playback Recorded 12:04 of 29:58 1.5x 1001 2011-01-07T20:00:00 18103 /var/lib/mythtv/recordings/1001_20110107200000.mpg 25 (@20:31:02.000Z) Subtitles: 0:[None] *1:[Subtitle 1: English]*",
+                           { 'kind' : 'playback', 'mode' : 'Recorded', 'position' : 724, 'length' : 1798, 'speed' : 1.5,
+                             'chanid' : 1001, 'subtitles' : [ (0, 'None', False), (1, 'Subtitle 1: English', True) ] }),
+                          ("Playback Recorded 1:02:07 of 1:29:58 -1/3x 1004 2011-01-07T21:00:00 93177 /var/lib/mythtv/recordings/1004_20110107210000.mpg 25 (@22:12:40.734Z) Subtitles: *0:[None]*",
+                           { 'kind' : 'playback', 'mode' : 'Recorded', 'position' : 3727, 'length' : 5398, 'speed' : -1.0/3.0 }),
+                          ("Playback Recorded 0:00:19 of 0:30:00 1x 1003 2011-01-01T20:00:00 475 /var/lib/mythtv/recordings/1003_20110101200000.mpg 25.0000",
+                           { 'kind' : 'playback', 'mode' : 'Recorded', 'position' : 19, 'length' : 1800, 'framerate' : 25.0,
+                             'timestamp' : None, 'subtitles' : [] }),
+                          ("Playback Recorded 3:10 of 45:00 -4x 1002 2010-12-25T15:00:00 4750 /var/lib/mythtv/recordings/1002_20101225150000.mpg 25 (@15:50:10Z) Subtitles: *0:[None]*",
+                           { 'kind' : 'playback', 'speed' : -4.0, 'timestamp' : (15, 50, 10, 0) }),
+                          ("Playback Video 0:03 1x myth://Videos@127.0.0.1:6543/20080531_180000_bbcone_doctor_who.ts 94 25 (15:31:54.109Z) Subtitles: *0:[None]*",
+                           { 'kind' : 'playback', 'mode' : 'Video', 'position' : 3, 'length' : None, 'speed' : 1.0, 'chanid' : None,
+                             'filename' : 'myth://Videos@127.0.0.1:6543/20080531_180000_bbcone_doctor_who.ts', 'frame' : 94 }),
+                          ("Playback Video 41:19 of 1:52:03 1x /srv/video/films/Metropolis.avi 59544 23.976 (21:04:33.020Z) Subtitles: *0:[None]*",
+                           { 'kind' : 'playback', 'mode' : 'Video', 'position' : 2479, 'length' : 6723, 'framerate' : 23.976 }),
+                          ("Playback DVD 0:43 of 1:35:00 1x",
+                           { 'kind' : 'playback', 'mode' : 'DVD', 'position' : None }),
+                          ("game Sonic_the_Hedgehog Genesis",
+                           { 'kind' : 'game', 'game' : 'Sonic_the_Hedgehog', 'system' : 'Genesis' }),
+                          ("mainmenu",
+                           { 'kind' : 'menu', 'location' : 'mainmenu' }),
+                          ("playbackbox",
+                           { 'kind' : 'menu', 'location' : 'playbackbox' }),
+                          ("ERROR: Timed out after 5 seconds waiting for a response",
+                           { 'kind' : 'error' }),
+                          ("",
+                           { 'kind' : 'unknown' }),
+                          ],
+           'volume'   : [ ("35%", 35),
+                          ("100%", 100),
+                          ("0%", 0),
+                          ("ERROR: This command is only valid during playback", None),
+                          ],
+           'livetv'   : [ ("1001 2011-01-07T20:00:00 2011-01-07T20:30:00 A Question of Sport\r\n"
+                           "1002 2011-01-07T19:55:00 2011-01-07T21:00:00 Gardeners' World\r\n"
+                           "1003 2011-01-07T20:00:00 2011-01-07T20:30:00 Coronation Street\r\n"
+                           "1004 2011-01-07T20:00:00 2011-01-07T21:00:00 Top Gear\r\n"
+                           "1005 2011-01-07T19:00:00 2011-01-07T22:00:00 Film: The 39 Steps",
+                           5),
+                          (" 5168 2010-09-03T11:00:00 2010-09-03T12:00:00 Homes Under the Hammer",
+                           1),
+                          ("ERROR: MythFrontend is not in LiveTV",
+                           0),
+                          ],
+           }
+
+_PARSERS = { 'location' : parse_location,
+             'volume'   : parse_volume,
+             'livetv'   : parse_livetv, }
+
+
+def check():
+    """Parses each reply in the corpus and returns a list of messages describing those which were not parsed as
+    expected."""
+    failures = []
+    for (query, replies) in CORPUS.items():
+        for (reply, expected) in replies:
+            result = _PARSERS[query](reply)
+            if query == 'location':
+                for (name, value) in expected.items():
+                    if getattr(result, name) != value:
+                        failures.append("%s %r: %s is %r, expected %r" % (query, reply, name, getattr(result, name), value))
+            elif query == 'livetv':
+                if len(result) != expected:
+                    failures.append("%s %r: %d entries, expected %d" % (query, reply, len(result), expected))
+            elif result != expected:
+                failures.append("%s %r: %r, expected %r" % (query, reply, result, expected))
+    return failures
+
+
+def fuzz(count=10000, seed=None):
+    """Passes count mutated copies of the replies in the corpus to the parsers, and returns a list of (QUERY, REPLY,
+    EXCEPTION) tuples for those on which the parsers raised."""
+    rand = random.Random(seed)
+    alphabet = "0123456789:./-x *[]()@TZ%\r\nabcdefghijklmnopqrstuvwxyzPVLR"
+    replies = [ (query, reply) for (query, entries) in CORPUS.items() for (reply, expected) in entries ]
+
+    failures = []
+    for i in xrange(0, count):
+        (query, reply) = rand.choice(replies)
+        chars = list(reply)
+        for j in xrange(0, rand.randint(1, 4)):
+            position = rand.randint(0, len(chars))
+            action = rand.randint(0, 2)
+            if action == 0:
+                chars.insert(position, rand.choice(alphabet))
+            elif action == 1 and position < len(chars):
+                del chars[position]
+            elif position < len(chars):
+                chars[position] = rand.choice(alphabet)
+        mutated = ''.join(chars)
+        try:
+            _PARSERS[query](mutated)
+        except Exception, e:
+            failures.append((query, mutated, e))
+    return failures
+
+
+def benchmark(number=10000):
+    """Times the parsers on the corpus, and returns a dictionary mapping the name of each query onto the mean time in
+    microseconds taken to parse one of its replies."""
+    results = dict()
+    for (query, replies) in CORPUS.items():
+        parser = _PARSERS[query]
+        texts  = [ reply for (reply, expected) in replies ]
+        def run():
+            for text in texts:
+                parser(text)
+        results[query] = min(timeit.repeat(run, number=number, repeat=3))*1000000.0/(number*len(texts))
+    return results
+
+
+if __name__ == "__main__":
+    from optparse import OptionParser
+    parser = OptionParser()
+    parser.add_option("-f", dest="fuzz", type="int", default=10000)
+    parser.add_option("-n", dest="number", type="int", default=10000)
+    (options,args) = parser.parse_args()
+
+    for failure in check():
+        print failure
+    for (query, reply, e) in fuzz(options.fuzz):
+        print "%s %r raised %r" % (query, reply, e)
+    for (query, time) in sorted(benchmark(options.number).items()):
+        print "%-8s %6.2f us per reply" % (query, time)
@@ -0,0 +1,148 @@
+# MythTV Universal Control Server - Guide Index
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Guide Index
+
+An in-memory, per-channel index of guide entries used to answer time window
+queries ("everything on this channel between start and end") and point
+queries ("what is on this channel at time T") without going back to the
+database.
+
+Each channel's entries are held in an immutable ChannelGuide: arrays sorted by
+start time together with a running maximum of the end times. The running
+maximum is non-decreasing, so the first entry which could still be showing at
+a given time can be found with a binary search, as can the first entry which
+starts after the end of a window. For guide data, where the entries on a
+channel do not nest inside one another, this makes a window query
+O(log n + k) for k results.
+"""
+
+import threading
+import bisect
+
+__all__ = [ "GuideIndex",
+            "ChannelGuide", ]
+
+
+class ChannelGuide(object):
+    """The guide entries for a single channel. Instances are never altered once created, so a reader may
+    keep using one after the index has replaced it."""
+
+    __slots__ = ('starts', 'ends', 'maxends', 'payloads')
+
+    def __init__(self, entries):
+        """entries is a list of (START, END, PAYLOAD) tuples, which need not be sorted."""
+        entries = sorted(entries, key=lambda entry : entry[0])
+
+        self.starts   = [ entry[0] for entry in entries ]
+        self.ends     = [ entry[1] for entry in entries ]
+        self.payloads = [ entry[2] for entry in entries ]
+
+        self.maxends  = []
+        for end in self.ends:
+            self.maxends.append(end if not self.maxends or end > self.maxends[-1] else self.maxends[-1])
+
+    def __len__(self):
+        return len(self.starts)
+
+    def between(self, start=None, end=None):
+        """Returns a list of the payloads of entries which end after start and begin before end, in order of start
+        time. Either bound may be None, in which case the window is open at that end."""
+        lo = 0
+        hi = len(self.starts)
+        if start is not None:
+            lo = bisect.bisect_right(self.maxends, start)
+        if end is not None:
+            hi = bisect.bisect_left(self.starts, end)
+
+        if start is None:
+            return self.payloads[lo:hi]
+        return [ self.payloads[i] for i in xrange(lo, hi) if self.ends[i] > start ]
+
+    def at(self, when):
+        """Returns the payload of the entry showing at the given time, or None if there is none. If entries
+        overlap the one which started most recently is returned."""
+        hi = bisect.bisect_right(self.starts, when)
+        lo = bisect.bisect_right(self.maxends, when)
+        for i in xrange(hi - 1, lo - 1, -1):
+            if self.ends[i] > when:
+                return self.payloads[i]
+        return None
+
+
+class GuideIndex:
+    """An index of guide entries for every channel.
+
+    The index is brought up to date by calling sync with the complete set of entries, which swaps in a new
+    ChannelGuide for each channel. Until the first call to sync the attribute loaded is False, and callers
+    should fall back to querying the database.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self):
+        self.lock     = threading.Lock()
+        self.channels = dict()  # sid -> ChannelGuide
+        self.loaded   = False
+
+    def sync(self, entries):
+        """Replaces the contents of the index with the given entries, an iterable of tuples of the form:
+
+            (SID, START, END, PAYLOAD)
+
+        Returns a list of the sids of the channels whose entries were added, removed, or had their start or end
+        times altered."""
+
+        bysid = dict()
+        for (sid, start, end, payload) in entries:
+            bysid.setdefault(sid, []).append((start, end, payload))
+
+        with self.lock:
+            changed = [ sid for sid in self.channels if sid not in bysid ]
+            for sid in changed:
+                del self.channels[sid]
+
+            for sid in bysid:
+                guide = ChannelGuide(bysid[sid])
+                if (sid not in self.channels
+                    or self.channels[sid].starts != guide.starts
+                    or self.channels[sid].ends   != guide.ends):
+                    changed.append(sid)
+                self.channels[sid] = guide
+
+            self.loaded = True
+            return changed
+
+    def channel(self, sid):
+        """Returns the ChannelGuide for the given channel (an empty one if the channel has no entries)."""
+        with self.lock:
+            if sid in self.channels:
+                return self.channels[sid]
+        return ChannelGuide([])
+
+    def between(self, sid, start=None, end=None):
+        """Returns a list of the payloads of the entries on the given channel between start and end, see
+        ChannelGuide.between."""
+        return self.channel(sid).between(start, end)
+
+    def at(self, sid, when):
+        """Returns the payload of the entry on the given channel at the given time, or None."""
+        return self.channel(sid).at(when)
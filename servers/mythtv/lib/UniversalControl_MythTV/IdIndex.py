@@ -0,0 +1,143 @@
+# MythTV Universal Control Server - Id Index
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Id Index
+
+A hash index from the global content, global series, series and global app
+ids of the programmes known to the server to the programmes themselves, used
+to answer uc/search/global-content-id, global-series-id and global-app-id
+requests (and to resolve ids when acquiring content) without scanning every
+programme.
+
+As with the text index, programmes are held in named groups (eg. 'guide',
+'storage'), each of which is replaced by a call to sync which only touches the
+programmes whose ids have changed.
+"""
+
+import threading
+
+__all__ = [ "IdIndex",
+            "KINDS", ]
+
+
+# The kinds of id held in the index, which are also the keys under which they
+# appear in programme dictionaries
+KINDS = ('global-content-id',
+         'global-series-id',
+         'series-id',
+         'global-app-id')
+
+
+class Record(object):
+    """A single indexed programme. Only the payload of a record is ever altered once it is in the index."""
+
+    __slots__ = ('key', 'group', 'sid', 'ids', 'payload')
+
+    def __init__(self, key, group, sid, ids, payload):
+        self.key     = key
+        self.group   = group
+        self.sid     = sid
+        self.ids     = ids
+        self.payload = payload
+
+
+class IdIndex:
+    """An incrementally maintained index of programmes by id.
+
+    Programmes are supplied to the method sync as tuples of the form:
+
+        (KEY, SID, IDS, PAYLOAD)
+
+    where KEY is any hashable value unique within the index, IDS is a dictionary mapping some of KINDS onto the
+    programme's ids of those kinds, and PAYLOAD is an arbitrary object returned by find.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self):
+        self.lock     = threading.Lock()
+        self.records  = dict()  # key -> Record
+        self.groups   = dict()  # group -> set of keys
+        self.postings = dict()  # (kind, id) -> set of keys
+
+    def __len__(self):
+        return len(self.records)
+
+    def sync(self, group, entries):
+        """Replaces the contents of the given group with the given entries. Records whose sid and ids are unchanged
+        are left in place (though their payload is updated). Returns the number of records added, altered or
+        removed."""
+
+        with self.lock:
+            old     = self.groups.get(group, set())
+            new     = set()
+            changes = 0
+
+            for (key, sid, ids, payload) in entries:
+                ids = dict([ (kind, ids[kind]) for kind in KINDS if kind in ids and ids[kind] is not None ])
+                new.add(key)
+                if key in self.records and self.records[key].group == group:
+                    record = self.records[key]
+                    if record.sid == sid and record.ids == ids:
+                        record.payload = payload
+                        continue
+
+                self.__remove(key)
+                self.__add(Record(key, group, sid, ids, payload))
+                changes += 1
+
+            for key in old - new:
+                self.__remove(key)
+                changes += 1
+
+            if new:
+                self.groups[group] = new
+            elif group in self.groups:
+                del self.groups[group]
+
+            return changes
+
+    def find(self, kind, value, groups=None):
+        """Returns a list of the Records with the given id of the given kind, in any of the given groups (if not
+        None)."""
+        with self.lock:
+            keys = self.postings.get((kind, value), ())
+            return [ self.records[key] for key in keys if groups is None or self.records[key].group in groups ]
+
+    def __add(self, record):
+        """Must be called with the lock held."""
+        self.records[record.key] = record
+        self.groups.setdefault(record.group, set()).add(record.key)
+        for kind in record.ids:
+            self.postings.setdefault((kind, record.ids[kind]), set()).add(record.key)
+
+    def __remove(self, key):
+        """Must be called with the lock held. Does nothing if the key is not in the index."""
+        if key not in self.records:
+            return
+        record = self.records.pop(key)
+
+        self.groups[record.group].discard(key)
+        for kind in record.ids:
+            posting = self.postings[(kind, record.ids[kind])]
+            posting.discard(key)
+            if not posting:
+                del self.postings[(kind, record.ids[kind])]
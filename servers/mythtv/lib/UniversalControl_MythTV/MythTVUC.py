@@ -17,7 +17,7 @@
 #   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
-from MythTV import MythDB, Frontend, MythBE, Record, MythXML, Recorded, MythLog
+from MythTV import MythDB, Frontend, MythBE, Record, Recorded, MythLog
 import MythTV
 import threading
 import re
@@ -26,11 +26,28 @@ import datetime
 import time
 import traceback
 import os
+import itertools
+import heapq
 
 from UCServer.Exceptions import CannotFind, InvalidSyntax, ProcessingFailed
 from ManualVideoMetadata import ManualVideoMetadata
 
 from notdict import notdict
+from TextIndex import TextIndex
+from GuideIndex import GuideIndex
+from IdIndex import IdIndex
+from EPGMirror import EPGMirror
+from QueryCompiler import QueryCompiler
+from FanOut import FanOut
+from Connections import Connections
+from FrontendChannel import FrontendChannel
+from PlayheadTracker import PlayheadTracker
+from NetVisionCatalogue import NetVisionCatalogue
+from Refresher import Refresher
+from StorageSync import StorageSync
+from FrontendStatus import parse_location, parse_volume, parse_livetv
+from ProgrammeRecord import Programme, media_components, variant, intern_text
+from ProgrammeRecord import PRIMARY_AUDIO, PRIMARY_VIDEO, PRIMARY_SUBTITLES, HARDHEAR_SUBTITLES, AUDIO_DESCRIPTION, IMPROVED_AUDIO
 from xtest import XTest
 
 MythLog._setlevel('none')
@@ -43,6 +60,86 @@ MythLog._setlevel('none')
 
 FIXED_POSITION_OFFSET = 5.625
 
+# The local EPG mirror is synced from the database this often
+# (in seconds), and the guide data in it and in the guide and
+# text indexes covers programmes which ended up to this long
+# ago.
+
+GUIDE_INDEX_PERIOD  = 300
+GUIDE_INDEX_HISTORY = datetime.timedelta(days=1)
+
+# Searches over several sources gather the results from each
+# of them on a pool of this many threads, and give up on any
+# which have not answered after this many seconds.
+
+FANOUT_WORKERS  = 8
+FANOUT_DEADLINE = 5.0
+
+# The jobs run by the update thread to keep the server's state
+# up to date, in the order in which they are added, with their
+# period, jitter, timeout and longest backoff in seconds (see
+# Scheduler.add). Between runs the update thread relies on
+# events from the backend, and on requests made after the
+# server has changed something itself, gathering up those which
+# arrive within EVENT_SETTLE seconds of each other. The run-time
+# statistics of the jobs are logged every STATISTICS_PERIOD
+# seconds.
+
+UPDATE_JOBS = [ ('output',       60,  0,  5,  30),
+                ('playhead',     0.5, 0,  5,  30),
+                ('acquisitions', 120, 10, 30, 600),
+                ('storage',      120, 10, 30, 600),
+                ('netvision',    600, 30, 30, 600),
+                ('indexes',      60,  5,  10, 300),
+                ('events',       60,  5,  10, 300),
+                ]
+
+UPDATE_WORKERS    = 3
+EVENT_SETTLE      = 0.25
+STATISTICS_PERIOD = 3600
+
+# The output is refreshed when the playhead tracker (see
+# PlayheadTracker) expects the playhead reported by the frontend
+# to have drifted by PLAYHEAD_TOLERANCE seconds from where it is
+# predicted to be, but no more often than every PLAYHEAD_SHORTEST
+# seconds and no less often than every PLAYHEAD_LONGEST seconds
+# whilst something is playing, and every PLAYHEAD_IDLE seconds
+# otherwise. The 'playhead' job in UPDATE_JOBS checks whether a
+# refresh is due, and the 'output' job is only a fallback.
+
+PLAYHEAD_TOLERANCE = 1.0
+PLAYHEAD_SHORTEST  = 1.0
+PLAYHEAD_LONGEST   = 30.0
+PLAYHEAD_IDLE      = 5.0
+
+# As-you-type text searches (those with typeahead=true) return
+# whatever they have found after this many seconds.
+
+TYPEAHEAD_BUDGET = 0.02
+
+# Storage is only synchronised with MythTV when a summary of
+# the recorded and videometadata tables changes, or when a
+# recording in progress has finished, or when this long has
+# passed since the last time.
+
+STORAGE_FULL_SYNC_PERIOD = datetime.timedelta(hours=1)
+
+# Commands are sent to the frontend by a single thread (see
+# FrontendChannel), which holds up to FRONTEND_QUEUE commands
+# waiting to be sent. Callers which wait for the answer to a
+# command give up after FRONTEND_TIMEOUT seconds.
+
+FRONTEND_QUEUE   = 64
+FRONTEND_TIMEOUT = 10.0
+
+# A sequence of buttons pressed by one request to uc/remote
+# may be up to KEY_SEQUENCE_LIMIT buttons long, and the key
+# presses are KEY_SEQUENCE_PACE milliseconds apart (by default,
+# see initialise) so that the frontend keeps up with them.
+
+KEY_SEQUENCE_LIMIT = 256
+KEY_SEQUENCE_PACE  = 30
+
 # These three classes exist to provide access to database
 # tables in the MythTV database which are not accessible 
 # through the python bindings by default.
@@ -70,6 +167,37 @@ class InternetContentArticles (MythTV.DBData):
     _where='url=%s'
     _setwheredat='self.url,'
 
+# This class passes the messages from the MythTV backend event
+# stream on to the update thread.
+
+class MythTVEventMonitor (MythTV.BEEvent):
+    def __init__(self):
+        MythTV.BEEvent.__init__(self,systemevents=True)
+
+    def _listhandlers(self):
+        return [ self.handle_event, ]
+
+    def handle_event(self,event=None):
+        if event is None:
+            return re.compile('BACKEND_MESSAGE')
+        refresh_event(event)
+
+def refresh_event(event):
+    if update_thread is not None:
+        update_thread.event(event)
+
+# This class gives the local EPG mirror access to the MythTV
+# database.
+
+class MythTVEPGBackend:
+    def guide(self,**kwargs):
+        with mythtv_connections.db() as db:
+            return list(db.searchGuide(**kwargs))
+
+    def articles(self):
+        with mythtv_connections.db() as db:
+            return list(InternetContentArticles.getAllEntries(db=db))
+
 uc_server = None
 
 mythtv_sources = None
@@ -82,48 +210,85 @@ mythtv_acquirer = None
 mythtv_programmes = None
 mythtv_menu_programmes = None
 mythtv_storage = None
+mythtv_storage_sync = None
 mythtv_power = None
 mythtv_logo = None
 mythtv_game_programmes = None
 
 mythtv_images = None
 
+mythtv_text_index = None
+mythtv_guide_index = None
+mythtv_id_index = None
+mythtv_epg = None
+mythtv_query_compiler = None
+mythtv_fanout = None
+mythtv_connections = None
+mythtv_frontend_channel = None
+mythtv_playhead = None
+
+mythtv_menu_locations = None
+mythtv_guide_sequence = None
+mythtv_netvision = None
+mythtv_netvision_sequence = None
+mythtv_event_monitor = None
+
 update_thread = None
 
 #This is set to a callable if something needs to be called before
 #the output can be changed.
 prekill_outputs = None
 
-def sendQuery(query):
+def mythtv_frontend():
+    """This function makes a new connection to the frontend, for the frontend pool of mythtv_connections."""
+    with mythtv_connections.db() as db:
+        return db.getFrontends().next()
+
+def with_frontend(call,default=None):
+    """This function calls call with the frontend connection and returns the result. If there is no frontend then the
+    server is put into standby and default returned, and if call fails then the error is logged and default returned."""
     global uc_server
+    connected = False
+    result = default
     try:
-        fe = MythTV.MythDB().getFrontends().next()
+        with mythtv_connections.frontend() as fe:
+            connected = True
+            result = call(fe)
     except:
-        uc_server.set_standby(True)
-        return None
-    else:
-        uc_server.set_standby(False)
-        try:
-            return fe.sendQuery(query)
-        except Exception as inst:
-            uc_server.log_message(traceback.format_exc())
-            return None
-
-def sendPlay(play):
-    global uc_server
+        if not connected:
+            uc_server.set_standby(True)
+            return default
+        uc_server.log_message(traceback.format_exc())
+        result = default
+
+    # Leaving standby borrows the frontend again (see mythtv_standby_callback), so it must wait until the
+    # connection has been returned to the pool
+    uc_server.set_standby(False)
+    return result
+
+def frontend_result(future,default=None):
+    """This function waits for the result of a command sent through the frontend channel, returning default if the
+    command failed or did not finish in time."""
     try:
-        fe = MythTV.MythDB().getFrontends().next()
+        return future.result(FRONTEND_TIMEOUT)
     except:
-        uc_server.set_standby(True)
-        return False
-    else:
-        uc_server.set_standby(False)
-        try:
-            fe.sendPlay(play)
-            return True
-        except Exception as inst:
-            uc_server.log_message(traceback.format_exc())
-            return False
+        return default
+
+def sendQuery(query):
+    return frontend_result(mythtv_frontend_channel.query(query))
+
+def sendPlay(play,key=None):
+    """This function sends a play command to the frontend, replacing any command with the same key (if key is not None)
+    still waiting to be sent, and returns whether it was sent. A caller whose command was replaced is given the result
+    of the command which replaced it. The output is refreshed once the command has been sent."""
+    future = mythtv_frontend_channel.play(play,key=key)
+    future.add_done_callback(lambda future : refresh('output'))
+    return frontend_result(future,False)
+
+def sendJump(jump):
+    future = mythtv_frontend_channel.jump(jump)
+    future.add_done_callback(lambda future : refresh('output'))
+    return frontend_result(future,False)
 
 def mythtv_power_notify(key):
     global uc_server
@@ -136,6 +301,7 @@ def mythtv_standby_callback(standby):
     if standby:
         uc_server.log_message("Killing all mythtv frontends")
         os.system('pkill mythfrontend')
+        mythtv_connections.frontend.reset()
         return True
     else:
         uc_server.log_message("Starting mythtv frontend")
@@ -147,7 +313,8 @@ def mythtv_standby_callback(standby):
                 lock.wait(1)
 
             try:
-                MythTV.MythDB().getFrontends().next()
+                with mythtv_connections.frontend(force=True) as fe:
+                    pass
             except:
                 continue
             else:
@@ -160,7 +327,8 @@ def mythtv_source_notify(key):
     return mythtv_source_notify_actual
 
 def mythtv_sources_notify(key):
-    pass
+    global uc_server
+    uc_server.sources_changed(key)
 
 def mythtv_output_notify(key):
     global uc_server
@@ -185,10 +353,12 @@ def mythtv_acquisition_notify(key):
 
 def mythtv_appslist_notify(key):
     global uc_server
+    uc_server.source_lists_changed('mythtv_apps')
     uc_server.notify_change('uc/source-lists/apps')
 
 def mythtv_netvisionlist_notify(key):
     global uc_server
+    uc_server.source_lists_changed('mythtv_mythnetvision')
     uc_server.notify_change('uc/source-lists/mythnetvision')
 
 def mythtv_storage_notify(key):
@@ -197,15 +367,14 @@ def mythtv_storage_notify(key):
 
 def mythtv_storagelist_notify(key):
     global uc_server
+    uc_server.source_lists_changed('uc_storage')
     uc_server.notify_change('uc/source-lists/storage')
 
 def mythtv_storage_delete(key):
     global mythtv_storage
 
-    try:
-        retval = Recorded((mythtv_storage['items'].data[key]['MYTHTV:chanid'],mythtv_storage['items'].data[key]['MYTHTV:recstartts'])).delete()
-    except:
-        raise
+    with mythtv_connections.db() as db:
+        Recorded((mythtv_storage['items'].data[key]['MYTHTV:chanid'],mythtv_storage['items'].data[key]['MYTHTV:recstartts']),db=db).delete()
 
     lock = threading.Condition()
 
@@ -244,7 +413,7 @@ def mythtv_output_setter(key,item):
             else:
                 speed = '%s30x' % sign
 
-        if not sendPlay('speed %s' % speed):
+        if not sendPlay('speed %s' % speed,key='speed'):
             raise ProcessingFailed
         return
     elif key == 'playhead':
@@ -262,20 +431,16 @@ def mythtv_output_setter(key,item):
 
             pos = int(item['aposition']['position'] + speed*(float(86400*diff.days) + float(diff.seconds) + float(diff.microseconds)/1000000.0)) - FIXED_POSITION_OFFSET
 
-            if not sendPlay('seek %02d:%02d:%02d' % (pos//3600,(pos//60)%60,pos%60)):
+            if not sendPlay('seek %02d:%02d:%02d' % (pos//3600,(pos//60)%60,pos%60),key='seek'):
                 raise ProcessingFailed
         elif 'rposition' in item:
-            query = sendQuery('location')
-
-            m = re.search('(\d+):(\d+) of (\d+):(\d+)', query)
-            if not m:
+            location = parse_location(sendQuery('location'))
+            if location.length is None:
                 raise ProcessingFailed
-            
-            length = int(m.group(3))*60 + int(m.group(4))
-            
-            pos = item['rposition']['position'] + length
 
-            if not sendPlay('seek %02d:%02d:%02d' % (int(pos/3600),int(pos/60)%60,pos%60)):
+            pos = item['rposition']['position'] + location.length
+
+            if not sendPlay('seek %02d:%02d:%02d' % (int(pos/3600),int(pos/60)%60,pos%60),key='seek'):
                 raise ProcessingFailed
         else:
             raise ProcessingFailed
@@ -287,14 +452,14 @@ def mythtv_output_setter(key,item):
         elif volume > 100:
             volume = 100
 
-        if not sendPlay('volume %d%%' % volume):
+        if not sendPlay('volume %d%%' % volume,key='volume'):
             raise ProcessingFailed
 
     else:
         raise KeyError
 
 
-def initialise(server,logo=None):
+def initialise(server,logo=None,epg_path=':memory:',epg_fixture=None,key_pace=KEY_SEQUENCE_PACE):
     global uc_server
     global mythtv_sources
     global mythtv_source_lists
@@ -309,11 +474,44 @@ def initialise(server,logo=None):
     global mythtv_power
     global mythtv_logo
     global mythtv_game_programmes
+    global mythtv_text_index
+    global mythtv_guide_index
+    global mythtv_id_index
+    global mythtv_epg
+    global mythtv_query_compiler
+    global mythtv_fanout
+    global mythtv_connections
+    global mythtv_frontend_channel
+    global mythtv_playhead
+    global mythtv_storage_sync
+    global mythtv_netvision
 
     global update_thread
     
     uc_server = server
 
+    mythtv_connections = Connections(MythDB,MythBE,mythtv_frontend,
+                                     db_check=lambda db : db.cursor().execute('SELECT 1'),
+                                     frontend_check=lambda fe : fe.sendQuery('time'),
+                                     fatal=(IOError,MythTV.MythError),
+                                     log=uc_server.log_message)
+
+    mythtv_frontend_channel = FrontendChannel(mythtv_connections.frontend,
+                                              connected=lambda connected : uc_server.set_standby(not connected),
+                                              size=FRONTEND_QUEUE,
+                                              log=uc_server.log_message)
+    mythtv_frontend_channel.start()
+
+    mythtv_playhead = PlayheadTracker(tolerance=PLAYHEAD_TOLERANCE,
+                                      shortest=PLAYHEAD_SHORTEST,
+                                      longest=PLAYHEAD_LONGEST,
+                                      idle=PLAYHEAD_IDLE)
+
+    with mythtv_connections.db() as db:
+        channels = list(MythTV.Channel.getAllEntries(db=db))
+        scans = sorted([ scan for scan in ChannelScan.getAllEntries(db=db) ],key=lambda x : x.scanid)
+        scan_channels = list(ChannelScan_Channel.getAllEntries(db=db)) if len(scans) > 0 else []
+
     mythtv_power = notdict({ 'resource' : 'uc/power',
                              'state'    : 'on' },
                            notify=mythtv_power_notify,
@@ -333,15 +531,14 @@ def initialise(server,logo=None):
                                                                         'MYTHTV:icon' : str(channel.icon) if channel.icon != '' else None,
                                                                         'MYTHTV:serviceid' : channel.serviceid,
                                                                         },
-                                                                      notify=mythtv_source_notify('%04d' % channel.chanid))) for channel in MythTV.Channel.getAllEntries() if re.match('^\d+$',channel.channum) ]
+                                                                      notify=mythtv_source_notify('%04d' % channel.chanid))) for channel in channels if re.match('^\d+$',channel.channum) ]
                                   ),
                              notify=mythtv_sources_notify)
 
-    scans = sorted([ scan for scan in ChannelScan.getAllEntries() ],key=lambda x : x.scanid)
     if len(scans) > 0:
         scan = scans[-1].scanid
 
-        scan_channels = dict([ (chan.service_id,chan) for chan in ChannelScan_Channel.getAllEntries() if chan.scanid==scan ])
+        scan_channels = dict([ (chan.service_id,chan) for chan in scan_channels if chan.scanid==scan ])
         
         for sid in mythtv_sources.data:
             if mythtv_sources.data[sid]['MYTHTV:serviceid'] in scan_channels:
@@ -467,7 +664,7 @@ def initialise(server,logo=None):
                             ]
                           )
 
-    mythtv_button_handler = ButtonHandler()
+    mythtv_button_handler = ButtonHandler(pace=key_pace)
 
     mythtv_acquisitions = { 'resource' : 'uc/acquisitions',
                             'content-acquisitions' : notdict(dict(),
@@ -476,6 +673,7 @@ def initialise(server,logo=None):
                                                              notify=mythtv_acquisitions_notify),
                             }
 
+    mythtv_storage_sync = StorageSync(STORAGE_FULL_SYNC_PERIOD)
     mythtv_storage = { 'resource' : 'uc/storage',
                        'items' : notdict(dict(),
                                          notify=mythtv_storage_notify,
@@ -489,132 +687,162 @@ def initialise(server,logo=None):
 
     mythtv_programmes = Programmes()
 
-    xml = MythXML()
+    mythtv_text_index = TextIndex()
+    mythtv_guide_index = GuideIndex()
+    mythtv_id_index = IdIndex()
 
-    update_thread = UpdateThread()
-    update_thread.start()
+    if epg_fixture is not None:
+        mythtv_epg = EPGMirror.from_dump(epg_fixture,feed_id=id_component)
+    else:
+        mythtv_epg = EPGMirror(MythTVEPGBackend(),path=epg_path,history=GUIDE_INDEX_HISTORY,feed_id=id_component)
+        mythtv_epg.start(GUIDE_INDEX_PERIOD,log=uc_server.log_message)
+    mythtv_netvision = NetVisionCatalogue(programme_from_article,id_component,id_component)
+    mythtv_query_compiler = QueryCompiler(category_lookup)
+    mythtv_fanout = FanOut(workers=FANOUT_WORKERS,deadline=FANOUT_DEADLINE,log=uc_server.log_message)
 
+    start_update_thread()
 
-class UpdateThread (threading.Thread):
 
-    daemon = True
+def update_frontend():
+    """This function checks that the frontend is running, and brings the output, its volume and the default
+    content of the live sources up to date with it. The first time it reaches the frontend it also loads the menu
+    locations, and asks for the content indexes to be brought up to date with them."""
+    global mythtv_outputs
+    global mythtv_sources
+    global mythtv_menu_locations
+    global mythtv_menu_programmes
 
-    lock = threading.Condition()
-    
-    def run(self):
-        global mythtv_outputs
-        global mythtv_sources
-        global mythtv_acquisitions
-        global mythtv_menu_programmes
+    if mythtv_menu_locations is None:
+        mythtv_menu_locations = with_frontend(lambda fe : fe.getJump())
+        if mythtv_menu_locations is None:
+            mythtv_playhead.forget()
+            return
 
-        myth_menu_locations = None
+        #Manually add GameUI location
+        mythtv_menu_locations.append(('GameUI','MythGame Game Selection UI'))
+        mythtv_menu_locations.append(('mythbrowser','MythTV web browser'))
+
+        mythtv_menu_programmes = [ { 'sid' : 'mythtv',
+                                     'cid' : id_component(location[0]),
+                                     'synopsis' : 'MythTV UI, Jump point: %s' % repr(str(location[1])),
+                                     'title' : str(location[1]),
+                                     'interactive' : True
+                                     }
+                                   for location in mythtv_menu_locations ]
+
+        mythtv_menu_programmes = ([ prog for prog in mythtv_menu_programmes if prog['cid'] == 'mainmenu' ] + 
+                                  [ prog for prog in mythtv_menu_programmes if prog['cid'] == 'livetv' ] + 
+                                  [ prog for prog in mythtv_menu_programmes if prog['cid'] not in ('mainmenu','livetv') ])
+        refresh('indexes')
+
+    elif not with_frontend(lambda fe : True, False):
+        mythtv_playhead.forget()
+        return
 
-        while(True):
-            self.lock.acquire()
-            self.lock.wait(1)
-            self.lock.release()
-            
-            if myth_menu_locations is None:
-                try:
-                    fe = MythDB().getFrontends().next()
-                except:
-                    uc_server.set_standby(True)
-                    continue
-                else:
-                    uc_server.set_standby(False)
-                    try:
-                        myth_menu_locations = fe.getJump()
-                    except:                    
-                        continue
-
-                #Manually add GameUI location
-                myth_menu_locations.append(('GameUI','MythGame Game Selection UI'))
-                myth_menu_locations.append(('mythbrowser','MythTV web browser'))
-
-                mythtv_menu_programmes = [ { 'sid' : 'mythtv',
-                                             'cid' : id_component(location[0]),
-                                             'synopsis' : 'MythTV UI, Jump point: %s' % repr(str(location[1])),
-                                             'title' : str(location[1]),
-                                             'interactive' : True
-                                             }
-                                           for location in myth_menu_locations ]
-
-                mythtv_menu_programmes = ([ prog for prog in mythtv_menu_programmes if prog['cid'] == 'mainmenu' ] + 
-                                          [ prog for prog in mythtv_menu_programmes if prog['cid'] == 'livetv' ] + 
-                                          [ prog for prog in mythtv_menu_programmes if prog['cid'] not in ('mainmenu','livetv') ])
+    update_output(mythtv_menu_locations)
 
-            else:
-                try:
-                    fe = MythDB().getFrontends().next()
-                except:
-                    uc_server.set_standby(True)
-                    continue
-                else:
-                    uc_server.set_standby(False)
+    if 'programme' not in mythtv_outputs['0'] or mythtv_outputs['0']['programme'] is None:
+        mythtv_outputs['0'].data['settings'].set('volume',None)
+    else:
+        query = sendQuery('volume')
+        if query is None:
+            mythtv_outputs['0'].data['settings'].set('volume',None)
+            return
 
+        volume = parse_volume(query)
+        if volume is not None:
+            mythtv_outputs['0'].data['settings'].set('volume',volume*100)
 
-            try:
-                update_output(myth_menu_locations)
-            except Exception as inst:
-                uc_server.log_message(traceback.format_exc())
-                continue
+    query =  sendQuery('livetv')
+    if query is None:
+        return
 
-            if 'programme' not in mythtv_outputs['0'] or mythtv_outputs['0']['programme'] is None:
-                mythtv_outputs['0'].data['settings'].set('volume',None)
-            else:
-                query = sendQuery('volume')
-                if query is None:
-                    mythtv_outputs['0'].data['settings'].set('volume',None)
-                    continue
+    for entry in parse_livetv(query):
+        sid = '%04d' % entry.chanid
+        pid = id_component('%sZ' % entry.starttime.isoformat())
+        if sid in mythtv_sources:
+            if 'default-content-id' not in mythtv_sources[sid] or mythtv_sources.data[sid].data['default-content-id'] != pid:
+                mythtv_sources.data[sid].set('default-content-id',pid)
+
+
+def update_content_indexes():
+    """This function brings the text and id indexes up to date, reloading the guide index if the guide data in the
+    EPG mirror has changed and the NetVision catalogue if the articles in it have, and tells the server if any content
+    has changed."""
+    global mythtv_guide_sequence
+    global mythtv_netvision_sequence
+
+    if mythtv_netvision_sequence != mythtv_epg.sequences['netvision']:
+        mythtv_netvision_sequence = mythtv_epg.sequences['netvision']
+        mythtv_netvision.sync(mythtv_epg.articles())
+
+    changed = update_indexes() > 0
+    if mythtv_guide_sequence != mythtv_epg.sequences['program']:
+        mythtv_guide_sequence = mythtv_epg.sequences['program']
+        mythtv_programmes.update_guide_index()
+        changed = True
+    if changed:
+        uc_server.content_changed()
+
+
+def start_update_thread():
+    """This function starts the thread which keeps the server's state up to date, and connects to the backend event
+    stream to tell it when something has changed."""
+    global update_thread
 
-                match = re.match('(\d{1,3})%',query)
-                if match:
-                    try:
-                        volume = int(match.group(1))*100
-                    except:
-                        mythtv_outputs['0'].data['settings'].set('volume',None)
-                    else:
-                        mythtv_outputs['0'].data['settings'].set('volume',volume)
-                else:
-                    pass
+    calls   = { 'output'       : update_frontend,
+                'playhead'     : track_playhead,
+                'acquisitions' : update_acquisitions,
+                'storage'      : update_storage,
+                'netvision'    : update_mythnetvision,
+                'indexes'      : update_content_indexes,
+                'events'       : connect_event_monitor, }
+    follows = { 'indexes'      : ('storage','netvision'), }
+
+    update_thread = Refresher(workers=UPDATE_WORKERS,settle=EVENT_SETTLE,log=uc_server.log_message)
+    for (name,period,jitter,timeout,backoff) in UPDATE_JOBS:
+        update_thread.add(name,calls[name],period,jitter=jitter,timeout=timeout,backoff=backoff,follows=follows.get(name,()))
+    update_thread.add('statistics',log_update_statistics,STATISTICS_PERIOD)
+    update_thread.start()
 
-            query =  sendQuery('livetv')
-            if query is None:
-                continue
+    mythtv_epg.add_listener(lambda tables : update_thread.request('indexes') if ('program' in tables or 'netvision' in tables) else None)
 
-            lines = query.splitlines()
 
-            for line in lines:
-                match = re.match('\s*([0-9]+) ([0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}) ([0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}) (.+)',
-                                 line)
-                if match:
-                    try:
-                        sid = '%04d' % int(match.group(1))
-                    except:
-                        pass
-                    else:
-                        pid = id_component('%sZ' % match.group(2))
-                        if sid in mythtv_sources:
-                            if 'default-content-id' not in mythtv_sources[sid] or mythtv_sources.data[sid].data['default-content-id'] != pid:
-                                mythtv_sources.data[sid].set('default-content-id',pid)
+def log_update_statistics():
+    """This function logs the run-time statistics of the jobs run by the update thread."""
+    statistics = update_thread.statistics()
+    for name in sorted(statistics):
+        job = statistics[name]
+        if job['runs'] > 0:
+            uc_server.log_message("Update job %s: %d runs, %d errors, %d timeouts, mean %.3fs, longest %.3fs, last %.3fs",
+                                  name,job['runs'],job['errors'],job['timeouts'],job['mean'],job['longest'],job['last'])
+    bound = mythtv_playhead.bound()
+    uc_server.log_message("Playhead tracker: %d checks, %d jumps, drift %.4fs/s (at most %s), checking every %.1fs",
+                          mythtv_playhead.checks,mythtv_playhead.jumps,mythtv_playhead.rate,
+                          ('%.3fs' % bound) if bound is not None else 'n/a',mythtv_playhead.interval())
 
-            try: 
-                update_acquisitions()
-            except Exception as inst:
-                uc_server.log_message(traceback.format_exc())
-                continue
 
-            try:
-                update_storage()
-            except Exception as inst:
-                uc_server.log_message(traceback.format_exc())
-                continue
+def connect_event_monitor():
+    """This function connects to the backend event stream if it is not already connected. If it cannot then the state
+    is still refreshed by polling, and it tries again the next time it is called."""
+    global mythtv_event_monitor
+
+    if mythtv_event_monitor is None:
+        try:
+            mythtv_event_monitor = MythTVEventMonitor()
+        except:
+            uc_server.log_message("Could not connect to the backend event stream, polling instead")
 
-            try:
-                update_mythnetvision()
-            except Exception as inst:
-                uc_server.log_message(traceback.format_exc())
-                continue
+
+def refresh(*names):
+    """This function asks the update thread to refresh the named state soon (see Refresher)."""
+    if update_thread is not None:
+        update_thread.request(*names)
+
+
+def mythtv_netvision_entries():
+    with mythtv_connections.db() as db:
+        return list(InternetContent.getAllEntries(db=db))
 
 def update_mythnetvision():
     global mythtv_sources
@@ -627,9 +855,11 @@ def update_mythnetvision():
                                                              'follow-on' : False,
                                                              'rref'      : 'uc/sources/' + id_component(data.name),
                                                              'MYTHTV:type' : 'mythnetvision',
-                                                             })) for data in InternetContent.getAllEntries() if data.tree ]
+                                                             })) for data in mythtv_netvision_entries() if data.tree ]
+    changed = False
     for (sid,source) in netvisionsources:
-        mythtv_sources[sid] = source
+        if sid not in mythtv_sources or mythtv_sources[sid]['name'] != source['name']:
+            mythtv_sources[sid] = source
 
     netvisionsources = [ sid for (sid,source) in netvisionsources ]
 
@@ -638,10 +868,44 @@ def update_mythnetvision():
     for sid in to_delete:
         del mythtv_sources[sid]
         mythtv_source_lists['mythtv_mythnetvision']['sources'].remove(sid)
+        changed = True
 
     for sid in netvisionsources:
         if sid not in mythtv_source_lists['mythtv_mythnetvision']['sources']:
             mythtv_source_lists['mythtv_mythnetvision']['sources'].append(sid)
+            changed = True
+
+    if changed:
+        uc_server.source_lists_changed('mythtv_mythnetvision')
+
+
+def update_indexes():
+    """This function brings the menu, game, storage, netvision and extra source groups of the text and id indexes up to
+    date with the programmes currently held for them. Only programmes which have changed are re-indexed, so it
+    is cheap to call when nothing has changed. The guide groups are maintained separately by
+    Programmes.update_guide_index. Returns the number of programmes which changed."""
+    global mythtv_text_index
+    global mythtv_id_index
+
+    def field(prog,key):
+        return prog[key] if key in prog else None
+
+    groups = { 'menu'    : [ (('menu',n),'mythtv',prog) for (n,prog) in enumerate(mythtv_menu_programmes) ],
+               'game'    : [ (('game',pid),'mythgame',mythtv_game_programmes[pid]) for pid in mythtv_game_programmes ],
+               'storage' : [ (('storage',cid),mythtv_storage['items'][cid]['sid'],mythtv_storage['items'][cid]['MYTHTV:program']) 
+                             for cid in mythtv_storage['items'] ],
+               'netvision' : [ (('netvision',sid,cid),sid,prog) for (sid,cid,prog) in mythtv_netvision.items() ],
+               'extra'   : [ (('extra',source,n),source,prog) 
+                             for source in extra_sources 
+                             for (n,prog) in enumerate(extra_sources[source].get_content()) ],
+               }
+
+    changes = 0
+    for group in groups:
+        changes += mythtv_text_index.sync(group, [ (key, sid, n, field(prog,'title'), field(prog,'synopsis'), None, None, prog) 
+                                                   for (n,(key,sid,prog)) in enumerate(groups[group]) ])
+        changes += mythtv_id_index.sync(group, [ (key, sid, prog, prog) for (key,sid,prog) in groups[group] ])
+    return changes
 
 
 def update_output(myth_menu_locations):
@@ -655,221 +919,129 @@ def update_output(myth_menu_locations):
     now = datetime.datetime.utcnow()
     query = sendQuery('location')
     if query is None:
+        mythtv_playhead.forget()
         uc_server.set_standby(True)
         return
                 
-    # Format is:
-    #    Playback LiveTV 6:57 of 7:03 1x 5168 2010-09-03T11:00:00 10429 /var/lib/mythtv/livetv/5168_20100903110000.mpg 25 (15:31:54.109Z) Subtitles: *0:[None]* 1:[Subtitle 1: English]
-    #    Playback Video 0:03 1x myth://Videos@127.0.0.1:6543/20080531_180000_bbcone_doctor_who.ts 94 25 (15:31:54.109Z) Subtitles: *0:[None]*
-
     old_playhead = None
     if 'playhead' in mythtv_outputs['0'].data:
         old_playhead = mythtv_outputs['0'].data['playhead']
 
-    if re.match('Playback ', query):
-        if re.match('LiveTV ', query[9:]) or re.match('Recorded ', query[9:]) or re.match('Video ', query[9:]):
+    location = parse_location(query)
 
-            if query[9:15] != 'Video ':
-                match = re.search('(\d+):(\d+) of (\d+):(\d+) (-{,1}[0-9]+\.[0-9]+x|-{,1}[0-9]x|-{,1}[0-9]+/[0-9]+x|pause) ([0-9]+) ([0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}:[0-9]{2}) (\d+) (\S+) (\d+) \(@(\d\d):(\d\d):(\d\d)(\.(\d+))?Z\) Subtitles: (.+)',
-                                  query)
-            else:
-                match = re.search('(\d+):(\d+)()() (-{,1}[0-9]+\.[0-9]+x|-{,1}[0-9]x|-{,1}[0-9]+/[0-9]+x|pause) ()(\S+) (\d+)() (\d+) \((\d\d):(\d\d):(\d\d)(\.(\d+))?Z\) Subtitles: (.+)',
-                                  query)
-            if match:
+    if location.kind == 'error':
+        uc_server.log_message("MythTV Query returned an error, retrying is 1s")
+        return
 
-                try:
-                    hrs  = int(match.group(11))
-                    mins = int(match.group(12))
-                    secs = int(match.group(13))
-                    micr = int((match.group(15) + '000000')[0:6])
-                except:
-                    pass
-                else:
-                    now = now.replace(hour=hrs, minute=mins, second=secs, microsecond=micr)
-
-                substrings = []
-                substring = match.group(16)
-                m=re.match('\*{,1}(\d+):\[(.+?)\]\*{,1} *',substring)
-                while m:
-                    substrings.append((m.group(1),m.group(2),(m.group(0)[0] == '*')))
-                    substring = substring[len(m.group(0)):]
-                    m=re.match('\*{,1}(\d+):\[(.+?)\]\*{,1} *',substring)
-
-                media_components = []
-                if not substrings[0][2]:
-                    media_components.append({'type' : 'subtitles',
-                                             'mcid' : 'subtitles',})
-
-                if match.group(6) == '':
-                    try:
-                        pid = id_component(match.group(7).split('/')[-1])
-                    except:
-                        pid = ''
-                    mythtv_outputs['0'].set('programme',('SG_2',pid,media_components))
-                    mythtv_outputs['0'].set('app',None)
-                else:
-                    try:
-                        id = '%04d' % int(match.group(6))
-                    except:
-                        pass
-                    else:
-                        if re.match('LiveTV ', query[9:]):
-                            pid = id_component('%sZ' % (parse_iso(match.group(7)) + __timecorrect()).isoformat())
-                            if mythtv_outputs['0'].data['programme'] != (id,pid,media_components):
-                                mythtv_outputs['0'].set('programme',(id,pid,media_components))
-                                mythtv_outputs['0'].set('app',None)
-
-                            try:
-                                pos = int(match.group(1))*60 + int(match.group(2)) - int(match.group(3))*60 - int(match.group(4))
-                            except:
-                                mythtv_outputs['0'].set('playhead',None)
-                            else:
-                                mythtv_outputs['0'].set('playhead',{ 'rposition' : { 'position' : float(pos),
-                                                                                     'position_precision' : 0,
-                                                                                     'position_timestamp' : now,
-                                                                                     },
-                                                                     })
-                        else:
-                            pid = '%s_%s' % (id,match.group(7).replace('-','').replace(':','').replace('T',''))
-                            if pid in mythtv_storage['items']:
-                                if mythtv_outputs['0'].data['programme'] != (mythtv_storage['items'][pid]['sid'],pid,media_components):
-                                    mythtv_outputs['0'].set('programme',(mythtv_storage['items'][pid]['sid'],pid,media_components))
-                                    mythtv_outputs['0'].set('app',None)
-                            else:
-                                mythtv_outputs['0'].set('programme',None)
-                                mythtv_outputs['0'].set('app',None)
-                                mythtv_outputs['0'].set('playhead',None)
-
-                if not re.match('LiveTV ',query[9:]):
-                    try:
-                        length = int(match.group(3))*60 + int(match.group(4))
-                    except:
-                        if ('programme' in mythtv_outputs['0']
-                            and mythtv_outputs['0']['programme'] is not None
-                            and mythtv_programmes is not None):
-                            try:
-                                contents = [ c for c in mythtv_programmes.get([mythtv_outputs['0']['programme'][0],],1,0,content_ids=[mythtv_outputs['0']['programme'][1],]) ]
-                            except:
-                                length = None
-                            else:
-                                if len(contents) > 0:
-                                    length = float(contents[0]['duration']/10000)
-                                else:
-                                    length = None
-                        else:
-                            length = None
-
-                    try:
-                        pos    = float(match.group(8))/float(match.group(10)) + FIXED_POSITION_OFFSET
-                    except:
-                        mythtv_outputs['0'].set('playhead',None)
-                    else:
-                        mythtv_outputs['0'].set('playhead', { 'aposition' : { 'position' : pos,
-                                                                              'position_precision' : int(math.ceil(math.log10(int(match.group(10))))),
-                                                                              'position_timestamp' : now,
-                                                                              },
-                                                              })
-                        if length is not None:
-                            try:                                
-                                mythtv_outputs['0']['playhead']['length'] = float(length)
-                            except:
-                                pass
+    if location.kind == 'playback' and location.position is not None:
+        if location.timestamp is not None:
+            (hrs, mins, secs, micr) = location.timestamp
+            now = now.replace(hour=hrs, minute=mins, second=secs, microsecond=micr)
 
-                try:
-                    if match.group(5) == 'pause':
-                        speed = 0.0
-                    elif re.match('-{,1}[0-9]+(\.[0-9]+){,1}x$',match.group(5)):
-                        speed = float(match.group(5)[:-1])
-                    else:
-                        match2 = re.match('(-{,1}[0-9]+)/([0-9]+)x$',match.group(5))
-                        if match2:
-                            speed = float(match2.group(5))/float(match2.group(6))
-                except:
-                    pass
-                else:
-                    if speed != 0.0:
-                        mythtv_outputs['0'].set('playback',speed)
-                    else:
-                        mythtv_outputs['0'].set('playback',0.0)
-            else:
-                mythtv_outputs['0'].set('programme',None)
-                mythtv_outputs['0'].set('app',None)
-                mythtv_outputs['0'].set('playback',None)
-                mythtv_outputs['0'].set('playhead',None)                
-        else:
-            mythtv_outputs['0'].set('programme',None)
+        media_components = []
+        if location.subtitled():
+            media_components.append({'type' : 'subtitles',
+                                     'mcid' : 'subtitles',})
+
+        if location.mode == 'Video':
+            pid = id_component(location.filename.split('/')[-1])
+            mythtv_outputs['0'].set('programme',('SG_2',pid,media_components))
             mythtv_outputs['0'].set('app',None)
-            mythtv_outputs['0'].set('playback',None)
-            mythtv_outputs['0'].set('playhead',None)
-    elif re.match('game ',query):
-        match = re.match('game (.+) (.+)',query)
-        games = [ pid for pid in mythtv_game_programmes if (mythtv_game_programmes[pid]['MYTHTV:gamename'] == match.group(1) 
-                                                            and mythtv_game_programmes[pid]['MYTHTV:systemname'] == match.group(2)) ]
-        if len(games) > 0:
-            mythtv_outputs['0'].set('programme',None)
-            mythtv_outputs['0'].set('app',('mythgame', games[0], []))
-            mythtv_outputs['0'].set('playback',None)
-            mythtv_outputs['0'].set('playhead',None)
-        else:
+        elif location.starttime is None:
             mythtv_outputs['0'].set('programme',None)
             mythtv_outputs['0'].set('app',None)
-            mythtv_outputs['0'].set('playback',None)
             mythtv_outputs['0'].set('playhead',None)
-    elif re.match('ERROR',query):
-        uc_server.log_message("MythTV Query returned an error, retrying is 1s")
-        return
-    else:
-        try:
-            key = query.split(' ')[0]
-        except:
-            raise ValueError
+        elif location.mode == 'LiveTV':
+            id  = '%04d' % location.chanid
+            pid = id_component('%sZ' % (location.starttime + __timecorrect()).isoformat())
+            if mythtv_outputs['0'].data['programme'] != (id,pid,media_components):
+                mythtv_outputs['0'].set('programme',(id,pid,media_components))
+                mythtv_outputs['0'].set('app',None)
 
-        if key in dict(myth_menu_locations):
-            mythtv_outputs['0'].set('programme',None)
-            mythtv_outputs['0'].set('app',('mythtv',id_component(key),[':uk_keyboard',]))
-            mythtv_outputs['0'].set('playback', None)
-            mythtv_outputs['0'].set('playhead', None)
+            mythtv_outputs['0'].set('playhead',{ 'rposition' : { 'position' : float(location.position - location.length),
+                                                                 'position_precision' : 0,
+                                                                 'position_timestamp' : now,
+                                                                 },
+                                                 })
         else:
-            mythtv_outputs['0'].set('programme',None)
-            mythtv_outputs['0'].set('app',None)
-            mythtv_outputs['0'].set('playback', None)
-            mythtv_outputs['0'].set('playhead', None)
-
-    value = None
-    expected_value = None
-    if old_playhead is None and mythtv_outputs['0'].data['playhead'] is None:
-        pass
-    elif (((old_playhead is None) != (mythtv_outputs['0'].data['playhead'] is None))
-          or (('aposition' in old_playhead and old_playhead['aposition'] is not None) 
-              != ('aposition' in mythtv_outputs['0'].data['playhead'] and mythtv_outputs['0'].data['playhead']['aposition'] is not None))
-          or (('rposition' in old_playhead and old_playhead['rposition'] is not None) 
-              != ('rposition' in mythtv_outputs['0'].data['playhead'] and mythtv_outputs['0'].data['playhead']['rposition'] is not None))):
-        uc_server.notify_change('uc/outputs/0/playhead')
-    elif ( 'aposition' in old_playhead
-           and 'aposition' in mythtv_outputs['0'].data['playhead']
-           and 'playback' in mythtv_outputs['0']
-           and mythtv_outputs['0'].data['playback'] is not None):        
-        diff = (mythtv_outputs['0'].data['playhead']['aposition']['position_timestamp'] - old_playhead['aposition']['position_timestamp'])
-        expected_value = old_playhead['aposition']['position'] + float(mythtv_outputs['0'].data['playback'])*(float(diff.seconds) + (float(diff.microseconds)/float(1000000.0)))
-        value = mythtv_outputs['0'].data['playhead']['aposition']['position']
-
-        diff = abs(expected_value - value)
-        
-        if diff > mythtv_outputs['0'].data['playback']:
-            uc_server.log_message("Playhead location: %f, expected %f ---- Difference: %f" % (value,expected_value,diff,))
+            pid = '%04d_%s' % (location.chanid, location.starttime.strftime('%Y%m%d%H%M%S'))
+            if pid in mythtv_storage['items']:
+                if mythtv_outputs['0'].data['programme'] != (mythtv_storage['items'][pid]['sid'],pid,media_components):
+                    mythtv_outputs['0'].set('programme',(mythtv_storage['items'][pid]['sid'],pid,media_components))
+                    mythtv_outputs['0'].set('app',None)
+            else:
+                mythtv_outputs['0'].set('programme',None)
+                mythtv_outputs['0'].set('app',None)
+                mythtv_outputs['0'].set('playhead',None)
+
+        if location.mode != 'LiveTV':
+            length = location.length
+            if (length is None
+                and 'programme' in mythtv_outputs['0']
+                and mythtv_outputs['0']['programme'] is not None
+                and mythtv_programmes is not None):
+                try:
+                    contents = [ c for c in mythtv_programmes.get([mythtv_outputs['0']['programme'][0],],1,0,content_ids=[mythtv_outputs['0']['programme'][1],]) ]
+                except:
+                    length = None
+                else:
+                    if len(contents) > 0:
+                        length = float(contents[0]['duration']/10000)
+
+            if location.framerate <= 0.0:
+                mythtv_outputs['0'].set('playhead',None)
+            else:
+                mythtv_outputs['0'].set('playhead', { 'aposition' : { 'position' : location.frame/location.framerate + FIXED_POSITION_OFFSET,
+                                                                      'position_precision' : max(0,int(math.ceil(math.log10(location.framerate)))),
+                                                                      'position_timestamp' : now,
+                                                                      },
+                                                      })
+                if length is not None:
+                    mythtv_outputs['0']['playhead']['length'] = float(length)
+
+        mythtv_outputs['0'].set('playback',location.speed)
+    elif location.kind == 'game':
+        games = [ pid for pid in mythtv_game_programmes if (mythtv_game_programmes[pid]['MYTHTV:gamename'] == location.game
+                                                            and mythtv_game_programmes[pid]['MYTHTV:systemname'] == location.system) ]
+        mythtv_outputs['0'].set('programme',None)
+        mythtv_outputs['0'].set('app',(('mythgame', games[0], []) if len(games) > 0 else None))
+        mythtv_outputs['0'].set('playback',None)
+        mythtv_outputs['0'].set('playhead',None)
+    elif location.kind == 'menu' and location.location in dict(myth_menu_locations):
+        mythtv_outputs['0'].set('programme',None)
+        mythtv_outputs['0'].set('app',('mythtv',id_component(location.location),[':uk_keyboard',]))
+        mythtv_outputs['0'].set('playback', None)
+        mythtv_outputs['0'].set('playhead', None)
+    else:
+        mythtv_outputs['0'].set('programme',None)
+        mythtv_outputs['0'].set('app',None)
+        mythtv_outputs['0'].set('playback', None)
+        mythtv_outputs['0'].set('playhead', None)
+
+    playhead = mythtv_outputs['0'].data['playhead']
+    if playhead is None:
+        mythtv_playhead.forget()
+        if old_playhead is not None:
+            uc_server.notify_change('uc/outputs/0/playhead')
+    else:
+        kind = 'aposition' if 'aposition' in playhead else 'rposition'
+        drift = mythtv_playhead.observe(mythtv_outputs['0'].data['programme'],
+                                        kind,
+                                        playhead[kind]['position'],
+                                        mythtv_outputs['0'].data['playback'],
+                                        playhead[kind]['position_timestamp'])
+        playhead['drift'] = mythtv_playhead.bound()
+        if drift is None or abs(drift) > PLAYHEAD_TOLERANCE:
+            if drift is not None:
+                uc_server.log_message("Playhead location: %f, expected %f ---- Difference: %f" % (playhead[kind]['position'],playhead[kind]['position'] - drift,abs(drift)))
             uc_server.notify_change('uc/outputs/0/playhead')
-    elif ('rposition' in old_playhead
-          and 'rposition' in mythtv_outputs['0'].data['playhead']
-          and mythtv_outputs['0'].data['playback'] is not None):
-        diff = (mythtv_outputs['0'].data['playhead']['rposition']['position_timestamp'] - old_playhead['rposition']['position_timestamp'])
-        expected_value = old_playhead['rposition']['position'] + float(mythtv_outputs['0'].data['playback'] - 1.0)*(float(diff.seconds) + (float(diff.microseconds)/float(1000000.0)))
-        value = mythtv_outputs['0'].data['playhead']['rposition']['position']
 
-        diff = abs(expected_value - value)
 
-        if diff > mythtv_outputs['0'].data['playback']:
-            uc_server.notify_change('uc/outputs/0/playhead')
-        
+def track_playhead():
+    """This function asks for the output to be refreshed when the playhead tracker expects it to have drifted too far
+    from the playhead the server has for it (see PlayheadTracker)."""
+    if mythtv_playhead.due():
+        refresh('output')
 
 def update_storage():
     global mythtv_storage
@@ -878,7 +1050,8 @@ def update_storage():
     global uc_server
 
     try:
-        groups = dict([ ('%d' % group.id,group) for group in MythDB().getStorageGroup() ])
+        with mythtv_connections.db() as db:
+            groups = dict([ ('%d' % group.id,group) for group in db.getStorageGroup() ])
     except:
         raise 
 
@@ -924,7 +1097,8 @@ def update_storage():
     recgroups = dict([ (source['MYTHTV:groupname'],source['id']) for source in sources ])
 
     try:
-        (size,used) = MythBE().getFreeSpaceSummary()
+        with mythtv_connections.backend() as be:
+            (size,used) = be.getFreeSpaceSummary()
     except:
         raise
 
@@ -933,154 +1107,177 @@ def update_storage():
     if 'free' not in mythtv_storage or mythtv_storage['free'] != (size - used):
         mythtv_storage['free']  = int(size - used)
 
+    now = datetime.datetime.now()
+    summary = storage_summary(recgroups)
+    if not mythtv_storage_sync.stale(summary,now):
+        return
+
     try:
-        recordings = MythBE().getRecordings()
+        with mythtv_connections.backend() as be:
+            recordings = list(be.getRecordings())
     except:
         raise
 
     try:
-        videos = MythTV.Video.getAllEntries()
+        with mythtv_connections.db() as db:
+            videos = list(MythTV.Video.getAllEntries(db=db))
     except:
         raise
 
-    recordings = dict([ (id_component("%s_%s" % (recording.chanid,recording.recstartts.strftime('%Y%m%d%H%M%S'))),recording) for recording in recordings ])
-    videos     = dict([ (id_component(vid.filename),vid) for vid in videos ])
-    
+    # Recordings which are still in progress are left out until they end
+    recheck = min([ rec.recendts for rec in recordings if now < rec.recendts ] or [ None ])
+
+    def entries():
+        for rec in recordings:
+            if now < rec.recendts or rec.recgroup not in recgroups:
+                continue
+            rid = id_component("%s_%s" % (rec.chanid,rec.recstartts.strftime('%Y%m%d%H%M%S')))
+            fingerprint = (rec.lastmodified, int(rec.filesize), rec.recendts, recgroups[rec.recgroup],
+                           mythtv_sources['%04d' % rec.chanid]['MYTHTV:type'] if '%04d' % rec.chanid in mythtv_sources else None)
+            yield (rid, fingerprint, lambda rid=rid, rec=rec : storage_item_for_recording(rid,rec,recgroups))
+        for vid in videos:
+            vidid = id_component(vid.filename)
+            fingerprint = (vid.title, vid.tagline, vid.filename, vid.insertdate, vidid in ManualVideoMetadata)
+            yield (vidid, fingerprint, lambda vidid=vidid, vid=vid : storage_item_for_video(vidid,vid))
+
+    (built, removed) = mythtv_storage_sync.update(entries())
+
+    # The items are altered directly so that there is a single notification for the whole sync
+    items = mythtv_storage['items']
+    for key in built:
+        items.data[key] = built[key]
+    for key in removed:
+        if key in items.data:
+            del items.data[key]
+
+    mythtv_storage_sync.synced(summary,now,recheck)
+
+    if built or removed:
+        mythtv_storage_notify(None)
+
+def storage_summary(recgroups):
+    """This function returns a summary of the recorded and videometadata tables which changes whenever a recording or
+    video is added, removed or altered (except for some changes to videos, which are picked up by the periodic full
+    sync), or None if the database cannot be queried."""
+    try:
+        with mythtv_connections.db() as db:
+            cursor = db.cursor()
+            cursor.execute("SELECT (SELECT COUNT(*) FROM recorded), (SELECT MAX(lastmodified) FROM recorded), "
+                           "(SELECT COUNT(*) FROM videometadata), (SELECT MAX(intid) FROM videometadata)")
+            return (tuple(cursor.fetchone()), tuple(sorted(recgroups.items())))
+    except:
+        uc_server.log_message(traceback.format_exc())
+        return None
+
+def storage_item_for_recording(rid,rec,recgroups):
+    """This function builds the uc/storage item for a recording."""
+
     def __timecorrect():
         return datetime.timedelta(seconds=(time.timezone if time.localtime().tm_isdst==0 else time.altzone))
 
-    for rid in recordings:
-        rec = recordings[rid]        
-
-        if datetime.datetime.now() < rec.recendts:
-            continue
+    duration = (rec.endtime - rec.starttime)
+    item = notdict({ 'cid' : rid,
+                     'sid' : recgroups[rec.recgroup],
+                     'created-time' : '%sZ' % (rec.recendts + __timecorrect()).isoformat(),
+                     'size' : int(rec.filesize),
+                     'MYTHTV:chanid' : rec.chanid,
+                     'MYTHTV:recstartts' : rec.recstartts + __timecorrect(),
+                     'MYTHTV:program' : { 'sid' : recgroups[rec.recgroup],
+                                          'cid' : rid,
+                                          'synopsis' : str(rec.description),
+                                          'title' : str(rec.title),
+                                          'pref'  : str(rec.filename).replace('127.0.0.1',uc_server.ip_address()),
+                                          'duration' : int((duration.days*86400 + duration.seconds)*10000 + duration.microseconds//100),
+                                          'interactive' : False,
+                                          'presentable' : True,
+                                          'media-components' : recording_components(rec),
+                                          },
+                     'MYTHTV:play_command' : 'program %d %s' % (rec.chanid, rec.recstartts.isoformat()),                         
+                     }, 
+                   notify=None,
+                   setters={ 'cid' : None,
+                             'sid' : None,
+                             'created-time' : None,
+                             'size' : None })
+    if rec.programid is not None:
+        try:
+            item['global-content-id'] = 'crid://%s' % (rec.programid,)
+            item['MYTHTV:program']['global-content-id'] = 'crid://%s' % (rec.programid,)
+        except:
+            pass
 
-        if rec.recgroup not in recgroups:
-            continue
+    if rec.seriesid is not None:
+        try:
+            item['MYTHTV:program']['global-series-id'] = 'crid://%s' % (rec.seriesid)
+            item['MYTHTV:program']['series-id'] = id_component('%s' % (rec.seriesid))
+        except:
+            pass
 
-        if rid not in mythtv_storage['items'].data:
-            duration = (rec.endtime - rec.starttime)
-            mythtv_storage['items'].set(rid,notdict({ 'cid' : rid,
-                                                      'sid' : recgroups[rec.recgroup],
-                                                      'created-time' : '%sZ' % (rec.recendts + __timecorrect()).isoformat(),
-                                                      'size' : int(rec.filesize),
-                                                      'MYTHTV:chanid' : rec.chanid,
-                                                      'MYTHTV:recstartts' : rec.recstartts + __timecorrect(),
-                                                      'MYTHTV:program' : { 'sid' : recgroups[rec.recgroup],
-                                                                           'cid' : rid,
-                                                                           'synopsis' : str(rec.description),
-                                                                           'title' : str(rec.title),
-                                                                           'pref'  : str(rec.filename).replace('127.0.0.1',uc_server.ip_address()),
-                                                                           'duration' : int((duration.days*86400 + duration.seconds)*10000 + duration.microseconds//100),
-                                                                           'interactive' : False,
-                                                                           'presentable' : True,
-                                                                           'media-components' : {'audio' : { 'id' : 'audio',
-                                                                                                             'type' : 'audio',
-                                                                                                             'name' : "Primary Audio",
-                                                                                                             'default' : True,
-                                                                                                             },
-                                                                                                 },
-                                                                           },
-                                                      'MYTHTV:play_command' : 'program %d %s' % (rec.chanid, rec.recstartts.isoformat()),                         
-                                                      }, 
-                                                    notify=mythtv_storage_notify,
-                                                    setters={ 'cid' : None,
-                                                              'sid' : None,
-                                                              'created-time' : None,
-                                                              'size' : None }))
-            if '%04d' % rec.chanid in mythtv_sources and mythtv_sources['%04d' % rec.chanid]['MYTHTV:type'] == 'tv':
-                try:
-                    mythtv_storage['items'][rid]['MYTHTV:program']['media-components']['video'] = { 'id' : 'video',
-                                                                                                    'type' : 'video',
-                                                                                                    'name' : "Primary Video",
-                                                                                                    'default' : True,
-                                                                                                    'colour' : True,
-                                                                                                    }
-                except:
-                    raise
+    # Notifications are only wanted once the item is in storage
+    item.notify = mythtv_storage_notify
+    return item
 
-                if rec.video_props is not None:
-                    try:
-                        mythtv_storage['items'][rid]['MYTHTV:program']['media-components']['video']['aspect'] = ('4:3','16:9','16:9','16:9')[rec.video_props]
-                    except:
-                        pass
-                    try:
-                        mythtv_storage['items'][rid]['MYTHTV:program']['media-components']['video']['vidformat'] = ('SD','SD','HD','HD')[rec.video_props]
-                    except:
-                        pass
-
-            if rec.subtitle_type is not None:
-                try:
-                    mythtv_storage['items'][rid]['MYTHTV:program']['media-components']['subtitles'] = { 'id' : 'subtitles',
-                                                                                                        'type' : 'subtitles',
-                                                                                                        'name' : "Subtitles",
-                                                                                                        'default' : False,
-                                                                                                        }
-                except:
-                    pass
-            
-            if rec.programid is not None:
-                try:
-                    mythtv_storage['items'][rid]['global-content-id'] = 'crid://%s' % (rec.programid,)
-                    mythtv_storage['items'][rid]['MYTHTV:program']['global-content-id'] = 'crid://%s' % (rec.programid,)
-                except:
-                    pass
+def recording_components(rec):
+    """This function returns the shared media-components dictionary for a recording."""
+    components = [ PRIMARY_AUDIO, ]
 
-            if rec.seriesid is not None:
-                try:
-                    mythtv_storage['items'][rid]['MYTHTV:program']['global-series-id'] = 'crid://%s' % (rec.seriesid)
-                    mythtv_storage['items'][rid]['MYTHTV:program']['series-id'] = id_component('%s' % (rec.seriesid))
-                except:
-                    pass
-        else:
-            if int(rec.filesize) != mythtv_storage['items'][rid]['size']:
-                mythtv_storage['items'][rid].set('size',int(rec.filesize))
+    if '%04d' % rec.chanid in mythtv_sources and mythtv_sources['%04d' % rec.chanid]['MYTHTV:type'] == 'tv':
+        video = { 'colour' : True }
+        if rec.video_props is not None:
+            try:
+                video['aspect'] = ('4:3','16:9','16:9','16:9')[rec.video_props]
+            except:
+                pass
+            try:
+                video['vidformat'] = ('SD','SD','HD','HD')[rec.video_props]
+            except:
+                pass
+        components.append(variant(PRIMARY_VIDEO,**video))
+
+    if rec.subtitle_type is not None:
+        components.append(variant(PRIMARY_SUBTITLES,name="Subtitles"))
+
+    return media_components(*components)
+
+def programme_from_article(article):
+    """This function builds the programme for a MythNetVision article, for the NetVision catalogue."""
+    return { 'sid' : id_component(article.feedtitle),
+             'cid' : id_component(article.url),
+             'title' : article.title,
+             'synopsis' : article.description,
+             'logo-href' : article.thumbnail,
+             'media-components' : media_components(PRIMARY_AUDIO),
+             'pref' : article.url,
+             'interactive' : False,
+             }
+
+def storage_item_for_video(vidid,vid):
+    """This function builds the uc/storage item for a video."""
+    item = notdict({ 'id' : vidid,
+                     'sid' : "SG_2",
+                     'created-time' : '%sZ' % vid.insertdate.isoformat(),
+                     'MYTHTV:program' : { 'sid' : "SG_2",
+                                          'cid' : vidid,
+                                          'synopsis' : str(vid.tagline),
+                                          'title' : str(vid.title),
+                                          'interactive' : False,
+                                          'presentable' : True,
+                                          'media-components' : media_components(PRIMARY_AUDIO,PRIMARY_VIDEO),
+                                          },
+                     'MYTHTV:play_command' : 'file /var/lib/mythtv/videos/%s' % (vid.filename,),
+                     }, 
+                   notify=None,
+                   setters={ 'cid' : None,
+                             'sid' : None,
+                             'created-time' : None,
+                             'size' : None })
 
-    
-    for vidid in videos:
-         vid = videos[vidid]
-
-         if vidid not in mythtv_storage['items'].data:
-             mythtv_storage['items'].set(vidid,notdict({ 'id' : vidid,
-                                                         'sid' : "SG_2",
-                                                         'created-time' : '%sZ' % vid.insertdate.isoformat(),
-                                                         'MYTHTV:program' : { 'sid' : "SG_2",
-                                                                              'cid' : vidid,
-                                                                              'synopsis' : str(vid.tagline),
-                                                                              'title' : str(vid.title),
-                                                                              'interactive' : False,
-                                                                              'presentable' : True,
-                                                                              'media-components' : {'audio' : { 'id' : 'audio',
-                                                                                                                'type' : 'audio',
-                                                                                                                'name' : "Primary Audio",
-                                                                                                                'default' : True,
-                                                                                                                },
-                                                                                                    'video' : { 'id' : 'video',
-                                                                                                                'type' : 'video',
-                                                                                                                'name' : "Primary Video",
-                                                                                                                'default' : True,
-                                                                                                                },
-                                                                                                    },                                                                             
-                                                                              },
-                                                         'MYTHTV:play_command' : 'file /var/lib/mythtv/videos/%s' % (vid.filename,),
-                                                         }, 
-                                                       notify=mythtv_storage_notify,
-                                                       setters={ 'cid' : None,
-                                                                 'sid' : None,
-                                                                 'created-time' : None,
-                                                                 'size' : None }))                
-             if vidid in ManualVideoMetadata:
-                 mythtv_storage['items'][vidid]['MYTHTV:program'] = ManualVideoMetadata[vidid]
-
-
-             
-    to_delete = []
-    for rid in mythtv_storage['items'].data:
-        if rid not in recordings and rid not in videos:
-            to_delete.append(rid)
+    if vidid in ManualVideoMetadata:
+        item['MYTHTV:program'] = ManualVideoMetadata[vidid]
 
-    for rid in to_delete:
-        mythtv_storage['items'].remove(rid)
+    # Notifications are only wanted once the item is in storage
+    item.notify = mythtv_storage_notify
+    return item
 
 def update_acquisitions():
     global mythtv_acquisitions
@@ -1088,7 +1285,8 @@ def update_acquisitions():
     def __timecorrect():
         return datetime.timedelta(seconds=(time.timezone if time.localtime().tm_isdst==0 else time.altzone))
 
-    power_rules = dict([ (record.recordid, record) for record in Record.getAllEntries() if record.search == 1L ])
+    with mythtv_connections.db() as db:
+        power_rules = dict([ (record.recordid, record) for record in Record.getAllEntries(db=db) if record.search == 1L ])
 
     programme_crids = dict()
     series_crids = dict()
@@ -1115,9 +1313,10 @@ def update_acquisitions():
             continue
 
     try:
-        recordings = dict([ (id_component('%s__%s__%sZ' % (str(rec.recordid), rec.chanid, rec.recstartts.isoformat())),
-                             rec) 
-                            for rec in MythBE().getUpcomingRecordings() ])
+        with mythtv_connections.backend() as be:
+            recordings = dict([ (id_component('%s__%s__%sZ' % (str(rec.recordid), rec.chanid, rec.recstartts.isoformat())),
+                                 rec) 
+                                for rec in be.getUpcomingRecordings() ])
     except:
         recordings = {}
         
@@ -1230,7 +1429,7 @@ class MythTVOutputSelector:
                     if not ('app' in mythtv_outputs[self.oid] 
                             and  mythtv_outputs[self.oid]['app'] is not None 
                             and mythtv_outputs[self.oid]['app'][0] == 'mythtv'):
-                        MythDB().getFrontends().next().sendJump('mainmenu')
+                        sendJump('mainmenu')
 
                         lock = threading.Condition()
                         lock.acquire()
@@ -1243,15 +1442,11 @@ class MythTVOutputSelector:
                 return
             else:
                 if sid == 'SG_1':
-                    try:
-                        MythDB().getFrontends().next().sendJump('playbackbox')
-                    except:
+                    if not sendJump('playbackbox'):
                         raise ProcessingFailed
                     return
                 elif sid == 'SG_2':
-                    try:
-                        MythDB().getFrontends().next().sendJump('videobrowser')
-                    except:
+                    if not sendJump('videobrowser'):
                         raise ProcessingFailed
                     return
                 else:
@@ -1259,20 +1454,18 @@ class MythTVOutputSelector:
  
         elif sid in mythtv_source_lists['mythtv_mythnetvision']['sources']:
             
-            articles = [ a.url for a in InternetContentArticles.getAllEntries() if id_component(a.url) == cid ]
-            if len(articles) == 0:
+            article = mythtv_netvision.article(cid)
+            if article is None:
                 raise CannotFind
             else:
-                sendPlay('url %s' % (articles[0],))
+                sendPlay('url %s' % (article.url,))
             return
         elif sid in mythtv_sources and mythtv_sources[sid]['MYTHTV:type'] in ('tv','radio'):
             if (not ('programme' in mythtv_outputs
                      and mythtv_outputs[self.oid]['programme'] is not None
                      and mythtv_outputs[self.oid]['programme'][0] in mythtv_sources 
                      and mythtv_sources[mythtv_outputs[self.oid]['programme'][0]]['MYTHTV:type'] in ('tv','radio'))):
-                try:
-                    MythTV.MythDB().getFrontends().next().sendJump('livetv')
-                except:
+                if not sendJump('livetv'):
                     raise ProcessingFailed
 
                 lock = threading.Condition()
@@ -1291,14 +1484,10 @@ class MythTVOutputSelector:
         elif sid == 'mythtv':
             cids = [ programme['cid'] for programme in mythtv_menu_programmes ]
             if cid in cids:
-                try:
-                    MythTV.MythDB().getFrontends().next().sendJump(cid)
-                except:
+                if not sendJump(cid):
                     raise ProcessingFailed
             else:
-                try:
-                    MythTV.MythDB().getFrontends().next().sendJump('mainmenu')
-                except:
+                if not sendJump('mainmenu'):
                     raise ProcessingFailed
             return
         elif sid == 'mythgame':
@@ -1306,7 +1495,7 @@ class MythTVOutputSelector:
                 if not ('app' in mythtv_outputs[self.oid] 
                         and mythtv_outputs[self.oid]['app'] is not None
                         and mythtv_outputs[self.oid]['app'][0] == 'mythtv'):
-                    MythDB().getFrontends().next().sendJump('mainmenu')
+                    sendJump('mainmenu')
 
                     lock = threading.Condition()
                     lock.acquire()
@@ -1318,9 +1507,7 @@ class MythTVOutputSelector:
                                                 )):
                     raise ProcessingFailed
             elif cid == '':
-                try:
-                    MythTV.MythDB().getFrontends().next().sendJump('MythGame')
-                except:
+                if not sendJump('MythGame'):
                     raise ProcessingFailed
             else:
                 raise CannotFind("Cannot find given programme")
@@ -1329,9 +1516,19 @@ class MythTVOutputSelector:
         raise CannotFind("Cannot find given source")
         
 
+def mythtv_delete_record_rule(recordid):
+    """This function deletes the recording rule with the given recordid, if there is one, whilst still holding the
+    database handle the rule was loaded with."""
+    with mythtv_connections.db() as db:
+        recording_rules = [ record for record in Record.getAllEntries(db=db) if record.recordid == recordid ]
+        if len(recording_rules) != 0:
+            recording_rules[0].delete()
+
 class Acquirer:
     def acquire (self,global_content_id=None,cid=None,sid=None,series_id=None,priority=False):
         global mythtv_sources
+        global mythtv_guide_index
+        global mythtv_id_index
 
         def __timecorrect():
             return datetime.timedelta(seconds=(time.timezone if time.localtime().tm_isdst==0 else time.altzone))
@@ -1352,23 +1549,41 @@ class Acquirer:
                 uc_server.log_message(traceback.format_exc())
                 raise
 
-            try:
-                guides = [ prog for prog in MythDB().searchGuide(chanid=sid,
-                                                                 starttime=start - __timecorrect()) ]
+            indexed = None
+            if mythtv_guide_index.loaded:
+                indexed = mythtv_guide_index.at(sid,start)
+                if indexed is not None and indexed.starttime + __timecorrect() != start:
+                    indexed = None
 
-            except Exception as inst:
-                uc_server.log_message(traceback.format_exc())
-                guides = [ prog for prog in MythDB().searchGuide(chanid=sid,
-                                                                 starttime=start - __timecorrect()) ]
-                
-            global_content_ids = [ guide.programid for guide in guides if guide.programid is not None ]
-            if len(global_content_ids) > 0 :
-                global_content_id = 'crid://%s' % global_content_ids[0]
-            elif len(guides) > 0:
-                Record.fromGuide(guides[0])
-                return True
+            if indexed is not None and indexed.programid is not None and indexed.programid != '':
+                global_content_id = 'crid://%s' % indexed.programid
             else:
-                raise CannotFind
+                # A programme without a programid is recorded with a rule made from its guide entry, which must be
+                # made whilst the database handle the entry was read with is still borrowed
+                def lookup(db):
+                    guides = [ prog for prog in db.searchGuide(chanid=sid,
+                                                               starttime=start - __timecorrect()) ]
+                    global_content_ids = [ guide.programid for guide in guides if guide.programid is not None ]
+                    if len(global_content_ids) > 0 :
+                        return 'crid://%s' % global_content_ids[0]
+                    elif len(guides) > 0:
+                        Record.fromGuide(guides[0])
+                        return None
+                    else:
+                        raise CannotFind
+
+                try:
+                    with mythtv_connections.db() as db:
+                        global_content_id = lookup(db)
+                except CannotFind:
+                    raise
+                except Exception as inst:
+                    uc_server.log_message(traceback.format_exc())
+                    with mythtv_connections.db() as db:
+                        global_content_id = lookup(db)
+
+                if global_content_id is None:
+                    return True
 
         if global_content_id is None and series_id is None:
             raise CannotFind
@@ -1382,20 +1597,21 @@ class Acquirer:
             type = Record.kFindOneRecord
 
         else:
-            query = "program.seriesid='%s'" % unpctencode(series_id)
+            seriesids = [ record.payload.seriesid for record in mythtv_id_index.find('series-id',series_id,('guide',)) ]
+            if len(seriesids) > 0:
+                query = "program.seriesid='%s'" % seriesids[0]
+            else:
+                query = "program.seriesid='%s'" % unpctencode(series_id)
             
             type = Record.kAllRecord
             
-        try:
-            rec = Record()
-        except:
-            raise
-
-        rec.title       = 'UC Power Rule: %s' % datetime.datetime.now()
-        rec.description = query
-        rec.search      = 1L
-        rec.type        = type
-        rec.create()
+        with mythtv_connections.db() as db:
+            rec = Record(db=db)
+            rec.title       = 'UC Power Rule: %s' % datetime.datetime.now()
+            rec.description = query
+            rec.search      = 1L
+            rec.type        = type
+            rec.create()
 
         c = threading.Condition()
         with c:
@@ -1421,15 +1637,11 @@ class Acquirer:
         if acquisition_id in mythtv_acquisitions['content-acquisitions']:
 
             if mythtv_acquisitions['content-acquisitions'][acquisition_id]['MYTHTV:type'] == 'global-content-id':
-                recording_rules = [ record for record in Record.getAllEntries() if record.recordid == mythtv_acquisitions['content-acquisitions'][acquisition_id]['MYTHTV:recordid'] ]
-                if len(recording_rules) != 0:
-                    recording_rules[0].delete()
+                mythtv_delete_record_rule(mythtv_acquisitions['content-acquisitions'][acquisition_id]['MYTHTV:recordid'])
             else:
                 raise ProcessingFailed
         elif acquisition_id in mythtv_acquisitions['series-acquisitions']:
-            recording_rules = [ record for record in Record.getAllEntries() if record.recordid == mythtv_acquisitions['series-acquisitions'][acquisition_id]['MYTHTV:recordid'] ]
-            if len(recording_rules) != 0:
-                recording_rules[0].delete()                        
+            mythtv_delete_record_rule(mythtv_acquisitions['series-acquisitions'][acquisition_id]['MYTHTV:recordid'])
         else:
             raise CannotFind
 
@@ -1521,7 +1733,42 @@ class Programmes:
             count += 1
             yield prog
 
+    def programme_start(self,prog):
+        """This method returns the time used to order a programme in the results of a search: its start, or if it
+        has none the start of its presentation or acquisition window, or if it has none of these datetime.min."""
+        for key in ('start','presentable-from','acquirable-from'):
+            if key in prog and prog[key] is not None:
+                return prog[key]
+        return datetime.datetime.min
+
+    def sort_programmes(self,progs):
+        """This method returns a list of the given programmes sorted by programme_start, keeping programmes with the
+        same start in their original order."""
+        return sorted(progs,key=self.programme_start)
+
+    def merge(self,sources):
+        """This method merges several iterables of programmes, each already in order of programme_start (and sid),
+        into a single generator in that order. Ties are broken by the position of the source in the list and then
+        of the programme in the source, so the output is deterministic. The sources are read lazily, one programme
+        ahead of the output at most, so nothing is read from a source beyond what the caller consumes."""
+        heap = []
+
+        def push(n,iterator,seq):
+            for prog in iterator:
+                heapq.heappush(heap,(self.programme_start(prog),(prog['sid'] if 'sid' in prog else ''),n,seq,prog,iterator))
+                return
+
+        for (n,source) in enumerate(sources):
+            push(n,iter(source),0)
+
+        while heap:
+            (start,sid,n,seq,prog,iterator) = heapq.heappop(heap)
+            yield prog
+            push(n,iterator,seq + 1)
+
     def select_results(self,generator,results):
+        """This method takes the first results programmes from the generator. If there are any more then it also
+        returns a continuation which yields the rest, so that the server can resume the search from a cursor."""
         generator = ( x for x in generator )
         res = []
         for i in range(0,results):
@@ -1531,14 +1778,21 @@ class Programmes:
             except:
                 break
         try:
-            generator.next()
+            val = generator.next()
         except:
-            more = False
-        else:
-            more = True
+            return (res,False)
+
+        return (res,True,itertools.chain((val,),generator))
+
 
-        return (res,more)
+    def prefetch(self,sources,params):
+        """This method takes a list of callables which each return the programmes from one source, and reads enough
+        programmes from each of them for a page of results concurrently on the fan out pool. It returns a tuple of a
+        list of iterables over the programmes from each source and a flag which is False if any of them was cut short
+        at the deadline."""
+        global mythtv_fanout
 
+        return mythtv_fanout.prefetch(sources,params['offset'] + params['results'] + 1)
 
     def get_output(self,output,params):
         global mythtv_outputs
@@ -1597,79 +1851,168 @@ class Programmes:
 
 
     def get_sources(self,sources,params):
+        """This method searches each of the given sources for programmes, with the sources searched concurrently
+        on the fan out pool. A source which does not answer in time, or fails, is returned as an empty list of
+        results marked as having more but with no continuation, so that the results are neither cached nor
+        given a cursor."""
         global extra_sources
-        generators = []
+        global mythtv_fanout
+        calls = []
 
         for source in sources:            
             if source == 'mythtv':
                 if 'interactive' in params and not params['interactive']:
                     continue
-                generator = [ prog for prog in mythtv_menu_programmes ]
+                generator = lambda : [ prog for prog in mythtv_menu_programmes ]
             elif source in extra_sources:
-                generator = [ prog for prog in extra_sources[source].get_content() ]
+                generator = lambda source=source : [ prog for prog in extra_sources[source].get_content() ]
             elif source == 'mythgame':
                 if 'interactive' in params and not params['interactive']:
                     continue
-                generator = [ mythtv_game_programmes[prog] for prog in mythtv_game_programmes ]
+                generator = lambda : [ mythtv_game_programmes[prog] for prog in mythtv_game_programmes ]
             elif source in mythtv_source_lists['uc_storage']['sources']:
                 if 'AV' in params and not params['AV']:
                     continue
-                generator = [ mythtv_storage['items'][cid]['MYTHTV:program'] for cid in mythtv_storage['items'] if mythtv_storage['items'][cid]['sid'] == source ]
+                generator = lambda source=source : [ mythtv_storage['items'][cid]['MYTHTV:program'] for cid in mythtv_storage['items'] if mythtv_storage['items'][cid]['sid'] == source ]
             elif (source in mythtv_sources 
                   and 'live' in mythtv_sources[source]
                   and mythtv_sources[source]['live']):
                 if mythtv_sources[source]['MYTHTV:type'] in ('tv','radio') and 'AV' in params and not params['AV']:
                     continue
-                generator = self.programme_metadata_for_channel(source,params['start'],( params['end'] if 'end' in params else None))                    
+                calls.append(lambda source=source : self.search_channel(source,dict(params)))
+                continue
             elif (source in mythtv_source_lists['mythtv_mythnetvision']['sources']):
                 if 'AV' in params and not params['AV']:
                     continue
-                generator = self.programme_metadata_for_netvision(source,params['start'],(params['end'] if 'end' in params else None))
+                generator = lambda source=source : self.programme_metadata_for_netvision(source,params['start'],(params['end'] if 'end' in params else None))
             else:
                 raise CannotFind()
 
-            generators.append(generator)        
+            calls.append(lambda generator=generator : self.select_results(self.filterprogrammes(generator(),dict(params)),params['results']))
+
+        return mythtv_fanout.run(calls,default=([],True,None))
 
-        return  [ self.select_results(self.filterprogrammes(generator,params),params['results'])
-                  for generator in generators ]
+    def search_channel(self,source,params):
+        """This method searches the guide data for a single live source, using the local EPG mirror if it can."""
+        result = self.query_guide([source,],params)
+        if result is not None:
+            return result
+
+        generator = self.programme_metadata_for_channel(source,params['start'],( params['end'] if 'end' in params else None))
+        return self.select_results(self.filterprogrammes(generator,params),params['results'])
+
+    def query_guide(self,sources,params):
+        """This method answers a search over the guide data for the given live sources alone with a single query on
+        the local EPG mirror, which does all of the filtering and paging. It returns a tuple of the results and a flag
+        indicating whether there are more (and if there are, a continuation which pages through the rest by start time),
+        or None if the search cannot be done this way and the programmes must be filtered in Python instead."""
+        global mythtv_epg
+        global mythtv_query_compiler
+
+        if mythtv_epg is None or mythtv_query_compiler is None:
+            return None
+
+        query = mythtv_query_compiler.compile(params,chanids=[ int(source) for source in sources ],timecorrect=self.__timecorrect())
+        if query is None:
+            return None
+
+        (guides,more) = query.execute(mythtv_epg)
+        if not more:
+            return ([ self.programme_from_guide(guide) for guide in guides ],False)
+
+        def continuation(query,guide):
+            while True:
+                query = query.after(guide)
+                (guides,more) = query.execute(mythtv_epg)
+                for guide in guides:
+                    yield self.programme_from_guide(guide)
+                if not more:
+                    return
+
+        return ([ self.programme_from_guide(guide) for guide in guides ],True,continuation(query,guides[-1]))
 
 
     def get_text(self,text,params):
-        generators = []
-        
+        global mythtv_text_index
+
+        sources = []
         for source in extra_sources:
             if 'sid' not in params or source in params['sid']:
-                generators.append([ prog for prog in extra_sources[source].get_content() ])
+                sources.append(('extra',source))
         if not('interactive' in params and not params['interactive']) and ('sid' not in params or 'mythtv' in params['sid']):
-            generators.append([ prog for prog in mythtv_menu_programmes ])
+            sources.append(('menu','mythtv'))
         if not('interactive' in params and not params['interactive']) and ('sid' not in params or 'mythgame' in params['sid']):
-            generators.append([ mythtv_game_programmes[prog] for prog in mythtv_game_programmes ])
+            sources.append(('game','mythgame'))
         if not('AV' in params and not params['AV']):
             for source in mythtv_source_lists['uc_storage']['sources']:
                 if ('sid' not in params or source in params['sid']):
-                    generators.append([ mythtv_storage['items'][cid]['MYTHTV:program'] for cid in mythtv_storage['items'] if mythtv_storage['items'][cid]['sid'] == source ])
-            for source in mythtv_sources:
-                if ('sid' not in params or source in params['sid']):
-                    generators.append(self.programme_metadata_for_channel(source,params['start'],( params['end'] if 'end' in params else None)))
+                    sources.append(('storage',source))
             for source in mythtv_source_lists['mythtv_mythnetvision']['sources']:
                 if ('sid' not in params or source in params['sid']):
-                    generator = self.programme_metadata_for_netvision(source,params['start'],(params['end'] if 'end' in params else None))
+                    sources.append(('netvision',source))
+            for source in mythtv_sources:
+                if ('sid' not in params or source in params['sid']):
+                    sources.append(('guide',source))
 
         params['text'] = text
 
-        def streak(lists):
-            gens = [ (x for x in l) for l in lists ]
-            while gens:
-                todel = []
-                for g in gens:
-                    try:
-                        yield g.next()
-                    except:
-                        todel.append(g)
-                for d in todel:
-                    gens.remove(d)
+        if 'typeahead' in params and params['typeahead']:
+            return [ self.typeahead(text,params,sources), ]
+
+        documents = mythtv_text_index.search(text,params['field'],
+                                             groups=set([ group for (group,sid) in sources ]),
+                                             sids=(params['sid'] if 'sid' in params else None),
+                                             start=params['start'],
+                                             end=(params['end'] if 'end' in params else None))
+
+        candidates = dict()
+        for document in documents:
+            candidates.setdefault((document.group,document.sid),[]).append(document)
+
+        def programmes(documents):
+            documents = sorted(documents,key=lambda document : document.order)
+            if documents[0].group == 'guide':
+                return ( self.programme_from_guide(document.payload) for document in documents )
+            return self.sort_programmes([ document.payload for document in documents ])
+
+        generators = [ programmes(candidates[source]) for source in sources if source in candidates ]
+
+        return  [ self.select_results(self.filterprogrammes(self.merge(generators),params, textstrict=True), params['results']), ]
+
+    def typeahead(self,text,params,sources):
+        """This method answers a text search made as the user types, treating each word of the text as the start of a
+        word rather than a substring of one and returning the programmes starting closest to the start of the search
+        window first. It gives up on the first page once TYPEAHEAD_BUDGET has passed, in which case the results are
+        returned as incomplete (marked as having more, but with no continuation) so that they are not cached."""
+        global mythtv_text_index
+
+        budget = { 'deadline' : time.time() + TYPEAHEAD_BUDGET,
+                   'expired'  : False }
+
+        documents = mythtv_text_index.prefix_search(text,params['field'],
+                                                    groups=set([ group for (group,sid) in sources ]),
+                                                    sids=(params['sid'] if 'sid' in params else None),
+                                                    start=params['start'],
+                                                    end=(params['end'] if 'end' in params else None),
+                                                    near=params['start'])
+
+        def programmes():
+            for document in documents:
+                if budget['deadline'] is not None and time.time() > budget['deadline']:
+                    budget['expired'] = True
+                    return
+                if document.group == 'guide':
+                    yield self.programme_from_guide(document.payload)
+                else:
+                    yield document.payload
+
+        result = self.select_results(self.filterprogrammes(programmes(),params, textstrict=True), params['results'])
+        if budget['expired']:
+            return (result[0],True,None)
 
-        return  [ self.select_results(self.filterprogrammes(streak(generators),params, textstrict=True), params['results']), ]
+        # The budget only applies to the first page, the continuation is read when the client asks for more
+        budget['deadline'] = None
+        return result
 
     def get_categories(self,categories,params):
         generators = []
@@ -1680,300 +2023,196 @@ class Programmes:
 ###            generators.append([ mythtv_game_programmes[prog] for prog in mythtv_game_programmes ])
         for source in extra_sources:
             if 'sid' not in params or source in params['sid']:
-                generators.append([ prog for prog in extra_sources[source].get_content() ])
+                generators.append(lambda source=source : self.sort_programmes(extra_sources[source].get_content()))
         if not('AV' in params and not params['AV']):
             for source in mythtv_source_lists['uc_storage']['sources']:
                 if ('sid' not in params or source in params['sid']):
-                    generators.append([ mythtv_storage['items'][cid]['MYTHTV:program'] for cid in mythtv_storage['items'] if mythtv_storage['items'][cid]['sid'] == source ])
+                    generators.append(lambda source=source : self.sort_programmes([ mythtv_storage['items'][cid]['MYTHTV:program'] for cid in mythtv_storage['items'] if mythtv_storage['items'][cid]['sid'] == source ]))
             for source in mythtv_source_lists['mythtv_mythnetvision']['sources']:
                 if ('sid' not in params or source in params['sid']):
-                    generator = self.programme_metadata_for_netvision(source,params['start'],(params['end'] if 'end' in params else None))
+                    generators.append(lambda source=source : self.programme_metadata_for_netvision(source,params['start'],(params['end'] if 'end' in params else None)))
             for source in mythtv_sources:
                 if ('sid' not in params or source in params['sid']):
-                    generators.append(self.programme_metadata_for_channel(source,params['start'],( params['end'] if 'end' in params else None)))
+                    generators.append(lambda source=source : self.programme_metadata_for_channel(source,params['start'],( params['end'] if 'end' in params else None)))
 
         params['category'] = categories
+        (generators,complete) = self.prefetch(generators,params)
 
-        def streak(lists):
-            gens = [ (x for x in l) for l in lists ]
-            while gens:
-                todel = []
-                for g in gens:
-                    try:
-                        yield g.next()
-                    except:
-                        todel.append(g)
-                for d in todel:
-                    gens.remove(d)
-
-        return  [ self.select_results(self.filterprogrammes(streak(generators),params), params['results']), ]
+        result = self.select_results(self.filterprogrammes(self.merge(generators),params), params['results'])
+        if not complete:
+            result = (result[0],True,None)
+        return  [ result, ]
 
     def get_gcid(self,gcid,params):
-        generators = []
-
-#        if not('interactive' in params and not params['interactive']) and ('sid' not in params or 'mythtv' in params['sid']):
-#            generators.append([ prog for prog in mythtv_menu_programmes ])
-#        if not('interactive' in params and not params['interactive']) and ('sid' not in params or 'mythgame' in params['sid']):
-#            generators.append([ mythtv_game_programmes[prog] for prog in mythtv_game_programmes ])
-        for source in extra_sources:
-            if 'sid' not in params or source in params['sid']:
-                generators.append([ prog for prog in extra_sources[source].get_content() ])
-        if not('AV' in params and not params['AV']):
-            for source in mythtv_source_lists['uc_storage']['sources']:
-                if ('sid' not in params or source in params['sid']):
-                    gen = [ mythtv_storage['items'][cid]['MYTHTV:program'] for cid in mythtv_storage['items'] if mythtv_storage['items'][cid]['sid'] == source and 'global-content-id' in mythtv_storage['items'][cid]['MYTHTV:program'] and mythtv_storage['items'][cid]['MYTHTV:program']['global-content-id'] == gcid]
-                    generators.append(gen)
-#            for source in mythtv_source_lists['mythtv_mythnetvision']['sources']:
-#                if ('sid' not in params or source in params['sid']):
-#                    generator = self.programme_metadata_for_netvision(source,params['start'],(params['end'] if 'end' in params else None))
-            generators.append(self.programme_metadata_for_gids(gcid=gcid,start=params['start'],end=( params['end'] if 'end' in params else None)))
-
         params['gcid'] = [gcid,]
-
-        def streak(lists):
-            gens = [ (x for x in l) for l in lists ]
-            while gens:
-                todel = []
-                for g in gens:
-                    try:
-                        yield g.next()
-                    except:
-                        todel.append(g)
-                for d in todel:
-                    gens.remove(d)
-
-        return  [ self.select_results(self.filterprogrammes(streak(generators),params), params['results']), ]
+        return self.get_by_id('global-content-id',gcid,params,('extra','storage','guide'))
 
     def get_gsid(self,gsid,params):
-        generators = []
-        
-#        if not('interactive' in params and not params['interactive']) and ('sid' not in params or 'mythtv' in params['sid']):
-#            generators.append([ prog for prog in mythtv_menu_programmes ])
-#        if not('interactive' in params and not params['interactive']) and ('sid' not in params or 'mythgame' in params['sid']):
-#            generators.append([ mythtv_game_programmes[prog] for prog in mythtv_game_programmes ])
-        for source in extra_sources:
-            if 'sid' not in params or source in params['sid']:
-                generators.append([ prog for prog in extra_sources[source].get_content() ])
-        if not('AV' in params and not params['AV']):
-            for source in mythtv_source_lists['uc_storage']['sources']:
-                if ('sid' not in params or source in params['sid']):
-                    generators.append([ mythtv_storage['items'][cid]['MYTHTV:program'] for cid in mythtv_storage['items'] if mythtv_storage['items'][cid]['sid'] == source and 'global-series-id' in mythtv_storage['items'][cid]['MYTHTV:program'] and mythtv_storage['items'][cid]['MYTHTV:program']['global-series-id'] == gsid])
-#            for source in mythtv_source_lists['mythtv_mythnetvision']['sources']:
-#                if ('sid' not in params or source in params['sid']):
-#                    generator = self.programme_metadata_for_netvision(source,params['start'],(params['end'] if 'end' in params else None))
-            items = [ x for x in self.programme_metadata_for_gids(gsid=gsid,start=params['start'],end=( params['end'] if 'end' in params else None)) ]
-            generators.append(items)
-
         params['gsid'] = [gsid,]
+        return self.get_by_id('global-series-id',gsid,params,('extra','storage','guide'))
 
-        def streak(lists):
-            gens = [ (x for x in l) for l in lists ]
-            while gens:
-                todel = []
-                for g in gens:
-                    try:
-                        yield g.next()
-                    except:
-                        todel.append(g)
-                for d in todel:
-                    gens.remove(d)
+    def get_gaid(self,gaid,params):
+        params['gaid'] = [gaid,]
+        return self.get_by_id('global-app-id',gaid,params,('extra','menu','game'))
 
-        return  [ self.select_results(self.filterprogrammes(streak(generators),params), params['results']), ]
+    def get_by_id(self,kind,value,params,groups):
+        """This method answers a search for the programmes with a given id of the given kind in the given groups
+        of the id index (in order), restricted to those sids in params['sid'] if it is present. The storage and
+        guide groups are skipped if params['AV'] is False."""
+        global mythtv_id_index
+        global mythtv_guide_index
 
-    def get_gaid(self,gaid,params):
-        generators = []
-        
-        for source in extra_sources:
-            if 'sid' not in params or source in params['sid']:
-                generators.append([ prog for prog in extra_sources[source].get_content() ])
-        if ('sid' not in params or 'mythtv' in params['sid']):
-            generators.append([ prog for prog in mythtv_menu_programmes 
-                                if 'global-app-id' in prog and prog['global-app-id'] == gaid ])
-        if ('sid' not in params or 'mythgame' in params['sid']):
-            generators.append([ mythtv_game_programmes[prog] for prog in mythtv_game_programmes 
-                                if 'global-app-id' in mythtv_game_programmes[prog] and mythtv_game_programmes[prog]['global-app-id'] == gaid ])
+        if 'AV' in params and not params['AV']:
+            groups = [ group for group in groups if group not in ('storage','guide') ]
 
-        params['gaid'] = [gaid,]
+        sources = dict()
+        for record in mythtv_id_index.find(kind,value,groups):
+            if 'sid' in params and record.sid not in params['sid']:
+                continue
+            if record.group == 'guide':
+                if record.sid not in mythtv_sources:
+                    continue
+                prog = self.programme_from_guide(record.payload)
+            else:
+                prog = record.payload
+            sources.setdefault((groups.index(record.group),record.sid),[]).append(prog)
+
+        generators = [ self.sort_programmes(sources[source]) for source in sorted(sources.keys()) ]
 
-        def streak(lists):
-            gens = [ (x for x in l) for l in lists ]
-            while gens:
-                todel = []
-                for g in gens:
-                    try:
-                        yield g.next()
-                    except:
-                        todel.append(g)
-                for d in todel:
-                    gens.remove(d)
+        if 'guide' in groups and not mythtv_guide_index.loaded and kind in ('global-content-id','global-series-id'):
+            generators.append(self.programme_metadata_for_gids(gcid=(value if kind == 'global-content-id' else None),
+                                                               gsid=(value if kind == 'global-series-id' else None),
+                                                               start=params['start'],
+                                                               end=( params['end'] if 'end' in params else None)))
 
-        return  [ self.select_results(self.filterprogrammes(streak(generators),params), params['results']), ]
+        return  [ self.select_results(self.filterprogrammes(self.merge(generators),params), params['results']), ]
 
 
     def programme_metadata_for_netvision(self,source,start,end):
-        for article in [ a for a in InternetContentArticles.getAllEntries() if id_component(a.feedtitle) == source ]:
-            yield { 'sid' : id_component(article.feedtitle),
-                    'cid' : id_component(article.url),
-                    'title' : article.title,
-                    'synopsis' : article.description,
-                    'logo-href' : article.thumbnail,
-                    'media-components' : {'audio' : {'id' : 'audio',
-                                                     'type' : 'audio',
-                                                     'name' : 'Primary Audio',
-                                                     'default' : True,
-                                                     },
-                                          },
-                    'pref' : article.url,
-                    'interactive' : False,
-                    }
+        """This method returns the programmes for the articles of a MythNetVision feed, from the NetVision catalogue."""
+        global mythtv_netvision
+
+        return mythtv_netvision.programmes(source)
 
     def programme_metadata_for_gids(self,gcid=None,gsid=None,start=None,end=None):
-        global uc_server
+        global mythtv_epg
     
         if gcid is not None:
             gcid = gcid[7:]
         if gsid is not None:
             gsid = gsid[7:]
+        if start is not None:
+            start = start - self.__timecorrect()
+        if end is not None:
+            end = end - self.__timecorrect()
 
-        try:
-            guides = MythDB().searchGuide(endafter=start,startbefore=end,
-                                          programid=gcid,
-                                          seriesid=gsid)
-        except:
-            uc_server.log_message(traceback.format_exc())
-            guides = []        
+        for guide in mythtv_epg.search_guide(endafter=start,startbefore=end,programid=gcid,seriesid=gsid):
+            yield self.programme_from_guide(guide)
+
+    def update_guide_index(self):
+        """This method reloads the guide data for all channels from the local EPG mirror and brings the guide
+        index and the 'guide' groups of the text and id indexes up to date with it. The indexes hold the guide
+        rows themselves, which are turned into programmes only when they are returned by a query."""
+        global mythtv_text_index
+        global mythtv_guide_index
+        global mythtv_id_index
+        global mythtv_epg
+
+        guides = mythtv_epg.search_guide(endafter=datetime.datetime.now() - GUIDE_INDEX_HISTORY)
 
+        entries = []
         for guide in guides:
-            yield self.programme_from_guide(guide)
+            sid = "%04d" % guide.chanid
+            if sid not in mythtv_sources:
+                continue
+            entries.append((sid, guide.starttime + self.__timecorrect(), guide.endtime + self.__timecorrect(), guide))
+
+        mythtv_guide_index.sync(entries)
+        mythtv_text_index.sync('guide', [ (('guide',sid,start), sid, start, guide.title, guide.description, start, end, guide)
+                                          for (sid,start,end,guide) in entries ])
+        mythtv_id_index.sync('guide', [ (('guide',sid,start), sid, self.ids_from_guide(guide), guide)
+                                        for (sid,start,end,guide) in entries ])
+
+    def ids_from_guide(self,guide):
+        """This method returns a dictionary of the ids which programme_from_guide gives the programme for a guide
+        entry."""
+        ids = dict()
+        if guide.programid is not None and guide.programid != '':
+            ids['global-content-id'] = 'crid://%s' % str(guide.programid)
+        if guide.seriesid is not None and guide.seriesid != '':
+            ids['series-id'] = id_component('%s' % str(guide.seriesid))
+            ids['global-series-id'] = 'crid://%s' % str(guide.seriesid)
+        return ids
 
     def programme_metadata_for_channel(self,channel,start,end):
-        def programme_metadata_for_channel_actual(channel,start,end):
-            
-            start = start - self.__timecorrect()
-            if end is not None:
-                end = end - self.__timecorrect()
-            
-            tempstart = start
+        global mythtv_guide_index
+        global mythtv_epg
 
-            if end is None:
-                tempend = tempstart
-            else:
-                tempend = end
+        if mythtv_guide_index is not None and mythtv_guide_index.loaded:
+            return ( self.programme_from_guide(guide) for guide in mythtv_guide_index.between(channel,start,end) )
 
-            try:
-                guides = MythDB().searchGuide(endafter=tempstart,startbefore=tempend,chanid=channel)
-            except:
-                guides = []
-                
-            guides = [ guide for guide in guides ]
-                
-            while True:
-                n = 0
-                for guide in guides:
-                    n+=1
-                    tempstart = guide.endtime
-                    yield self.programme_from_guide(guide)
-        
-                if end is None and n != 0:
-                    tempend = tempstart + datetime.timedelta(days=1)
-                    try:
-                        guides = sorted(MythDB().searchGuide(endafter=tempstart,startbefore=tempend,chanid=channel), key=lambda guide : guide.starttime)
-                    except:
-                        guides = []
-                else:
-                    break                    
-        return programme_metadata_for_channel_actual(channel,start,end)
+        start = start - self.__timecorrect()
+        if end is not None:
+            end = end - self.__timecorrect()
 
-    def programme_from_guide(self,guide):
-        """This method takes a MythTV Guide object and returns a UCServer compatible dictionary
-        containing the programme data."""
+        return ( self.programme_from_guide(guide) for guide in mythtv_epg.search_guide(chanid=int(channel),endafter=start,startbefore=end) )
 
-        global uc_server
-              
-        src = "%04d" % guide.chanid
+    def programme_from_guide(self,guide):
+        """This method takes a MythTV Guide object and returns a Programme (see ProgrammeRecord), which UCServer
+        can use as a dictionary containing the programme data."""
 
-        try:
-            programme = { 'sid' : src,
-                          'cid' : id_component('%sZ' % (guide.starttime + self.__timecorrect()).isoformat()),
-                          'synopsis' : guide.description,
-                          'title' : guide.title,
-                          'start' : guide.starttime + self.__timecorrect(),
-                          'presentable-from'   : guide.starttime + self.__timecorrect(),
-                          'presentable-until'  : guide.endtime + self.__timecorrect(),
-                          'presentable' : guide.starttime < datetime.datetime.now() < guide.endtime,
-                          'acquirable-until'   : guide.starttime + self.__timecorrect(),
-                          'acquirable'  : guide.starttime > datetime.datetime.now(),
-                          'media-components' : {'audio' : { 'id' : 'audio',
-                                                            'type' : 'audio',
-                                                            'name' : "Primary Audio",
-                                                            'default' : True,
-                                                            },
-                                                },
-                          'interactive' : False,
-                          }
-        except:
-            uc_server.log_message(traceback.format_exc())
-            raise
-            
-        
+        src = intern_text("%04d" % guide.chanid)
+        offset = self.__timecorrect()
+        start = guide.starttime + offset
         duration = (guide.endtime - guide.starttime)
-        programme['duration'] = int((duration.days*86400 + duration.seconds)*10000 + duration.microseconds//100)
+
+        gcid = None
+        if guide.programid is not None and guide.programid != '':
+            gcid = 'crid://%s' % str(guide.programid)
+        series_id = None
+        gsid = None
+        if guide.seriesid is not None and guide.seriesid != '':
+            series_id = intern_text(id_component('%s' % str(guide.seriesid)))
+            gsid = intern_text('crid://%s' % str(guide.seriesid))
+
+        return Programme(src,
+                         id_component('%sZ' % start.isoformat()),
+                         guide.title,
+                         guide.description,
+                         start,
+                         guide.endtime + offset,
+                         int((duration.days*86400 + duration.seconds)*10000 + duration.microseconds//100),
+                         self.components_from_guide(src,guide),
+                         categories=category_ids.get(guide.category),
+                         gcid=gcid,
+                         series_id=series_id,
+                         gsid=gsid)
+
+    def components_from_guide(self,src,guide):
+        """This method returns the shared media-components dictionary for a guide entry on the given source."""
+        components = [ PRIMARY_AUDIO, ]
 
         if mythtv_sources[src]['MYTHTV:type'] == 'tv':
-            programme['media-components']['video'] = { 'id'   : 'video',
-                                                       'type' : 'video',
-                                                       'name' : "Primary Video",
-                                                       'default' : True,
-                                                       }
             videoprops = guide.videoprop.split(',') if guide.videoprop != '' else []
             if 'WIDESCREEN' in videoprops :
-                programme['media-components']['video']['aspect'] = "16:9"
+                components.append(variant(PRIMARY_VIDEO,aspect="16:9"))
+            elif 'HDTV' in videoprops :
+                components.append(variant(PRIMARY_VIDEO,aspect="4:3",vidformat='HD'))
             else:
-                programme['media-components']['video']['aspect'] = "4:3"
-                
-                if 'HDTV' in videoprops :
-                    programme['media-components']['video']['vidformat'] = 'HD'
-                else:
-                    programme['media-components']['video']['vidformat'] = 'SD'
-                
-        if guide.subtitletypes is not None and guide.subtitletypes in ('NORMAL','HARDHEAR'):
-            subtitle_names = { 'NORMAL'   : "Primary Subtitles",
-                               'HARDHEAR' : "Hard of hearing subtitles"}
-            programme['media-components']['subtitles'] = { 'id'      : 'subtitles',
-                                                           'type'    : 'subtitles',
-                                                           'name'    : subtitle_names[guide.subtitletypes],
-                                                           'default' : False,
-                                                           }
-            if guide.subtitletypes == 'HARDHEAR':
-                programme['media-components']['subtitles']['intent'] = 'hhsubs'
+                components.append(variant(PRIMARY_VIDEO,aspect="4:3",vidformat='SD'))
+
+        if guide.subtitletypes == 'NORMAL':
+            components.append(PRIMARY_SUBTITLES)
+        elif guide.subtitletypes == 'HARDHEAR':
+            components.append(HARDHEAR_SUBTITLES)
 
         audioprops = guide.audioprop.split(',') if guide.audioprop != '' else []
-        if 'STEREO' in audioprops :
-            # DO SOMETHING?
-            pass
         if 'VISUALIMPAIR' in audioprops :
-            programme['media-components']['AD'] = { 'id' : 'AD',
-                                                    'type' : 'audio',
-                                                    'name' : "Audio Description Track",
-                                                    'intent' : 'admix',
-                                                    }
+            components.append(AUDIO_DESCRIPTION)
         if 'HARDHEAR' in audioprops :
-            programme['media-components']['iiaudio'] = { 'id' : 'iiaudio',
-                                                         'type' : 'audio',
-                                                         'name' : "Improved Intelligibility Audio Mix",
-                                                         'intent' : 'iimix',
-                                                         }                                                                   
-            
-        if guide.category is not None and guide.category in category_lookup:
-            programme['categories'] = [category_lookup[guide.category][0],]
-            
-        if guide.programid is not None and guide.programid != '':
-            programme['global-content-id'] = 'crid://%s' % str(guide.programid)
-        if guide.seriesid is not None and guide.seriesid != '':
-            programme['series-id'] = id_component('%s' % str(guide.seriesid))
-            programme['global-series-id'] = 'crid://%s' % str(guide.seriesid)
+            components.append(IMPROVED_AUDIO)
 
-        return programme
+        return media_components(*components)
 
 
 keycodes = {
@@ -2103,8 +2342,15 @@ keycodes = {
     }
 
 class ButtonHandler:
+    """Presses buttons on the frontend by faking X key events. A sequence of buttons is pressed with the key
+    presses pace milliseconds apart, and may be at most limit buttons long."""
+
     xt = XTest()
 
+    def __init__(self, pace=KEY_SEQUENCE_PACE, limit=KEY_SEQUENCE_LIMIT):
+        self.pace  = pace
+        self.limit = limit
+
     def send_button_press(self,code, output=None):
 
         global keycodes
@@ -2113,6 +2359,19 @@ class ButtonHandler:
             raise ProcessingFailed
         
         self.xt.fakeKeyEvent(keycodes[code])
+        refresh('output')
+
+    def send_button_presses(self,codes, output=None):
+        """This method presses each of the buttons in codes in turn, as a single sequence of X events paced
+        self.pace milliseconds apart. None are pressed unless all of the codes are known."""
+
+        global keycodes
+
+        if len(codes) > self.limit or any([ code not in keycodes for code in codes ]):
+            raise ProcessingFailed
+
+        self.xt.fakeKeySequence([ keycodes[code] for code in codes ], self.pace)
+        refresh('output')
         
 # This dictionary is keyed by the MythTV string categories
 # and the elements are a tuple of a UC category id and a human 
@@ -2130,6 +2389,10 @@ category_lookup = { 'Movie'              : ('mov','Movie'),
                     'Drama'              : ('dra','Drama'),
                     }
 
+# The categories of the programmes from guide entries with each MythTV
+# category, shared between the programmes
+category_ids = dict([ (category, (category_lookup[category][0],)) for category in category_lookup ])
+
 # This dictionary is the data for the Categories Resource
 mythtv_categories = { '_gen' : { 'parent' : '',
                                  'name'   : 'Genres',
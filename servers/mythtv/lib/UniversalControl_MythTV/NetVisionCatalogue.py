@@ -0,0 +1,135 @@
+# MythTV Universal Control Server - NetVision Catalogue
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+NetVision Catalogue
+
+An in-memory catalogue of the MythNetVision articles, holding the programme
+for each article ready made and indexed both by feed and by content id (the
+id made from the article's url), so that listing a feed, paging through it or
+finding the article to play for a content id does not touch the database.
+
+The catalogue is loaded from the articles in the local EPG mirror, which
+keeps them in step with the backend on its own schedule. Catalogue.sync is
+given the full list of articles each time the mirror's articles change, and
+only makes new programmes for those articles which are new or have changed.
+"""
+
+import threading
+
+__all__ = [ "NetVisionCatalogue", ]
+
+
+class Entry(object):
+    """A single article and the programme made from it."""
+
+    __slots__ = ('feed', 'cid', 'values', 'article', 'programme')
+
+    def __init__(self, feed, cid, values, article, programme):
+        self.feed      = feed
+        self.cid       = cid
+        self.values    = values
+        self.article   = article
+        self.programme = programme
+
+
+class NetVisionCatalogue:
+    """The MythNetVision articles, indexed by feed and by content id.
+
+    The parameters are as follows:
+
+    programme  -- a callable which makes the programme dictionary for an article.
+    feed_id    -- a callable which returns the id of the feed of an article (the sid of its source).
+    content_id -- a callable which returns the content id for the url of an article.
+
+    The articles are expected to be EPGMirror ArticleRows (or anything else with the attributes url and feedtitle, and
+    a method values returning a tuple which changes when the article does). All methods are safe to call from multiple
+    threads.
+    """
+
+    def __init__(self, programme, feed_id, content_id):
+        self.programme  = programme
+        self.feed_id    = feed_id
+        self.content_id = content_id
+
+        self.lock    = threading.Lock()
+        self.entries = dict()    # (feed, cid) -> Entry
+        self.feeds   = dict()    # feed -> list of Entries, in the order of the articles
+        self.cids    = dict()    # cid -> the first Entry with that content id
+
+    def sync(self, articles):
+        """Makes the catalogue hold the given articles, in the order given. Returns the number of articles which were
+        added, changed or removed."""
+        with self.lock:
+            old = self.entries
+
+        entries = dict()
+        feeds   = dict()
+        cids    = dict()
+        changes = 0
+        for article in articles:
+            feed   = self.feed_id(article.feedtitle)
+            cid    = self.content_id(article.url)
+            values = article.values()
+            key    = (feed, cid)
+            if key in entries:
+                continue
+
+            entry = old.get(key)
+            if entry is None or entry.values != values:
+                entry = Entry(feed, cid, values, article, self.programme(article))
+                changes += 1
+            entries[key] = entry
+            feeds.setdefault(feed, []).append(entry)
+            cids.setdefault(cid, entry)
+
+        changes += len([ key for key in old if key not in entries ])
+
+        with self.lock:
+            self.entries = entries
+            self.feeds   = feeds
+            self.cids    = cids
+        return changes
+
+    def programmes(self, feed):
+        """Returns a list of the programmes for the articles of a feed, in order."""
+        with self.lock:
+            entries = self.feeds.get(feed, [])
+        return [ entry.programme for entry in entries ]
+
+    def article(self, cid, feed=None):
+        """Returns the article with the content id cid (in the given feed if feed is not None), or None if there is
+        no such article."""
+        with self.lock:
+            if feed is not None:
+                entry = self.entries.get((feed, cid))
+            else:
+                entry = self.cids.get(cid)
+        return entry.article if entry is not None else None
+
+    def items(self):
+        """Returns a list of (FEED, CID, PROGRAMME) tuples for all of the articles, in feed order."""
+        with self.lock:
+            feeds = self.feeds
+        return [ (feed, entry.cid, entry.programme) for feed in sorted(feeds) for entry in feeds[feed] ]
+
+    def __len__(self):
+        with self.lock:
+            return len(self.entries)
@@ -0,0 +1,143 @@
+# MythTV Universal Control Server - Playhead Tracker
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Playhead Tracker
+
+Decides how often the frontend needs to be asked where its playhead is.
+
+Between checks the playhead is assumed to move at the playback speed from
+where it was last seen (which is how clients extrapolate it from uc/outputs),
+so a check is only needed to catch the model drifting from the frontend. Each
+check compares the position seen with the one predicted, and keeps a smoothed
+estimate of how fast the two drift apart; the next check is then due when the
+drift expected by then reaches the tolerance, between a shortest and longest
+interval. While paused the model cannot drift, and while nothing is playing
+the checks are made at a fixed idle interval.
+
+A position further from the prediction than the tolerance is taken to be a
+jump (eg. a seek made with the frontend's own remote) rather than drift: it
+does not count towards the drift rate, but the next check is made after the
+shortest interval. A change of programme, speed or kind of position starts a
+new model.
+
+Checks asked for by other means (backend events, or the server having sent
+a command) are observed in the same way, and put off the next periodic check.
+"""
+
+import time
+
+__all__ = [ "PlayheadTracker", ]
+
+
+def _seconds(delta):
+    return float(86400*delta.days) + float(delta.seconds) + float(delta.microseconds)/1000000.0
+
+
+class PlayheadTracker:
+    """Models the playhead of the frontend from the last position seen.
+
+    The parameters are as follows, all in seconds:
+
+    tolerance -- the largest drift allowed between the model and the frontend before it is checked.
+    shortest  -- the shortest time between checks.
+    longest   -- the longest time between checks whilst something is playing.
+    idle      -- the time between checks whilst nothing is playing.
+    """
+
+    def __init__(self, tolerance=1.0, shortest=1.0, longest=30.0, idle=5.0):
+        self.tolerance = tolerance
+        self.shortest  = shortest
+        self.longest   = longest
+        self.idle      = idle
+
+        self.model     = None    # (key, kind, speed, position, timestamp) of the last position seen
+        self.rate      = 0.0     # the smoothed drift, in seconds per second
+        self.jumped    = False
+        self.checked   = 0.0     # the time of the last check
+        self.checks    = 0
+        self.jumps     = 0
+
+    def observe(self, key, kind, position, speed, timestamp):
+        """Records a position seen at the frontend. key identifies what is playing, kind is 'aposition' or
+        'rposition', speed is the playback speed, and timestamp the datetime (in UTC) at which the position was seen.
+        Returns the difference between the position and the one predicted, or None if this starts a new model."""
+        self.checked = time.time()
+        self.checks += 1
+        speed = float(speed or 0.0)
+
+        model = self.model
+        self.model = (key, kind, speed, position, timestamp)
+        if model is None or model[0:3] != (key, kind, speed):
+            self.rate   = 0.0
+            self.jumped = False
+            return None
+
+        elapsed = _seconds(timestamp - model[4])
+        drift   = position - self.__predict(model, timestamp)
+        if abs(drift) > self.tolerance:
+            self.jumps += 1
+            self.jumped = True
+        else:
+            self.jumped = False
+            if elapsed > 0.0:
+                self.rate = 0.5*self.rate + 0.5*abs(drift)/elapsed
+        return drift
+
+    def forget(self):
+        """Records a check which found nothing playing."""
+        self.checked = time.time()
+        self.checks += 1
+        self.model  = None
+        self.rate   = 0.0
+        self.jumped = False
+
+    def predict(self, timestamp):
+        """Returns the position predicted at the datetime timestamp, or None if nothing is playing."""
+        if self.model is None:
+            return None
+        return self.__predict(self.model, timestamp)
+
+    def interval(self):
+        """Returns the time in seconds from one check to the next."""
+        if self.model is None:
+            return self.idle
+        if self.jumped:
+            return self.shortest
+        if self.model[2] == 0.0 or self.rate == 0.0:
+            return self.longest
+        return max(self.shortest, min(self.longest, self.tolerance/self.rate))
+
+    def due(self):
+        """Returns True if the frontend should be checked now."""
+        return time.time() >= self.checked + self.interval()
+
+    def bound(self):
+        """Returns the largest drift in seconds expected between the model and the frontend before the next check."""
+        if self.model is None:
+            return None
+        if self.jumped:
+            return self.tolerance
+        return self.rate*self.interval()
+
+    def __predict(self, model, timestamp):
+        (key, kind, speed, position, then) = model
+        rate = speed if kind == 'aposition' else speed - 1.0
+        return position + rate*_seconds(timestamp - then)
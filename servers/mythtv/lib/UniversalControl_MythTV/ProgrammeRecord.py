@@ -0,0 +1,211 @@
+# MythTV Universal Control Server - Programme Record
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Programme Record
+
+A compact, read-only record for the programmes built from guide entries,
+which behaves as the dictionary of programme data expected by UCServer
+(encodeContent and the filtering in Programmes) without holding one.
+
+The media components of a programme are taken from a small set of shared
+templates: each component (eg. PRIMARY_AUDIO) is a single FrozenDict, and
+media_components returns the same FrozenDict of components each time it is
+given the same components, so that a guide of many thousands of programmes
+holds only a handful of component dictionaries. Strings repeated between
+programmes (source and series ids) are interned by intern_text. Since the
+templates are shared they cannot be changed, and nor can a Programme; a
+caller which wants to change one should take a copy first.
+"""
+
+import datetime
+
+__all__ = [ "Programme",
+            "FrozenDict",
+            "component",
+            "variant",
+            "media_components",
+            "intern_text",
+            "PRIMARY_AUDIO",
+            "PRIMARY_VIDEO",
+            "AUDIO_DESCRIPTION",
+            "IMPROVED_AUDIO",
+            "PRIMARY_SUBTITLES",
+            "HARDHEAR_SUBTITLES", ]
+
+
+class FrozenDict(dict):
+    """A dictionary which cannot be changed once made."""
+
+    def __readonly(self, *args, **kwargs):
+        raise TypeError, "FrozenDict cannot be changed"
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __readonly
+
+    def copy(self):
+        return dict(self)
+
+
+def component(**attributes):
+    """Returns a FrozenDict holding a media component with the given attributes."""
+    return FrozenDict(attributes)
+
+
+PRIMARY_AUDIO     = component(id='audio', type='audio', name="Primary Audio", default=True)
+PRIMARY_VIDEO     = component(id='video', type='video', name="Primary Video", default=True)
+AUDIO_DESCRIPTION = component(id='AD', type='audio', name="Audio Description Track", intent='admix')
+IMPROVED_AUDIO    = component(id='iiaudio', type='audio', name="Improved Intelligibility Audio Mix", intent='iimix')
+PRIMARY_SUBTITLES = component(id='subtitles', type='subtitles', name="Primary Subtitles", default=False)
+HARDHEAR_SUBTITLES = component(id='subtitles', type='subtitles', name="Hard of hearing subtitles", default=False, intent='hhsubs')
+
+_components = dict()    # (id of the template, extra attributes) -> component derived from the template
+_templates  = dict()    # tuple of the ids of the components -> media-components FrozenDict
+_texts      = dict()
+
+
+def variant(template, **attributes):
+    """Returns the shared component made by adding the given attributes to template."""
+    key = (id(template), tuple(sorted(attributes.items())))
+    try:
+        return _components[key]
+    except KeyError:
+        values = dict(template)
+        values.update(attributes)
+        return _components.setdefault(key, FrozenDict(values))
+
+
+def media_components(*components):
+    """Returns the shared media-components FrozenDict holding the given components, keyed by their ids. The
+    components must be shared components (the constants in this module, or those returned by variant)."""
+    key = tuple([ id(c) for c in components ])
+    try:
+        return _templates[key]
+    except KeyError:
+        templates = FrozenDict([ (c['id'], c) for c in components ])
+        return _templates.setdefault(key, templates)
+
+
+def intern_text(text):
+    """Returns a string equal to text which is shared with any other string interned by this function, so that
+    repeated strings (such as the series id shared by the episodes of a series) are held once. None is returned as it is."""
+    if text is None:
+        return None
+    return _texts.setdefault(text, text)
+
+
+class Programme(object):
+    """A programme, presented as a read-only mapping with the keys of the programme dictionaries of UCServer.
+
+    start and end are datetimes in UTC. components is a FrozenDict from media_components, and categories a tuple of
+    category ids. Any of the optional attributes (title, synopsis, categories, gcid, series_id and gsid) may be None,
+    in which case the corresponding key is absent. 'presentable' and 'acquirable' are worked out from the current
+    time when they are looked up.
+    """
+
+    __slots__ = ('sid', 'cid', 'title', 'synopsis', 'start', 'end', 'duration', 'components', 'categories',
+                 'gcid', 'series_id', 'gsid')
+
+    # The keys which are attributes, and the names of those attributes
+    FIELDS = { 'sid'               : 'sid',
+               'cid'               : 'cid',
+               'title'             : 'title',
+               'synopsis'          : 'synopsis',
+               'start'             : 'start',
+               'presentable-from'  : 'start',
+               'acquirable-until'  : 'start',
+               'presentable-until' : 'end',
+               'duration'          : 'duration',
+               'media-components'  : 'components',
+               'categories'        : 'categories',
+               'global-content-id' : 'gcid',
+               'series-id'         : 'series_id',
+               'global-series-id'  : 'gsid', }
+
+    # The keys which are worked out when looked up
+    COMPUTED = { 'interactive' : lambda programme : False,
+                 'presentable' : lambda programme : programme.start < datetime.datetime.utcnow() < programme.end,
+                 'acquirable'  : lambda programme : programme.start > datetime.datetime.utcnow(), }
+
+    def __init__(self, sid, cid, title, synopsis, start, end, duration, components, categories=None, gcid=None,
+                 series_id=None, gsid=None):
+        self.sid        = sid
+        self.cid        = cid
+        self.title      = title
+        self.synopsis   = synopsis
+        self.start      = start
+        self.end        = end
+        self.duration   = duration
+        self.components = components
+        self.categories = categories
+        self.gcid       = gcid
+        self.series_id  = series_id
+        self.gsid       = gsid
+
+    def __getitem__(self, key):
+        name = self.FIELDS.get(key)
+        if name is not None:
+            value = getattr(self, name)
+            if value is not None:
+                return value
+        elif key in self.COMPUTED:
+            return self.COMPUTED[key](self)
+        raise KeyError, key
+
+    def __contains__(self, key):
+        name = self.FIELDS.get(key)
+        if name is not None:
+            return getattr(self, name) is not None
+        return key in self.COMPUTED
+
+    has_key = __contains__
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [ key for key in self.FIELDS if getattr(self, self.FIELDS[key]) is not None ] + self.COMPUTED.keys()
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def items(self):
+        return [ (key, self[key]) for key in self.keys() ]
+
+    def copy(self):
+        """Returns the programme as an ordinary dictionary, which may be changed (the media components in it are
+        copied too)."""
+        values = dict(self.items())
+        values['media-components'] = dict([ (cid, dict(c)) for (cid, c) in self.components.items() ])
+        return values
+
+    def __eq__(self, other):
+        return isinstance(other, Programme) and all([ getattr(self, name) == getattr(other, name) for name in self.__slots__ ])
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return "Programme(%r, %r, %r)" % (self.sid, self.cid, self.title)
@@ -0,0 +1,139 @@
+# MythTV Universal Control Server - Query Compiler
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Query Compiler
+
+Translates the parameters of a search request (as returned by
+UCSearchResourceHandler.parse_query) into a single parameterised query on the
+program table of the local EPG mirror, so that a search over guide data alone
+can be filtered, ordered and paged by SQLite rather than by
+Programmes.filterprogrammes.
+
+The compiled query selects exactly those rows which filterprogrammes would let
+through once they had been turned into programmes, in order of start time,
+and fetches one row more than was asked for so that the caller can tell
+whether there are more results. Searches which use a filter that cannot be
+expressed in terms of the columns of the mirror ('cid' and 'series-id', whose
+values are derived from the guide data by id_component) do not compile, and
+must be answered by filtering in Python instead.
+"""
+
+import datetime
+
+from EPGMirror import format_time
+
+__all__ = [ "QueryCompiler",
+            "GuideQuery", ]
+
+
+class GuideQuery:
+    """A compiled query on the program table of the EPG mirror."""
+
+    def __init__(self, where, args, results, offset):
+        self.where   = where
+        self.args    = args
+        self.results = results
+        self.offset  = offset
+
+    def execute(self, mirror):
+        """Runs the query against the given EPGMirror, returning a tuple of a list of at most results GuideRows and a
+        boolean indicating whether there are any more."""
+        rows = mirror.query_guide(self.where, self.args, order='starttime, chanid', limit=self.results + 1, offset=self.offset)
+        return (rows[:self.results], len(rows) > self.results)
+
+    def after(self, row):
+        """Returns a query for the rows which follow the given one (in order of start time and channel id), with no
+        offset. This allows a caller to page through the results by their position rather than by an offset."""
+        return GuideQuery("(%s) AND (starttime > ? OR (starttime = ? AND chanid > ?))" % self.where,
+                          list(self.args) + [ format_time(row.starttime), format_time(row.starttime), row.chanid ],
+                          self.results,
+                          0)
+
+
+class QueryCompiler:
+    """Compiles search parameters into GuideQuery objects.
+
+    categories is a dictionary mapping MythTV category names onto tuples whose first member is the category-id used
+    for them in the API (in the form of category_lookup in MythTVUC).
+    """
+
+    def __init__(self, categories=None):
+        self.categories = categories if categories is not None else dict()
+
+    def compile(self, params, chanids=None, timecorrect=datetime.timedelta(0)):
+        """Returns a GuideQuery for the given search parameters, restricted to the given channel ids (if not None), or
+        None if the parameters cannot be compiled. timecorrect is the amount by which UTC is ahead of MythTV local time,
+        as added to guide times by Programmes.programme_from_guide."""
+
+        if 'cid' in params or 'series-id' in params:
+            return None
+
+        clauses = []
+        args    = []
+
+        # Guide programmes are never interactive
+        if 'AV' in params and not params['AV']:
+            clauses.append("0")
+
+        if chanids is not None:
+            clauses.append(self.__in("chanid", chanids))
+            args.extend(chanids)
+
+        # Programmes with no global id of the requested kind are not excluded by filterprogrammes
+        for (key, column) in (('gcid', 'programid'), ('gsid', 'seriesid')):
+            if key in params:
+                ids = [ crid[7:] for crid in params[key] if crid.startswith('crid://') ]
+                if ids:
+                    clauses.append("(%s IS NULL OR %s = '' OR %s)" % (column, column, self.__in(column, ids)))
+                    args.extend(ids)
+                else:
+                    clauses.append("(%s IS NULL OR %s = '')" % (column, column))
+
+        if 'category' in params:
+            names = [ name for name in self.categories if self.categories[name][0] in params['category'] ]
+            if names:
+                clauses.append(self.__in("category", names))
+                args.extend(names)
+            else:
+                clauses.append("0")
+
+        if 'start' in params and params['start'] is not None:
+            clauses.append("endtime >= ?")
+            args.append(format_time(params['start'] - timecorrect))
+
+        if 'end' in params and params['end'] is not None:
+            clauses.append("starttime < ?")
+            args.append(format_time(params['end'] - timecorrect))
+
+        if 'text' in params:
+            fields = params['field'] if 'field' in params else ('title', 'synopsis')
+            columns = [ column for (field, column) in (('title', 'title'), ('synopsis', 'description')) if field in fields ]
+            for item in params['text']:
+                clauses.append("(%s)" % ' OR '.join([ "uccontains(COALESCE(%s, ''), ?)" % column for column in columns ]))
+                args.extend([ item.upper() ]*len(columns))
+
+        return GuideQuery(' AND '.join(clauses) if clauses else '1',
+                          args,
+                          params['results'] if 'results' in params else 1,
+                          params['offset'] if 'offset' in params else 0)
+
+    def __in(self, column, values):
+        return "%s IN (%s)" % (column, ', '.join([ '?' ]*len(values)))
@@ -0,0 +1,70 @@
+# MythTV Universal Control Server - Refresher
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Refresher
+
+The Scheduler which keeps the server's copies of MythTV state (the output, the
+acquisitions, the storage and so on) up to date, running the job which
+refreshes each of them when it is asked to as well as at its own rate.
+
+As well as being asked for directly by name (eg. after the server has sent a
+command to the frontend), refreshes are asked for by passing the messages
+from the backend event stream to Refresher.event, which asks for the jobs
+named by the first of EVENT_ROUTES whose pattern matches.
+"""
+
+import re
+
+from Scheduler import Scheduler
+
+__all__ = [ "Refresher",
+            "EVENT_ROUTES", ]
+
+
+# Patterns matched against the backend event messages, and the names of the
+# refreshes which each calls for
+EVENT_ROUTES = [ (r'RECORDING_LIST_CHANGE',                                     ('acquisitions', 'storage')),
+                 (r'SCHEDULE_CHANGE',                                           ('acquisitions',)),
+                 (r'SYSTEM_EVENT (REC_STARTED|REC_FINISHED|REC_DELETED|REC_EXPIRED)', ('acquisitions', 'storage')),
+                 (r'VIDEO_LIST_CHANGE',                                         ('storage',)),
+                 (r'SYSTEM_EVENT (PLAY_|LIVETV_|CLIENT_)',                      ('output',)),
+                 ]
+
+
+class Refresher(Scheduler):
+    """A Scheduler whose jobs can also be asked for by backend events.
+
+    routes is a list of (PATTERN, NAMES) tuples used by event, in the form of EVENT_ROUTES. The other parameters are
+    as for Scheduler.
+    """
+
+    def __init__(self, workers=3, settle=0.25, routes=EVENT_ROUTES, log=None):
+        Scheduler.__init__(self, workers=workers, settle=settle, log=log)
+        self.routes = [ (re.compile(pattern), names) for (pattern, names) in routes ]
+
+    def event(self, message):
+        """Asks for the refreshes called for by a message from the backend event stream. Returns True if the message
+        matched a route."""
+        for (pattern, names) in self.routes:
+            if pattern.search(message):
+                self.request(*names)
+                return True
+        return False
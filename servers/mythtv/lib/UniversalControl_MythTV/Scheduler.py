@@ -0,0 +1,215 @@
+# MythTV Universal Control Server - Scheduler
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Scheduler
+
+Runs a set of named jobs, each at its own rate, on a small pool of worker
+threads, so that a slow job (such as fetching the recordings from the
+backend) holds up only the worker it is running on.
+
+Each job has a period, after which it is run again, and may also be asked to
+run sooner by name. A job never runs twice at once, and a job which raises an
+exception is retried after a delay which doubles with each consecutive
+failure. A job which runs for longer than its timeout is reported and its
+worker is replaced, so that the pool keeps its size while the job finishes
+(Python threads cannot be stopped from outside).
+
+The scheduler keeps statistics of the number of runs, failures and timeouts
+of each job and of how long its runs took, which are available from
+Scheduler.statistics.
+"""
+
+import threading
+import traceback
+import Queue
+import random
+import time
+
+__all__ = [ "Scheduler", ]
+
+
+class Job(object):
+    """A single scheduled job, together with its state and statistics."""
+
+    __slots__ = ('name', 'call', 'period', 'jitter', 'timeout', 'backoff', 'follows',
+                 'due', 'requested', 'running', 'started', 'overrun', 'failures',
+                 'runs', 'errors', 'timeouts', 'total', 'longest', 'last')
+
+    def __init__(self, name, call, period, jitter, timeout, backoff, follows):
+        self.name      = name
+        self.call      = call
+        self.period    = period
+        self.jitter    = jitter
+        self.timeout   = timeout
+        self.backoff   = backoff
+        self.follows   = follows
+
+        self.due       = 0.0     # the time at which the job is next to run
+        self.requested = False   # whether the job has been asked to run since it last started
+        self.running   = False
+        self.started   = None
+        self.overrun   = False   # whether the current run has been reported as having timed out
+        self.failures  = 0       # consecutive failures
+
+        self.runs      = 0
+        self.errors    = 0
+        self.timeouts  = 0
+        self.total     = 0.0
+        self.longest   = 0.0
+        self.last      = None
+
+
+class Scheduler(threading.Thread):
+    """A daemon thread which dispatches jobs to a pool of worker threads.
+
+    The parameters are as follows:
+
+    workers -- the number of worker threads.
+    settle  -- the time in seconds to wait after a job is asked to run for other requests to arrive before running it.
+    log     -- if not None a callable which is passed a message when a job fails or times out.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    daemon = True
+
+    def __init__(self, workers=3, settle=0.25, log=None):
+        threading.Thread.__init__(self)
+        self.workers   = workers
+        self.settle    = settle
+        self.log       = log
+        self.condition = threading.Condition()
+        self.jobs      = []
+        self.queue     = Queue.Queue()
+        self.threads   = 0       # the number of worker threads running, including any held up by a timed out job
+
+    def add(self, name, call, period, jitter=0.0, timeout=None, backoff=None, follows=()):
+        """Adds a job, which will be run at least every period seconds plus a random delay of up to jitter seconds.
+        If timeout is not None then a run which takes longer than timeout seconds is reported. If backoff is not None
+        then after a failure the job is retried after period seconds, doubling with each consecutive failure up to
+        backoff seconds. The job is also asked to run each time any of the jobs named in follows finishes. Should be
+        called before the thread is started."""
+        with self.condition:
+            self.jobs.append(Job(name, call, period, jitter, timeout, backoff, tuple(follows)))
+
+    def request(self, *names):
+        """Asks for the named jobs to be run soon."""
+        with self.condition:
+            for job in self.jobs:
+                if job.name in names and not job.requested:
+                    job.requested = True
+                    job.due = min(job.due, time.time() + self.settle) if job.failures == 0 else job.due
+            self.condition.notify()
+
+    def statistics(self):
+        """Returns a dictionary mapping the name of each job onto a dictionary of its statistics, with the keys 'runs',
+        'errors', 'timeouts', 'mean', 'longest' and 'last' (the times being in seconds, and 'mean' and 'last' being
+        None if the job has not yet finished a run)."""
+        with self.condition:
+            return dict([ (job.name, { 'runs'     : job.runs,
+                                       'errors'   : job.errors,
+                                       'timeouts' : job.timeouts,
+                                       'mean'     : (job.total/job.runs if job.runs > 0 else None),
+                                       'longest'  : job.longest,
+                                       'last'     : job.last, })
+                          for job in self.jobs ])
+
+    def run(self):
+        for i in range(0, self.workers):
+            self.__spawn()
+
+        with self.condition:
+            while True:
+                now = time.time()
+
+                for job in self.jobs:
+                    if not job.running and job.due <= now:
+                        job.running   = True
+                        job.requested = False
+                        job.overrun   = False
+                        job.started   = now
+                        self.queue.put(job)
+                    elif (job.running and not job.overrun and job.timeout is not None
+                          and now - job.started > job.timeout):
+                        job.overrun = True
+                        job.timeouts += 1
+                        if self.log is not None:
+                            self.log("Job %s has taken more than %.1f seconds" % (job.name, job.timeout))
+                        self.__spawn()
+
+                waits = [ job.due - now for job in self.jobs if not job.running ]
+                waits.extend([ job.started + job.timeout - now for job in self.jobs
+                               if job.running and not job.overrun and job.timeout is not None ])
+                self.condition.wait(max(0.01, min(waits or [ 60 ])))
+
+    def __spawn(self):
+        """Starts another worker thread."""
+        self.threads += 1
+        thread = threading.Thread(target=self.__work)
+        thread.daemon = True
+        thread.start()
+
+    def __work(self):
+        while True:
+            job = self.queue.get()
+
+            start = time.time()
+            try:
+                job.call()
+            except:
+                failed = True
+                if self.log is not None:
+                    self.log(traceback.format_exc())
+            else:
+                failed = False
+            end = time.time()
+
+            with self.condition:
+                job.running  = False
+                job.runs    += 1
+                job.total   += end - start
+                job.longest  = max(job.longest, end - start)
+                job.last     = end - start
+
+                if failed:
+                    job.errors   += 1
+                    job.failures += 1
+                    delay = job.period
+                    if job.backoff is not None:
+                        delay = min(job.backoff, job.period*(2**(job.failures - 1)))
+                    job.due = end + delay
+                else:
+                    job.failures = 0
+                    job.due = end + job.period + random.uniform(0, job.jitter)
+                    if job.requested:
+                        job.due = end
+
+                    for other in self.jobs:
+                        if job.name in other.follows and not other.requested:
+                            other.requested = True
+                            other.due = min(other.due, end) if other.failures == 0 else other.due
+
+                self.condition.notify()
+
+                # A worker held up by a job which timed out was replaced, so one of the workers can now stop
+                if self.threads > self.workers:
+                    self.threads -= 1
+                    return
@@ -0,0 +1,274 @@
+# MythTV Universal Control Server - Simulator Bindings
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Simulator Bindings
+
+Stand-ins for the parts of the MythTV python bindings which the server uses,
+reading from and writing to the World passed to Simulator.install. When
+installed this module takes the place of the MythTV module, so the names
+here are those of the bindings.
+
+Only the methods, arguments and attributes which the server uses are
+provided. The database cursor only answers the queries listed in QUERIES.
+"""
+
+import datetime
+import time
+import re
+
+__all__ = [ "MythError",
+            "MythLog",
+            "MythDB",
+            "MythBE",
+            "MythXML",
+            "Frontend",
+            "DBData",
+            "Channel",
+            "Video",
+            "Record",
+            "Recorded",
+            "BEEvent",
+            "QUERIES", ]
+
+
+world = None    # set by Simulator.install
+
+
+class MythError(Exception):
+    pass
+
+
+class MythLog:
+    @classmethod
+    def _setlevel(cls, level):
+        pass
+
+
+class DBData(object):
+    """A row of a database table. getAllEntries returns the rows of the World table with the same name as the class,
+    so the server's own subclasses (eg. ChannelScan) read the tables of those names."""
+
+    _where = ''
+    _setwheredat = ''
+
+    def __init__(self, data=None, db=None):
+        if data is not None:
+            raise MythError, "No such %s entry: %r" % (self.__class__.__name__, data)
+
+    @classmethod
+    def _from_row(cls, row):
+        entry = cls.__new__(cls)
+        entry.__dict__.update(row.__dict__)
+        return entry
+
+    @classmethod
+    def getAllEntries(cls, db=None):
+        world.call('db')
+        for row in world.rows(cls.__name__):
+            yield cls._from_row(row)
+
+
+class Channel(DBData):
+    pass
+
+
+class Video(DBData):
+    pass
+
+
+class Record(DBData):
+    kNotRecording   = 0
+    kSingleRecord   = 1
+    kTimeslotRecord = 2
+    kChannelRecord  = 3
+    kAllRecord      = 4
+    kWeekslotRecord = 5
+    kFindOneRecord  = 6
+    kOverrideRecord = 7
+    kDontRecord     = 8
+
+    def __init__(self, data=None, db=None):
+        DBData.__init__(self, data, db)
+        self.recordid    = None
+        self.title       = ''
+        self.description = ''
+        self.search      = 0L
+        self.type        = self.kNotRecording
+        self.chanid      = None
+        self.starttime   = None
+
+    def create(self, data=None):
+        world.call('db')
+        rule = world.add_rule(self.description, self.type, title=self.title)
+        self.recordid = rule.recordid
+        world.schedule()
+        return self
+
+    def delete(self):
+        world.call('db')
+        world.remove_rule(self.recordid)
+        world.schedule()
+
+    @classmethod
+    def fromGuide(cls, guide, type=kAllRecord):
+        world.call('db')
+        rule = world.add_rule('', type, guide=guide)
+        world.schedule()
+        return cls._from_row(rule)
+
+
+class Recorded(DBData):
+    """A recording, looked up by a tuple of its chanid and start time. The server passes start times in UTC, so the
+    local time is also tried."""
+
+    def __init__(self, data=None, db=None):
+        world.call('db')
+        (chanid, starttime) = data
+        offset = datetime.timedelta(seconds=(time.timezone if time.localtime().tm_isdst==0 else time.altzone))
+        for rec in world.rows('Recorded'):
+            if rec.chanid == int(chanid) and rec.recstartts in (starttime, starttime - offset):
+                self.__dict__.update(rec.__dict__)
+                return
+        raise MythError, "No such recording: %r" % (data,)
+
+    def delete(self):
+        world.call('backend')
+        return world.delete_recording(self.chanid, self.recstartts)
+
+
+# The queries answered by Cursor.execute, as (PATTERN, CALL) tuples where CALL is passed the world and returns the
+# rows of the result
+QUERIES = [ (re.compile(r'SELECT 1$'), lambda world : [ (1,) ]),
+            (re.compile(r'SELECT \(SELECT COUNT\(\*\) FROM recorded\)'), lambda world : [ world.summary() ]),
+            ]
+
+
+class Cursor:
+    def __init__(self):
+        self.rows = []
+
+    def execute(self, query, args=()):
+        world.call('db')
+        for (pattern, call) in QUERIES:
+            if pattern.match(query.strip()):
+                self.rows = list(call(world))
+                return len(self.rows)
+        raise MythError, "Query not supported by the simulator: %s" % query
+
+    def fetchone(self):
+        if not self.rows:
+            return None
+        return self.rows.pop(0)
+
+    def fetchall(self):
+        (rows, self.rows) = (self.rows, [])
+        return rows
+
+    def close(self):
+        pass
+
+
+class MythDB:
+    def __init__(self, *args, **kwargs):
+        world.call('db')
+
+    def cursor(self):
+        return Cursor()
+
+    def searchGuide(self, **kwargs):
+        world.call('db')
+        for guide in world.search_guide(**kwargs):
+            yield guide
+
+    def getStorageGroup(self, groupname=None, hostname=None):
+        world.call('db')
+        for group in world.storage_groups:
+            if groupname is None or group.groupname == groupname:
+                yield group
+
+    def getFrontends(self):
+        world.call('db')
+        if world.frontend.running:
+            yield Frontend('localhost', 6546)
+
+
+class MythBE:
+    def __init__(self, *args, **kwargs):
+        world.call('backend')
+
+    def getRecordings(self):
+        world.call('backend')
+        return iter(world.rows('Recorded'))
+
+    def getUpcomingRecordings(self):
+        world.call('backend')
+        return iter(world.upcoming_recordings())
+
+    def getFreeSpaceSummary(self):
+        world.call('backend')
+        return world.free_space()
+
+
+class MythXML:
+    def __init__(self, *args, **kwargs):
+        pass
+
+
+class Frontend:
+    def __init__(self, host, port=6546):
+        world.frontend.check()
+        world.call('frontend')
+        self.host = host
+        self.port = port
+
+    def sendQuery(self, query):
+        world.call('frontend')
+        return world.frontend.query(query)
+
+    def sendPlay(self, play):
+        world.call('frontend')
+        world.frontend.play(play)
+
+    def sendJump(self, jump):
+        world.call('frontend')
+        world.frontend.jump(jump)
+
+    def getJump(self):
+        world.call('frontend')
+        return world.frontend.jump_points()
+
+
+class BEEvent:
+    """Passes the World's backend events to the handlers given by _listhandlers. Each handler is called with no
+    arguments to get the pattern of the events it wants."""
+
+    def __init__(self, backend=None, noshutdown=False, systemevents=False, db=None):
+        world.call('backend')
+        self.handlers = [ (handler, handler()) for handler in self._listhandlers() ]
+        world.add_listener(self.dispatch)
+
+    def _listhandlers(self):
+        return []
+
+    def dispatch(self, message):
+        for (handler, pattern) in self.handlers:
+            if pattern.match(message):
+                handler(message)
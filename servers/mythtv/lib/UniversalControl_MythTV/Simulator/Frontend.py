@@ -0,0 +1,311 @@
+# MythTV Universal Control Server - Simulator Frontend
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Simulator Frontend
+
+A state machine standing in for a MythTV frontend, which answers the
+network control commands the server sends it ('query', 'play' and 'jump')
+and the key presses sent through XTest in the way a real frontend does, from
+the recordings, videos and guide of its World.
+
+The frontend is either at a menu location (a jump point), playing something
+('LiveTV', 'Recorded' or 'Video'), or running a game, and when playing keeps
+the position, speed, volume and subtitle state. Positions move on with the
+wall clock at the current speed. The frontend can also be stopped and
+started, as when the server goes into and out of standby, and whilst stopped
+every command fails.
+
+The state can be driven directly by calling command with the same strings
+the server sends (eg. 'jump livetv', 'play speed pause', 'key Escape'), or
+through World.script.
+"""
+
+import threading
+import datetime
+import time
+import re
+
+__all__ = [ "FrontendState",
+            "JUMP_POINTS", ]
+
+
+JUMP_POINTS = [ ('mainmenu',      'Main Menu'),
+                ('livetv',        'Live TV'),
+                ('playbackbox',   'Watch Recordings'),
+                ('videobrowser',  'Video Browser'),
+                ('guidegrid',     'Program Guide'),
+                ('programfinder', 'Program Finder'),
+                ('managerecordings', 'Manage Recordings'),
+                ('MythGame',      'MythGame'),
+                ('netvision',     'MythNetVision'),
+                ]
+
+FRAME_RATE = 25
+
+SPEEDS = re.compile(r'(?:(pause)|(-?\d+(?:\.\d+)?)x|(-?\d+)/(\d+)x)$')
+
+
+class FrontendState:
+    """The state of a simulated frontend belonging to world.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, world):
+        self.world     = world
+        self.lock      = threading.RLock()
+        self.running   = True
+        self.location  = 'mainmenu'
+        self.mode      = None       # 'LiveTV', 'Recorded' or 'Video' when playing
+        self.item      = None       # the recording or video being played, or the guide entry showing on live TV
+        self.chanid    = None
+        self.position  = 0.0        # the position at self.since
+        self.since     = time.time()
+        self.speed     = 1.0
+        self.live_start = None      # the time at which the live TV buffer started
+        self.volume    = 50
+        self.subtitles = False
+        self.game      = None
+        self.keys      = []         # the keys pressed, most recent last
+
+    # Control
+
+    def start(self):
+        with self.lock:
+            if not self.running:
+                self.running  = True
+                self.location = 'mainmenu'
+                self.mode     = None
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+
+    def check(self):
+        """Raises IOError, as the bindings would when the control socket cannot be reached, if the frontend is not
+        running."""
+        if not self.running:
+            raise IOError, "Could not connect to the frontend"
+
+    def command(self, line):
+        """Carries out a command of the form 'query ...', 'play ...', 'jump ...', 'key ...', 'start' or 'stop',
+        returning the reply to a query."""
+        (verb, rest) = (line.split(' ', 1) + [ '' ])[:2]
+        if verb == 'query':
+            return self.query(rest)
+        elif verb == 'play':
+            return self.play(rest)
+        elif verb == 'jump':
+            return self.jump(rest)
+        elif verb == 'key':
+            return self.key(rest)
+        elif verb == 'start':
+            return self.start()
+        elif verb == 'stop':
+            return self.stop()
+        raise ValueError, "Unknown frontend command %r" % line
+
+    # Network control
+
+    def query(self, what):
+        self.check()
+        with self.lock:
+            if what == 'location':
+                return self.describe_location()
+            elif what == 'volume':
+                return '%d%%' % self.volume
+            elif what == 'time':
+                return datetime.datetime.now().strftime('%Y-%m-%dT%H:%M:%S')
+            elif what == 'livetv':
+                return '\r\n'.join([ '%d %s %s %s' % (guide.chanid, guide.starttime.isoformat(), guide.endtime.isoformat(), guide.title)
+                                     for guide in self.world.on_now() ])
+            return 'ERROR: See "help query" for usage information'
+
+    def play(self, what):
+        self.check()
+        with self.lock:
+            (verb, rest) = (what.split(' ', 1) + [ '' ])[:2]
+            if verb == 'speed':
+                match = SPEEDS.match(rest)
+                if match is None or self.mode is None:
+                    return
+                self.advance()
+                if match.group(1):
+                    self.speed = 0.0
+                elif match.group(2):
+                    self.speed = float(match.group(2))
+                elif float(match.group(4)) != 0:
+                    self.speed = float(match.group(3))/float(match.group(4))
+            elif verb == 'seek' and self.mode is not None:
+                parts = [ int(part) for part in rest.split(':') ]
+                seconds = parts[0]*3600 + parts[1]*60 + parts[2]
+                self.advance()
+                self.position = float(min(max(seconds, 0), self.length()))
+            elif verb == 'volume':
+                match = re.match(r'(\d+)%', rest)
+                if match:
+                    self.volume = min(int(match.group(1)), 100)
+            elif verb == 'subtitles':
+                self.subtitles = (rest != '' and rest != '0')
+            elif verb == 'program':
+                (chanid, start) = rest.split(' ', 1)
+                recs = [ rec for rec in self.world.rows('Recorded')
+                         if rec.chanid == int(chanid) and rec.recstartts.isoformat() == start ]
+                if recs:
+                    self.begin('Recorded', recs[0])
+            elif verb == 'file':
+                name = rest.split('/')[-1]
+                vids = [ vid for vid in self.world.rows('Video') if vid.filename == name ]
+                if vids:
+                    self.begin('Video', vids[0])
+            elif verb == 'chanid':
+                self.tune(int(rest))
+            elif verb == 'url':
+                self.stop_playback('mythbrowser')
+            elif verb == 'game':
+                self.stop_playback('game')
+                self.game = rest
+            elif verb == 'stop':
+                self.stop_playback('playbackbox')
+
+    def jump(self, where):
+        self.check()
+        with self.lock:
+            if where not in dict(JUMP_POINTS) and where not in ('GameUI', 'mythbrowser'):
+                return
+            if where == 'livetv':
+                channels = self.world.rows('Channel')
+                if channels:
+                    self.tune(channels[0].chanid, restart=True)
+                return
+            self.stop_playback(where)
+
+    def jump_points(self):
+        self.check()
+        return list(JUMP_POINTS)
+
+    def key(self, keysym):
+        """Acts on a key press, for the keys whose effect the server relies on."""
+        with self.lock:
+            self.keys.append(keysym)
+            if not self.running:
+                return
+            if keysym == 'Escape':
+                if self.mode is not None:
+                    self.stop_playback('playbackbox' if self.mode != 'LiveTV' else 'mainmenu')
+                elif self.location != 'mainmenu':
+                    self.stop_playback('mainmenu')
+            elif keysym == 'p' and self.mode is not None:
+                self.advance()
+                self.speed = 1.0 if self.speed == 0.0 else 0.0
+            elif keysym in ('bracketright', 'bracketleft'):
+                self.volume = min(100, max(0, self.volume + (2 if keysym == 'bracketright' else -2)))
+            elif keysym in ('Page_Up', 'Page_Down', 'Up', 'Down') and self.mode == 'LiveTV':
+                chanids = [ channel.chanid for channel in self.world.rows('Channel') ]
+                step = 1 if keysym in ('Page_Up', 'Up') else -1
+                self.tune(chanids[(chanids.index(self.chanid) + step) % len(chanids)])
+            elif keysym == 'Right' and self.mode is not None:
+                self.advance()
+                self.position = min(self.position + 30.0, self.length())
+            elif keysym == 'Left' and self.mode is not None:
+                self.advance()
+                self.position = max(self.position - 10.0, 0.0)
+
+    # State
+
+    def begin(self, mode, item):
+        self.mode      = mode
+        self.item      = item
+        self.location  = 'playback'
+        self.position  = 0.0
+        self.since     = time.time()
+        self.speed     = 1.0
+        self.game      = None
+
+    def tune(self, chanid, restart=False):
+        if self.mode != 'LiveTV' or restart:
+            self.live_start = time.time()
+        self.chanid = chanid
+        self.begin('LiveTV', None)
+        self.position = time.time() - self.live_start
+
+    def stop_playback(self, location):
+        self.mode     = None
+        self.item     = None
+        self.location = location
+        self.game     = None
+
+    def advance(self):
+        """Moves the position on to the current time."""
+        now = time.time()
+        self.position = min(max(0.0, self.position + self.speed*(now - self.since)), self.length(now))
+        self.since = now
+
+    def length(self, now=None):
+        if self.mode == 'LiveTV':
+            return (now or time.time()) - self.live_start
+        elif self.mode == 'Recorded':
+            duration = self.item.recendts - self.item.recstartts
+            return float(duration.days*86400 + duration.seconds)
+        elif self.mode == 'Video':
+            return float(self.item.length*60)
+        return 0.0
+
+    def describe_location(self):
+        if self.mode is None:
+            if self.location == 'game':
+                return 'game %s' % self.game
+            return self.location
+
+        self.advance()
+        now = datetime.datetime.utcnow()
+        stamp = '%s.%03dZ' % (now.strftime('%H:%M:%S'), now.microsecond//1000)
+        if self.subtitles:
+            subtitles = '0:[None] *1:[Subtitle 1: English]*'
+        else:
+            subtitles = '*0:[None]* 1:[Subtitle 1: English]'
+        speed = 'pause' if self.speed == 0.0 else ('%gx' % self.speed)
+        position = _clock(self.position)
+        length   = _clock(self.length())
+        frame    = int(self.position*FRAME_RATE)
+
+        if self.mode == 'Video':
+            return 'Playback Video %s of %s %s %s %d %d (%s) Subtitles: %s' % (position, length, speed, self.item.filename,
+                                                                                frame, FRAME_RATE, stamp, subtitles)
+        if self.mode == 'LiveTV':
+            showing = [ guide for guide in self.world.on_now() if guide.chanid == self.chanid ]
+            start = showing[0].starttime if showing else datetime.datetime.now().replace(second=0, microsecond=0)
+            filename = '/var/lib/mythtv/livetv/%d_%s.mpg' % (self.chanid, start.strftime('%Y%m%d%H%M%S'))
+        else:
+            start = self.item.recstartts
+            filename = '/var/lib/mythtv/recordings/%s' % self.item.basename
+        return 'Playback %s %s of %s %s %d %s %d %s %d (@%s) Subtitles: %s' % (self.mode, position, length, speed,
+                                                                              self.chanid if self.mode == 'LiveTV' else self.item.chanid,
+                                                                              start.isoformat(), frame, filename, FRAME_RATE,
+                                                                              stamp, subtitles)
+
+
+def _clock(seconds):
+    """Formats a time in seconds as the frontend does, eg. '6:57' or '1:06:57'."""
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return '%d:%02d:%02d' % (seconds//3600, (seconds//60)%60, seconds%60)
+    return '%d:%02d' % (seconds//60, seconds%60)
@@ -0,0 +1,45 @@
+# MythTV Universal Control Server - Simulator Keyboard
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Simulator Keyboard
+
+A stand-in for the xtest module, which passes the key presses the server
+would send to the X server on to the simulated frontend instead. When
+installed this module takes the place of the xtest module.
+"""
+
+import Bindings
+
+__all__ = [ "XTest", ]
+
+
+class XTest:
+    def __init__(self, display=None):
+        pass
+
+    def fakeKeyEvent(self, keysym):
+        Bindings.world.call('frontend')
+        Bindings.world.frontend.key(keysym)
+
+    def fakeKeySequence(self, keysyms, delay=0):
+        Bindings.world.call('frontend')
+        for keysym in keysyms:
+            Bindings.world.frontend.key(keysym)
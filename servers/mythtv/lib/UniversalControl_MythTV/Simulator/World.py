@@ -0,0 +1,422 @@
+# MythTV Universal Control Server - Simulator World
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Simulator World
+
+The state of a simulated MythTV system: its channels, programme guide,
+recordings, videos, recording rules, MythNetVision feeds and frontend, all
+generated from a seed so that the same parameters always give the same world.
+
+The fake bindings in Simulator.Bindings read from and write to a World, and
+it can be changed while the server is running (eg. adding or deleting
+recordings), in which case it sends the backend events which MythTV would.
+Every call made through the bindings waits for the latency configured for
+its kind ('db', 'backend' or 'frontend'), so that the effect of a slow
+database or frontend can be measured.
+
+All times are naive datetimes in local time, as given by the MythTV bindings.
+"""
+
+import threading
+import datetime
+import random
+import time
+import re
+
+from Frontend import FrontendState
+
+__all__ = [ "World",
+            "Row", ]
+
+
+TITLE_WORDS = [ "Doctor", "Garden", "World", "News", "Question", "Sport", "Kitchen", "Island", "Night", "Street",
+                "House", "Planet", "Test", "Match", "Film", "Story", "Life", "Great", "British", "Bake", "Top",
+                "Gear", "Time", "Team", "Road", "Show", "Hour", "Weather", "Antiques", "Coast", "Country", "Wild" ]
+
+DESCRIPTION_WORDS = [ "the", "a", "and", "of", "in", "to", "with", "new", "series", "presenter", "visits", "explores",
+                      "returns", "final", "episode", "first", "family", "friends", "secret", "history", "journey",
+                      "challenge", "live", "coverage", "highlights", "drama", "comedy", "documentary" ]
+
+CATEGORIES = [ 'Movie', 'News', 'Entertainment', 'Sports', 'Kids', 'Music/Ballet/Dance', 'Arts/Culture',
+               'Social/Political/Economics', 'Education/Science/Factual', 'Leisure/Hobbies', 'Drama' ]
+
+DURATIONS = [ 10, 15, 30, 30, 30, 45, 60, 60, 60, 90, 120 ]   # minutes
+
+RECORD_FIND_ONE = 6
+RECORD_ALL      = 4
+RECORD_SINGLE   = 1
+
+LATENCIES = { 'db'       : 0.0,
+              'backend'  : 0.0,
+              'frontend' : 0.0, }
+
+
+class Row(object):
+    """A row of one of the world's tables, with its columns as attributes."""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+    def __repr__(self):
+        return "Row(%s)" % ', '.join([ '%s=%r' % item for item in sorted(self.__dict__.items()) ])
+
+
+class World:
+    """A simulated MythTV system.
+
+    The parameters are as follows:
+
+    channels   -- the number of channels.
+    days       -- the number of days of guide data, starting from now (a day before now is also generated).
+    recordings -- the number of recordings, taken from the guide before now.
+    videos     -- the number of videos.
+    rules      -- the number of power search recording rules, each for a programme in the guide after now.
+    feeds      -- the number of MythNetVision feeds.
+    articles   -- the number of articles in each feed.
+    seed       -- the seed for the random numbers used to generate the world.
+    latency    -- a dictionary mapping 'db', 'backend' and 'frontend' onto the time in seconds each call of that kind
+                  takes, as in LATENCIES.
+    jitter     -- the largest random time in seconds added to each latency.
+    now        -- the time around which the world is generated, by default the time at which it is made.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, channels=20, days=7, recordings=200, videos=50, rules=10, feeds=2, articles=25, seed=0,
+                 latency=None, jitter=0.0, now=None):
+        self.lock      = threading.RLock()
+        self.random    = random.Random(seed)
+        self.latency   = dict(LATENCIES)
+        self.latency.update(latency or {})
+        self.jitter    = jitter
+        self.now       = (now or datetime.datetime.now()).replace(second=0, microsecond=0)
+        self.listeners = []
+        self.counts    = dict()      # the number of calls made of each kind
+
+        self.tables = { 'Channel'                 : [],
+                        'ChannelScan'             : [],
+                        'ChannelScan_Channel'     : [],
+                        'GameMetadata'            : [],
+                        'InternetContent'         : [],
+                        'InternetContentArticles' : [],
+                        'Record'                  : [],
+                        'Recorded'                : [],
+                        'Video'                   : [],
+                        }
+        self.guide = []
+        self.upcoming = []
+        self.storage_groups = [ Row(id=1, groupname='Default', dirname='/var/lib/mythtv/recordings', hostname='localhost'),
+                                Row(id=2, groupname='Videos', dirname='/var/lib/mythtv/videos', hostname='localhost'), ]
+        self.disk_size = 2000*1024*1024   # in kilobytes, as MythTV gives it
+
+        self.generate_channels(channels)
+        self.generate_guide(days)
+        self.generate_recordings(recordings)
+        self.generate_videos(videos)
+        self.generate_rules(rules)
+        self.generate_netvision(feeds, articles)
+        self.schedule()
+
+        self.frontend = FrontendState(self)
+
+    # Generation
+
+    def words(self, vocabulary, low, high):
+        return ' '.join([ self.random.choice(vocabulary) for i in range(0, self.random.randint(low, high)) ])
+
+    def generate_channels(self, count):
+        self.tables['Channel'] = [ Row(chanid=1001 + i,
+                                       channum='%d' % (i + 1),
+                                       callsign='CH%d' % (i + 1),
+                                       name='Channel %d' % (i + 1),
+                                       icon='',
+                                       serviceid=4100 + i,
+                                       sourceid=1)
+                                   for i in range(0, count) ]
+
+    def generate_guide(self, days):
+        series = [ (self.words(TITLE_WORDS, 1, 3), 'series%04d' % i, self.random.choice(CATEGORIES)) for i in range(0, 200) ]
+        start = (self.now - datetime.timedelta(days=1)).replace(minute=0)
+        end   = self.now + datetime.timedelta(days=days)
+        number = 0
+        for channel in self.tables['Channel']:
+            when = start
+            while when < end:
+                (title, seriesid, category) = self.random.choice(series)
+                length = datetime.timedelta(minutes=self.random.choice(DURATIONS))
+                number += 1
+                self.guide.append(Row(chanid=channel.chanid,
+                                      starttime=when,
+                                      endtime=when + length,
+                                      title=title,
+                                      subtitle=self.words(TITLE_WORDS, 0, 3),
+                                      description=self.words(DESCRIPTION_WORDS, 5, 25),
+                                      category=category,
+                                      programid='prog%07d' % number,
+                                      seriesid=seriesid,
+                                      videoprop=self.random.choice([ '', 'WIDESCREEN', 'HDTV' ]),
+                                      audioprop=self.random.choice([ '', 'STEREO' ]),
+                                      subtitletypes=self.random.choice([ '', 'HARDHEAR' ])))
+                when += length
+        self.guide.sort(key=lambda guide : (guide.starttime, guide.chanid))
+
+    def generate_recordings(self, count):
+        past = [ guide for guide in self.guide if guide.endtime <= self.now ]
+        for guide in self.random.sample(past, min(count, len(past))):
+            self.tables['Recorded'].append(self.recording_from_guide(guide))
+
+    def recording_from_guide(self, guide):
+        basename = '%d_%s.mpg' % (guide.chanid, guide.starttime.strftime('%Y%m%d%H%M%S'))
+        return Row(chanid=guide.chanid,
+                   starttime=guide.starttime,
+                   endtime=guide.endtime,
+                   progstart=guide.starttime,
+                   progend=guide.endtime,
+                   recstartts=guide.starttime,
+                   recendts=guide.endtime,
+                   title=guide.title,
+                   subtitle=guide.subtitle,
+                   description=guide.description,
+                   category=guide.category,
+                   programid=guide.programid,
+                   seriesid=guide.seriesid,
+                   recgroup='Default',
+                   storagegroup='Default',
+                   basename=basename,
+                   filename='myth://Default@127.0.0.1:6543/%s' % basename,
+                   filesize=long((guide.endtime - guide.starttime).seconds)*400000L,
+                   lastmodified=guide.endtime,
+                   video_props=self.random.choice([ None, 0, 1, 2 ]),
+                   subtitle_type=self.random.choice([ None, 1 ]))
+
+    def generate_videos(self, count):
+        for i in range(0, count):
+            title = self.words(TITLE_WORDS, 1, 4)
+            self.tables['Video'].append(Row(intid=i + 1,
+                                            title=title,
+                                            subtitle='',
+                                            tagline=self.words(DESCRIPTION_WORDS, 3, 10),
+                                            filename='%s.avi' % title.replace(' ', '_'),
+                                            insertdate=self.now - datetime.timedelta(days=self.random.randint(1, 1000)),
+                                            length=self.random.choice([ 30, 60, 90, 120 ])))
+
+    def generate_rules(self, count):
+        future = [ guide for guide in self.guide if guide.starttime > self.now ]
+        for guide in self.random.sample(future, min(count, len(future))):
+            if self.random.random() < 0.5:
+                self.add_rule("program.programid='%s'" % guide.programid, RECORD_FIND_ONE)
+            else:
+                self.add_rule("program.seriesid='%s'" % guide.seriesid, RECORD_ALL)
+
+    def generate_netvision(self, feeds, articles):
+        for i in range(0, feeds):
+            name = 'Feed %d' % (i + 1)
+            self.tables['InternetContent'].append(Row(name=name, thumbnail='', type=1, author='', description='',
+                                                      commandline='', version=1.0, updated=self.now, search=False,
+                                                      tree=True, podcast=False, download=False, host='localhost'))
+            for j in range(0, articles):
+                self.tables['InternetContentArticles'].append(
+                    Row(feedtitle=name,
+                        path='',
+                        paththumb='',
+                        title=self.words(TITLE_WORDS, 2, 5),
+                        subtitle='',
+                        season=0,
+                        episode=0,
+                        description=self.words(DESCRIPTION_WORDS, 5, 20),
+                        url='http://feeds.example.com/%d/%d' % (i + 1, j + 1),
+                        type=1,
+                        thumbnail='http://feeds.example.com/%d/%d.jpg' % (i + 1, j + 1),
+                        mediaURL='http://feeds.example.com/%d/%d.mp4' % (i + 1, j + 1),
+                        author='',
+                        date=self.now - datetime.timedelta(hours=self.random.randint(1, 500)),
+                        time='',
+                        rating='',
+                        filesize=0,
+                        player='',
+                        playerargs='',
+                        download='',
+                        downloadargs='',
+                        width=0,
+                        height=0,
+                        language='en',
+                        podcast=False,
+                        downloadable=False,
+                        customhtml=False,
+                        countries=''))
+
+    # Access from the bindings
+
+    def call(self, kind):
+        """Waits for the latency of a call of the given kind, and counts the call."""
+        with self.lock:
+            self.counts[kind] = self.counts.get(kind, 0) + 1
+            delay = self.latency.get(kind, 0.0) + (self.random.uniform(0, self.jitter) if self.jitter > 0 else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def rows(self, table):
+        """Returns a list of the rows of a table, which is empty if the world has no such table."""
+        with self.lock:
+            return list(self.tables.get(table, []))
+
+    def search_guide(self, **kwargs):
+        """Returns the guide entries matching the given arguments, which are those of MythDB.searchGuide that the
+        server uses."""
+        tests = []
+        for (key, value) in kwargs.items():
+            if key == 'chanid':
+                tests.append(lambda guide, value=int(value) : guide.chanid == value)
+            elif key == 'starttime':
+                tests.append(lambda guide, value=value : guide.starttime == value)
+            elif key == 'endafter':
+                tests.append(lambda guide, value=value : guide.endtime > value)
+            elif key == 'startbefore':
+                tests.append(lambda guide, value=value : guide.starttime < value)
+            elif key == 'startafter':
+                tests.append(lambda guide, value=value : guide.starttime > value)
+            elif key == 'endbefore':
+                tests.append(lambda guide, value=value : guide.endtime < value)
+            elif key in ('title', 'programid', 'seriesid', 'category'):
+                tests.append(lambda guide, key=key, value=value : getattr(guide, key) == value)
+            else:
+                raise TypeError, "Unsupported guide search argument %s" % key
+        with self.lock:
+            return [ guide for guide in self.guide if all([ test(guide) for test in tests ]) ]
+
+    def on_now(self, when=None):
+        """Returns a list of the guide entries showing at the given time (by default the current time), one for each
+        channel."""
+        when = when or datetime.datetime.now()
+        with self.lock:
+            return [ guide for guide in self.guide if guide.starttime <= when < guide.endtime ]
+
+    def summary(self):
+        """Returns the row which the server's storage summary query gives."""
+        with self.lock:
+            recorded = self.tables['Recorded']
+            videos   = self.tables['Video']
+            return (len(recorded), max([ rec.lastmodified for rec in recorded ] or [ None ]),
+                    len(videos), max([ vid.intid for vid in videos ] or [ None ]))
+
+    def free_space(self):
+        """Returns a tuple of the total and used space in kilobytes."""
+        with self.lock:
+            return (self.disk_size, sum([ rec.filesize for rec in self.tables['Recorded'] ])//1024)
+
+    # Changes
+
+    def add_listener(self, listener):
+        """Adds a callable which is passed each backend event message."""
+        with self.lock:
+            self.listeners.append(listener)
+
+    def event(self, message):
+        """Sends a backend event to the listeners."""
+        with self.lock:
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener('BACKEND_MESSAGE[]:[]%s[]:[]empty' % message)
+
+    def add_recording(self, guide=None):
+        """Adds a recording of the given guide entry (by default a random one from before now which has not been
+        recorded) and returns it."""
+        with self.lock:
+            if guide is None:
+                recorded = set([ (rec.chanid, rec.recstartts) for rec in self.tables['Recorded'] ])
+                guide = self.random.choice([ guide for guide in self.guide
+                                             if guide.endtime <= datetime.datetime.now() and (guide.chanid, guide.starttime) not in recorded ])
+            rec = self.recording_from_guide(guide)
+            rec.lastmodified = datetime.datetime.now().replace(microsecond=0)
+            self.tables['Recorded'].append(rec)
+        self.event('RECORDING_LIST_CHANGE ADD %d %s' % (rec.chanid, rec.recstartts.isoformat()))
+        return rec
+
+    def delete_recording(self, chanid, starttime):
+        """Deletes the recording with the given chanid and start time, returning True if there was one."""
+        with self.lock:
+            matches = [ rec for rec in self.tables['Recorded'] if rec.chanid == int(chanid) and rec.recstartts == starttime ]
+            for rec in matches:
+                self.tables['Recorded'].remove(rec)
+        if matches:
+            self.event('RECORDING_LIST_CHANGE DELETE %d %s' % (int(chanid), starttime.isoformat()))
+        return len(matches) > 0
+
+    def add_rule(self, description, type, guide=None, title=None):
+        """Adds a recording rule and returns it. A power search rule has a description of the form
+        "program.programid='...'" or "program.seriesid='...'"; if guide is given the rule instead records that single
+        guide entry."""
+        with self.lock:
+            recordid = max([ rule.recordid for rule in self.tables['Record'] ] or [ 0 ]) + 1
+            rule = Row(recordid=recordid,
+                       title=(title or (guide.title if guide is not None else 'Power Search %d' % recordid)),
+                       description=description,
+                       search=(1L if guide is None else 0L),
+                       type=type,
+                       chanid=(guide.chanid if guide is not None else None),
+                       starttime=(guide.starttime if guide is not None else None))
+            self.tables['Record'].append(rule)
+        return rule
+
+    def remove_rule(self, recordid):
+        with self.lock:
+            self.tables['Record'] = [ rule for rule in self.tables['Record'] if rule.recordid != recordid ]
+
+    def schedule(self):
+        """Works out the upcoming recordings from the recording rules, as the MythTV scheduler would, and sends a
+        SCHEDULE_CHANGE event."""
+        with self.lock:
+            now = datetime.datetime.now()
+            upcoming = []
+            for rule in self.tables['Record']:
+                if rule.chanid is not None:
+                    matches = [ guide for guide in self.guide if guide.chanid == rule.chanid and guide.starttime == rule.starttime ]
+                else:
+                    match = re.match(r"program\.(programid|seriesid)='(.+)'", rule.description or '')
+                    if match is None:
+                        continue
+                    matches = [ guide for guide in self.guide
+                                if guide.endtime > now and getattr(guide, match.group(1)) == match.group(2) ]
+                if rule.type == RECORD_FIND_ONE:
+                    matches = matches[:1]
+                for guide in matches:
+                    upcoming.append(Row(recordid=rule.recordid, chanid=guide.chanid, title=guide.title,
+                                        starttime=guide.starttime, endtime=guide.endtime,
+                                        recstartts=guide.starttime, recendts=guide.endtime,
+                                        programid=guide.programid, seriesid=guide.seriesid))
+            self.upcoming = upcoming
+        self.event('SCHEDULE_CHANGE')
+
+    def upcoming_recordings(self):
+        with self.lock:
+            return list(self.upcoming)
+
+    def script(self, steps):
+        """Runs a list of (DELAY, CALL) tuples on a daemon thread, calling each CALL (a callable taking no arguments)
+        DELAY seconds after the previous one. Returns the thread."""
+        def run():
+            for (delay, call) in steps:
+                time.sleep(delay)
+                call()
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+        return thread
@@ -0,0 +1,50 @@
+# __init__ for MythTV Universal Control Server Simulator
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""\
+An offline stand-in for a MythTV system (backend, database, frontend and X
+server), so that the MythTVUC server can be run, benchmarked and load tested
+without one. install must be called before MythTVUC is imported:
+
+    from UniversalControl_MythTV import Simulator
+    world = Simulator.install(channels=50, days=14, latency={ 'db' : 0.005 })
+    from UniversalControl_MythTV import MythTVUC
+
+after which the server talks to world. See World for the parameters.
+"""
+
+import sys
+
+from World import World
+import Bindings
+import Keyboard
+
+__all__ = [ "install",
+            "World", ]
+
+
+def install(world=None, **kwargs):
+    """Makes the simulator take the place of the MythTV and xtest modules, and returns the World it simulates: world
+    if it is given, otherwise a new World made with the keyword arguments."""
+    if world is None:
+        world = World(**kwargs)
+    Bindings.world = world
+    sys.modules['MythTV'] = Bindings
+    sys.modules['xtest']  = Keyboard
+    return world
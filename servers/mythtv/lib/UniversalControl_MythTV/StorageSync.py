@@ -0,0 +1,88 @@
+# MythTV Universal Control Server - Storage Sync
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Storage Sync
+
+Change detection for the synchronisation of the uc/storage items with the
+recordings and videos known to MythTV, so that on a box with many thousands
+of them a sync in which nothing has changed costs a single small query, and
+one in which a few things have changed only builds items for those.
+
+Two levels of check are made. A summary of the tables (the number of rows and
+the most recent modification time, say) is compared with the one seen at the
+last sync, and if it has not changed the sync is skipped altogether, unless an
+item which was left out last time (such as a recording in progress) is due to
+be added or the last full sync was too long ago. Otherwise every item is given
+a fingerprint, and only those whose fingerprints are new or have changed are
+built.
+"""
+
+import datetime
+
+__all__ = [ "StorageSync", ]
+
+
+class StorageSync:
+    """The state kept between synchronisations of a set of items.
+
+    full_period is a datetime.timedelta after which a sync is made even if the summary has not changed, to pick up
+    changes which do not show in the summary.
+    """
+
+    def __init__(self, full_period=datetime.timedelta(hours=1)):
+        self.full_period  = full_period
+        self.fingerprints = dict()  # key -> fingerprint
+        self.summary      = None
+        self.recheck      = None    # if not None the time at which a left out item is due
+        self.last_full    = None
+
+    def stale(self, summary, now):
+        """Returns True if a sync is needed, given the current summary (None if it could not be found) and time."""
+        return (summary is None
+                or summary != self.summary
+                or self.last_full is None
+                or now - self.last_full >= self.full_period
+                or (self.recheck is not None and now >= self.recheck))
+
+    def update(self, entries):
+        """Takes an iterable of (KEY, FINGERPRINT, MAKE) tuples, where MAKE is a callable which builds the item for
+        KEY, and returns a tuple of a dictionary mapping the keys of the new and changed items onto the results of
+        calling their MAKE, and a list of the keys of the items which have gone."""
+        built = dict()
+        seen  = set()
+        for (key, fingerprint, make) in entries:
+            seen.add(key)
+            if self.fingerprints.get(key, None) != fingerprint:
+                built[key] = make()
+                self.fingerprints[key] = fingerprint
+
+        removed = [ key for key in self.fingerprints if key not in seen ]
+        for key in removed:
+            del self.fingerprints[key]
+
+        return (built, removed)
+
+    def synced(self, summary, now, recheck=None):
+        """Records that a sync was made at the given time with the given summary. recheck is the time at which the
+        earliest item left out of the sync is due to be included, or None."""
+        self.summary   = summary
+        self.last_full = now
+        self.recheck   = recheck
@@ -0,0 +1,449 @@
+# MythTV Universal Control Server - Text Index
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Text Index
+
+An inverted index over the titles and synopses of the programmes known to the
+server, used to answer uc/search/text requests without scanning every
+programme in the search window.
+
+Programmes are added to the index as documents in named groups (eg. 'guide',
+'storage'), each group being replaced wholesale by a call to sync which only
+touches the documents which have actually changed. Every document records its
+sid and (optionally) the start and end of its presentation window, which are
+indexed as facets alongside the title and synopsis tokens.
+
+Searches are for substrings, matching the semantics of
+Programmes.filterprogrammes: a search term is split into tokens and a document
+is a candidate only if every token of the term is a substring of one of its
+tokens. Substring matching is done against the vocabulary of the index rather
+than the documents themselves: the index keeps a sorted list of the suffixes of
+every word, so the words containing a token are those with a suffix beginning
+with it, a contiguous range of the list found by binary search. The words a
+sync adds or removes are merged into the list in one pass at its end.
+The index only ever returns a superset of the true matches, so callers must
+still filter the results.
+
+For as-you-type searches the index also answers prefix queries, in which a
+document is a candidate only if every token of the term begins one of its
+tokens. The tokens with a given prefix form a contiguous range of the sorted
+vocabulary which is found by binary search, and the matching documents are
+yielded lazily in order of how close their start is to a given time.
+"""
+
+import threading
+import bisect
+import calendar
+import datetime
+import heapq
+import re
+
+__all__ = [ "TextIndex",
+            "tokenise", ]
+
+
+# A prefix search in which every constraint has more postings than this finds
+# its results by checking the documents in order of start time instead
+PREFIX_POSTINGS_LIMIT = 2000
+
+
+TOKEN_PATTERN = re.compile(r'[^\W_]+', re.UNICODE)
+
+def tokenise(text):
+    """Returns a frozenset of the upper-case alphanumeric tokens in the given string."""
+    if text is None:
+        return frozenset()
+    if isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    elif not isinstance(text, unicode):
+        text = unicode(text)
+    return frozenset(TOKEN_PATTERN.findall(text.upper()))
+
+
+class Document(object):
+    """A single indexed programme. Only the payload of a document is ever altered once it is in the index."""
+
+    __slots__ = ('key', 'group', 'sid', 'order', 'start', 'end', 'title', 'synopsis', 'payload', 'fingerprint')
+
+    def __init__(self, key, group, sid, order, title, synopsis, start, end, payload):
+        self.key         = key
+        self.group       = group
+        self.sid         = sid
+        self.order       = order
+        self.start       = start
+        self.end         = end
+        self.title       = tokenise(title)
+        self.synopsis    = tokenise(synopsis)
+        self.payload     = payload
+        self.fingerprint = (sid, order, title, synopsis, start, end)
+
+
+class TextIndex:
+    """An incrementally maintained inverted index of programme titles and synopses.
+
+    Documents are supplied to the method sync as tuples of the form:
+
+        (KEY, SID, ORDER, TITLE, SYNOPSIS, START, END, PAYLOAD)
+
+    where KEY is any hashable value unique within the index, ORDER is a value used by callers to sort the results
+    from a single source, START and END are utc datetimes (or None for programmes without a presentation window)
+    and PAYLOAD is an arbitrary object returned by search.
+
+    All methods are safe to call from multiple threads.
+    """
+
+    def __init__(self, bucket=datetime.timedelta(hours=1)):
+        self.lock = threading.Lock()
+
+        self.bucket_seconds = bucket.days*86400 + bucket.seconds
+
+        self.documents = dict()  # key -> Document
+        self.groups    = dict()  # group -> set of keys
+        self.titles    = dict()  # token -> set of keys with the token in their title
+        self.synopses  = dict()  # token -> set of keys with the token in their synopsis
+        self.sids      = dict()  # sid -> set of keys
+        self.buckets   = dict()  # time bucket -> set of keys of documents starting in it
+        self.untimed   = set()   # keys of documents with no start
+
+        self.bucket_ids   = []       # sorted list of the keys of self.buckets
+        self.vocabulary   = []       # sorted list of all tokens in self.titles and self.synopses
+        self.suffixes     = []       # sorted list of (suffix, token) for every suffix of the tokens in self.vocabulary
+        self.new_words    = set()    # tokens added to self.vocabulary by a sync but not yet to self.suffixes
+        self.dead_words   = set()    # tokens removed from self.vocabulary by a sync but not yet from self.suffixes
+        self.token_counts = dict()   # token -> number of postings (in either field)
+        self.max_duration = datetime.timedelta(0)
+
+    def __len__(self):
+        return len(self.documents)
+
+    def sync(self, group, entries):
+        """Replaces the contents of the given group with the given entries. Documents whose fingerprint is unchanged
+        are left in place (though their payload is updated), so this costs little more than a pass over the entries
+        if nothing has changed. Returns the number of documents added, altered or removed."""
+
+        with self.lock:
+            old     = self.groups.get(group, set())
+            new     = set()
+            changes = 0
+
+            for (key, sid, order, title, synopsis, start, end, payload) in entries:
+                new.add(key)
+                if key in self.documents and self.documents[key].group == group:
+                    document = self.documents[key]
+                    if document.fingerprint == (sid, order, title, synopsis, start, end):
+                        document.payload = payload
+                        continue
+
+                self.__remove(key)
+                self.__add(Document(key, group, sid, order, title, synopsis, start, end, payload))
+                changes += 1
+
+            for key in old - new:
+                self.__remove(key)
+                changes += 1
+
+            if new:
+                self.groups[group] = new
+            elif group in self.groups:
+                del self.groups[group]
+
+            self.__merge_suffixes()
+
+            return changes
+
+    def search(self, terms, fields=('title','synopsis'), groups=None, sids=None, start=None, end=None):
+        """Returns a list of the Documents which may match all of the given search terms in the given fields, and
+        which belong to one of the given groups and sids (if not None) and may be presentable between start and end
+        (if not None).
+
+        Each constraint is applied either by building a candidate set from its postings or, once the candidate set
+        is small, by checking the candidates directly. Constraints are applied in order of increasing size."""
+
+        with self.lock:
+            constraints = self.__constraints(terms, self.__containing, fields, groups, sids, start, end)
+            return self.__candidates(constraints)
+
+    def prefix_search(self, terms, fields=('title','synopsis'), groups=None, sids=None, start=None, end=None, near=None):
+        """As search, but a document is a candidate only if each token of the terms is a prefix of one of its tokens
+        in the given fields. Returns an iterator which yields the candidates in order of the distance of their start
+        from near (or from start if near is None), documents with no start coming last.
+
+        If some constraint has few postings then the candidates are found from the postings as in search, and ordered
+        as they are consumed. Otherwise (as for the one or two letter prefixes typed at the start of a search) most
+        documents are candidates, and they are found by checking the documents in each time bucket, working outwards
+        from near, so that taking the first few is cheap however many there are."""
+
+        if near is None:
+            near = start
+
+        with self.lock:
+            constraints = self.__constraints(terms, self.__prefixed, fields, groups, sids, start, end)
+            if not constraints or min([ constraint[0] for constraint in constraints ]) > PREFIX_POSTINGS_LIMIT:
+                tests = [ test for (size, postings, test) in constraints ]
+                return self.__walk(tests, self.__buckets_between(start, end), near)
+            documents = self.__candidates(constraints)
+
+        def distance(document):
+            if document.start is None:
+                return (1, 0)
+            if near is None:
+                return (0, 0)
+            return (0, abs(self.__seconds(document.start) - self.__seconds(near)))
+
+        heap = [ (distance(document), document.order, n, document) for (n, document) in enumerate(documents) ]
+        heapq.heapify(heap)
+
+        def ordered():
+            while heap:
+                yield heapq.heappop(heap)[-1]
+
+        return ordered()
+
+    def __walk(self, tests, buckets, near):
+        """Returns an iterator over the documents in the given buckets (and then the untimed documents) which pass all
+        of the tests, in order of the distance of their start from near. Must be called with the lock held, but the
+        iterator takes the lock itself as it is consumed."""
+
+        bucket_seconds = self.bucket_seconds
+        origin = self.__seconds(near) if near is not None else None
+
+        if origin is None:
+            lo = -1
+            hi = 0
+        else:
+            hi = bisect.bisect_left(buckets, origin // bucket_seconds)
+            lo = hi - 1
+
+        def gap(n):
+            """The least distance between origin and a start in the nth bucket."""
+            if origin is None:
+                return n
+            if buckets[n]*bucket_seconds > origin:
+                return buckets[n]*bucket_seconds - origin
+            return max(0, origin - (buckets[n] + 1)*bucket_seconds)
+
+        def passing(keys):
+            documents = [ self.documents[key] for key in keys if key in self.documents ]
+            return [ document for document in documents if all([ test(document) for test in tests ]) ]
+
+        def ordered(lo, hi):
+            pending = []
+            count = 0
+            while lo >= 0 or hi < len(buckets):
+                if hi >= len(buckets) or (lo >= 0 and gap(lo) <= gap(hi)):
+                    (n, lo) = (lo, lo - 1)
+                else:
+                    (n, hi) = (hi, hi + 1)
+                bound = min([ gap(m) for m in (lo, hi) if 0 <= m < len(buckets) ] or [ None ])
+
+                with self.lock:
+                    found = passing(self.buckets.get(buckets[n], ()))
+                for document in found:
+                    heapq.heappush(pending, (abs(self.__seconds(document.start) - origin) if origin is not None else n,
+                                              document.order, count, document))
+                    count += 1
+
+                while pending and (bound is None or pending[0][0] <= bound):
+                    yield heapq.heappop(pending)[-1]
+
+            with self.lock:
+                found = passing(self.untimed)
+            for document in sorted(found, key=lambda document : document.order):
+                yield document
+
+        return ordered(lo, hi)
+
+    def __merge_suffixes(self):
+        """Brings self.suffixes up to date with the words added to and removed from the vocabulary. Must be called
+        with the lock held."""
+        if self.dead_words:
+            self.suffixes = [ entry for entry in self.suffixes if entry[1] not in self.dead_words ]
+            self.dead_words = set()
+        if self.new_words:
+            self.suffixes.extend([ (word[i:], word) for word in self.new_words for i in xrange(len(word)) ])
+            self.suffixes.sort()
+            self.new_words = set()
+
+    def __seconds(self, when):
+        return calendar.timegm(when.utctimetuple())
+
+    def __prefixed(self, token):
+        """Returns the words in the vocabulary which begin with token. Must be called with the lock held."""
+        lo = bisect.bisect_left(self.vocabulary, token)
+        hi = bisect.bisect_left(self.vocabulary, token + u'\uffff', lo)
+        return self.vocabulary[lo:hi]
+
+    def __containing(self, token):
+        """Returns the words in the vocabulary which contain token. Must be called with the lock held."""
+        lo = bisect.bisect_left(self.suffixes, (token,))
+        hi = bisect.bisect_left(self.suffixes, (token + u'\uffff',), lo)
+        return list(set([ word for (suffix, word) in self.suffixes[lo:hi] ]))
+
+    def __constraints(self, terms, match, fields, groups, sids, start, end):
+        """Returns a list of tuples of the size, postings and test for each constraint, where match is a function
+        which takes a token from the terms and returns the words in the vocabulary which it matches. Must be called
+        with the lock held."""
+
+        constraints = []
+
+        for term in terms:
+            for token in tokenise(term):
+                matched = match(token)
+                postings = []
+                if 'title' in fields:
+                    postings.extend([ self.titles[word] for word in matched if word in self.titles ])
+                if 'synopsis' in fields:
+                    postings.extend([ self.synopses[word] for word in matched if word in self.synopses ])
+                constraints.append((sum([ len(p) for p in postings ]), postings, self.__token_test(frozenset(matched), fields)))
+
+        if groups is not None:
+            postings = [ self.groups[group] for group in groups if group in self.groups ]
+            constraints.append((sum([ len(p) for p in postings ]), postings, lambda doc : doc.group in groups))
+
+        if sids is not None:
+            postings = [ self.sids[sid] for sid in sids if sid in self.sids ]
+            constraints.append((sum([ len(p) for p in postings ]), postings, lambda doc : doc.sid in sids))
+
+        if start is not None or end is not None:
+            postings = [ self.untimed ] + [ self.buckets[bucket] for bucket in self.__buckets_between(start, end) ]
+            constraints.append((sum([ len(p) for p in postings ]), postings, self.__time_test(start, end)))
+
+        return constraints
+
+    def __candidates(self, constraints):
+        """Returns a list of the documents which satisfy all of the given constraints. Must be called with the lock
+        held."""
+
+        if not constraints:
+            return self.documents.values()
+
+        constraints.sort(key=lambda constraint : constraint[0])
+
+        (size, postings, test) = constraints[0]
+        candidates = set().union(*postings) if postings else set()
+
+        for (size, postings, test) in constraints[1:]:
+            if not candidates:
+                break
+            if size < len(candidates):
+                candidates.intersection_update(set().union(*postings))
+            else:
+                candidates = set([ key for key in candidates if test(self.documents[key]) ])
+
+        return [ self.documents[key] for key in candidates ]
+
+    def __token_test(self, matched, fields):
+        def test(doc):
+            return (('title' in fields and not matched.isdisjoint(doc.title)) or
+                    ('synopsis' in fields and not matched.isdisjoint(doc.synopsis)))
+        return test
+
+    def __time_test(self, start, end):
+        def test(doc):
+            if doc.start is None:
+                return True
+            if start is not None and doc.end is not None and doc.end < start:
+                return False
+            if end is not None and doc.start >= end:
+                return False
+            return True
+        return test
+
+    def __bucket(self, when):
+        return calendar.timegm(when.utctimetuple()) // self.bucket_seconds
+
+    def __buckets_between(self, start, end):
+        """Returns the ids of all non-empty buckets which could contain documents presentable between start and end.
+        Must be called with the lock held."""
+        lo = 0
+        hi = len(self.bucket_ids)
+        if start is not None:
+            lo = bisect.bisect_left(self.bucket_ids, self.__bucket(start - self.max_duration))
+        if end is not None:
+            hi = bisect.bisect_right(self.bucket_ids, self.__bucket(end))
+        return self.bucket_ids[lo:hi]
+
+    def __add(self, document):
+        """Must be called with the lock held."""
+        key = document.key
+        self.documents[key] = document
+        self.groups.setdefault(document.group, set()).add(key)
+        self.sids.setdefault(document.sid, set()).add(key)
+
+        for (postings, tokens) in ((self.titles, document.title), (self.synopses, document.synopsis)):
+            for token in tokens:
+                postings.setdefault(token, set()).add(key)
+                if token in self.token_counts:
+                    self.token_counts[token] += 1
+                else:
+                    self.token_counts[token] = 1
+                    bisect.insort(self.vocabulary, token)
+                    if token in self.dead_words:
+                        self.dead_words.discard(token)
+                    else:
+                        self.new_words.add(token)
+
+        if document.start is None:
+            self.untimed.add(key)
+        else:
+            bucket = self.__bucket(document.start)
+            if bucket not in self.buckets:
+                self.buckets[bucket] = set()
+                bisect.insort(self.bucket_ids, bucket)
+            self.buckets[bucket].add(key)
+            if document.end is not None and document.end - document.start > self.max_duration:
+                self.max_duration = document.end - document.start
+
+    def __remove(self, key):
+        """Must be called with the lock held. Does nothing if the key is not in the index."""
+        if key not in self.documents:
+            return
+        document = self.documents.pop(key)
+
+        self.groups[document.group].discard(key)
+        self.__discard(self.sids, document.sid, key)
+
+        for (postings, tokens) in ((self.titles, document.title), (self.synopses, document.synopsis)):
+            for token in tokens:
+                self.__discard(postings, token, key)
+                self.token_counts[token] -= 1
+                if self.token_counts[token] == 0:
+                    del self.token_counts[token]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                    if token in self.new_words:
+                        self.new_words.discard(token)
+                    else:
+                        self.dead_words.add(token)
+
+        if document.start is None:
+            self.untimed.discard(key)
+        else:
+            bucket = self.__bucket(document.start)
+            if self.__discard(self.buckets, bucket, key):
+                del self.bucket_ids[bisect.bisect_left(self.bucket_ids, bucket)]
+
+    def __discard(self, postings, value, key):
+        """Removes key from postings[value], deleting the entry if it becomes empty. Returns True if it did."""
+        postings[value].discard(key)
+        if not postings[value]:
+            del postings[value]
+            return True
+        return False
@@ -69,6 +69,12 @@ if __name__ == "__main__":
                   help="Turn on HTTP digest authentication")
     op.add_option("-l","--log-file", dest="log_filename", type="string", default=None,   
                   help="Filename for logging information",  metavar="filename")
+    op.add_option("--epg-mirror", dest="epg_path", type="string", default=":memory:",
+                  help="Filename for the local copy of the programme guide", metavar="filename")
+    op.add_option("--epg-fixture", dest="epg_fixture", type="string", default=None,
+                  help="Serve a saved copy of the programme guide instead of syncing from MythTV", metavar="filename")
+    op.add_option("--key-pace", dest="key_pace", type="int", default=MythTVUC.KEY_SEQUENCE_PACE,
+                  help="Milliseconds between the key presses of a sequence of buttons", metavar="MILLISECONDS")
     (options,args) = op.parse_args()
 
 
@@ -124,7 +130,8 @@ if __name__ == "__main__":
 
 
     #Initialise the MythTV interface
-    MythTVUC.initialise(server, options.logo)
+    MythTVUC.initialise(server, options.logo, epg_path=options.epg_path, epg_fixture=options.epg_fixture,
+                        key_pace=options.key_pace)
 
     #Set the correct data for the various resources
     server.set_resource_data('uc', {'resource' : 'uc', 
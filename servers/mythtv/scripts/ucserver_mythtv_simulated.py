@@ -0,0 +1,144 @@
+#!/usr/bin/python
+
+# Simulated MythTV executable script for UC MythTV Server
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the license only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+"""\
+Runs the Universal Control Server for a MythTV box against a simulated
+MythTV system (see UniversalControl_MythTV.Simulator) instead of a real one,
+for benchmarking and load testing on a machine without MythTV.
+
+The server is set up as by ucserver_mythtv.py, except that the pairing
+screen, feedback and apps handlers (which need a desktop session bus) are
+left out, and zeroconf is off by default.
+"""
+
+if __name__ == "__main__":
+    import sys
+    from optparse import OptionParser
+
+    op = OptionParser()
+    op.add_option("-p","--port", dest="port", type="int",    default=48875,
+                  help="Port number to serve on",   metavar="PORT")
+    op.add_option("-b","--bind", dest="bind", type="string", default="127.0.0.1",
+                  help="Address to serve from",     metavar="IP")
+    op.add_option("-z","--zeroconf", dest="zeroconf_on", action="store_true", default=False,
+                  help="Turn on the built-in mDNS/DNS-SD")
+    op.add_option("-l","--log-file", dest="log_filename", type="string", default=None,
+                  help="File to log to",            metavar="FILE")
+    op.add_option("--epg-mirror", dest="epg_path", type="string", default=":memory:",
+                  help="File for the EPG mirror",   metavar="FILE")
+    op.add_option("--channels", dest="channels", type="int", default=20,
+                  help="Number of simulated channels")
+    op.add_option("--days", dest="days", type="int", default=7,
+                  help="Number of days of simulated guide data")
+    op.add_option("--recordings", dest="recordings", type="int", default=200,
+                  help="Number of simulated recordings")
+    op.add_option("--videos", dest="videos", type="int", default=50,
+                  help="Number of simulated videos")
+    op.add_option("--rules", dest="rules", type="int", default=10,
+                  help="Number of simulated recording rules")
+    op.add_option("--seed", dest="seed", type="int", default=0,
+                  help="Seed for the simulated data")
+    op.add_option("--db-latency", dest="db_latency", type="float", default=0.0,
+                  help="Seconds taken by each database call", metavar="SECONDS")
+    op.add_option("--backend-latency", dest="backend_latency", type="float", default=0.0,
+                  help="Seconds taken by each backend call", metavar="SECONDS")
+    op.add_option("--frontend-latency", dest="frontend_latency", type="float", default=0.0,
+                  help="Seconds taken by each frontend call", metavar="SECONDS")
+    op.add_option("--key-pace", dest="key_pace", type="int", default=30,
+                  help="Milliseconds between the key presses of a sequence of buttons", metavar="MILLISECONDS")
+    (options,args) = op.parse_args()
+
+    # The simulator must be installed before MythTVUC is imported
+    from UniversalControl_MythTV import Simulator
+    world = Simulator.install(channels=options.channels,
+                              days=options.days,
+                              recordings=options.recordings,
+                              videos=options.videos,
+                              rules=options.rules,
+                              seed=options.seed,
+                              latency={ 'db'       : options.db_latency,
+                                        'backend'  : options.backend_latency,
+                                        'frontend' : options.frontend_latency, })
+
+    import UCServer
+    from UniversalControl_MythTV import MythTVUC
+    from UniversalControl_MythTV.genName_and_UUID import uuid,name
+
+    def standby_callback(standby):
+        if standby:
+            world.frontend.stop()
+        else:
+            world.frontend.start()
+        MythTVUC.mythtv_connections.frontend.reset()
+        return True
+
+    server = UCServer.UCServer(options.bind,
+                               options.port,
+                               options.zeroconf_on,
+                               name(),
+                               "Universal Control Server (simulated MythTV)",
+                               uuid(),
+                               StandbyCallback=standby_callback,
+                               options=['power',
+                                        'time',
+                                        'events',
+                                        'sources',
+                                        'source-lists',
+                                        'outputs',
+                                        'remote',
+                                        'acquisitions',
+                                        'search',
+                                        'storage',
+                                        'images',
+                                        'categories',
+                                        ],
+                               log_filename=options.log_filename)
+
+    MythTVUC.initialise(server, epg_path=options.epg_path, key_pace=options.key_pace)
+
+    server.set_resource_data('uc', {'resource' : 'uc',
+                                    'security' : False,
+                                    'name' : name(),
+                                    'id' :   uuid(),
+                                    'version' : UCServer.__version__,
+                                    'logo' : MythTVUC.mythtv_logo,
+                                    })
+    server.set_resource_data('uc/power', MythTVUC.mythtv_power)
+    server.set_sources(MythTVUC.mythtv_sources)
+    server.set_source_lists(MythTVUC.mythtv_source_lists)
+    server.set_outputs(MythTVUC.mythtv_outputs)
+    server.set_main_output('0')
+    server.set_controls([ ':uk_keyboard',])
+    server.set_button_handler(MythTVUC.mythtv_button_handler)
+    server.set_resource_data('uc/acquisitions', MythTVUC.mythtv_acquisitions)
+    server.set_acquirer(MythTVUC.mythtv_acquirer)
+    server.set_content(MythTVUC.mythtv_programmes)
+    server.set_resource_data('uc/storage', MythTVUC.mythtv_storage)
+    server.set_resource_data('images', MythTVUC.mythtv_images)
+    server.set_categories(MythTVUC.mythtv_categories)
+
+    server.log_message('Started Server on %s port %s against a simulated MythTV with %d channels\n\n',
+                       server.address, server.port, options.channels)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        sys.exit()
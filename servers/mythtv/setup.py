@@ -29,6 +29,6 @@ setup(name='ucserver-mythtv',
       author_email='james.barrett@bbc.co.uk',
       url='http://www.bbc.co.uk/rd',
       package_dir={'' : 'lib' },
-      packages=['UniversalControl_MythTV',],
-      scripts=['scripts/ucserver_mythtv.py',],
+      packages=['UniversalControl_MythTV','UniversalControl_MythTV.Simulator',],
+      scripts=['scripts/ucserver_mythtv.py','scripts/ucserver_mythtv_simulated.py',],
       )
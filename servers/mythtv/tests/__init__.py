@@ -0,0 +1,35 @@
+# MythTV Universal Control Server - Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+
+"""\
+Unit tests for the modules of UniversalControl_MythTV which do not need
+MythTV or a running server. Run them from the directory above this one with:
+
+    python -m unittest discover -s tests -t .
+"""
+
+import os
+import sys
+
+# ensure UniversalControl_MythTV is findable in the path for importing,
+# without needing to be installed:
+lib = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lib")
+if lib not in sys.path:
+    sys.path.insert(0, lib)
@@ -0,0 +1,159 @@
+# MythTV Universal Control Server - Connections Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import threading
+import time
+
+from UniversalControl_MythTV.Connections import Pool, Unavailable
+
+
+class Fatal(Exception):
+    pass
+
+
+def borrow(pool, force=False):
+    with pool(force) as handle:
+        return handle
+
+
+class Handle(object):
+    def __init__(self, n):
+        self.n      = n
+        self.broken = False
+
+
+class PoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.made    = []
+        self.checked = []
+        self.failing = False
+
+    def factory(self):
+        if self.failing:
+            raise IOError("cannot connect")
+        handle = Handle(len(self.made))
+        self.made.append(handle)
+        return handle
+
+    def check(self, handle):
+        self.checked.append(handle)
+        if handle.broken:
+            raise IOError("broken")
+
+    def pool(self, **kwargs):
+        return Pool('test', self.factory, check=self.check, fatal=(Fatal,), **kwargs)
+
+    def test_handles_are_reused(self):
+        pool = self.pool()
+        with pool() as first:
+            pass
+        with pool() as second:
+            pass
+        self.assertTrue(first is second)
+        self.assertEqual(self.checked, [])
+
+    def test_fatal_exceptions_throw_the_handle_away(self):
+        pool = self.pool()
+        try:
+            with pool() as first:
+                raise Fatal()
+        except Fatal:
+            pass
+        with pool() as second:
+            pass
+        self.assertFalse(first is second)
+
+    def test_handle_whose_borrower_raised_is_checked(self):
+        pool = self.pool()
+        try:
+            with pool() as first:
+                raise ValueError()
+        except ValueError:
+            pass
+        with pool() as second:
+            pass
+        self.assertTrue(first is second)
+        self.assertEqual(self.checked, [ first ])
+
+        try:
+            with pool() as handle:
+                handle.broken = True
+                raise ValueError()
+        except ValueError:
+            pass
+        with pool() as third:
+            pass
+        self.assertFalse(third is first)
+        self.assertEqual(len(self.made), 2)
+
+    def test_idle_handles_are_checked(self):
+        pool = self.pool(check_interval=0.05)
+        with pool() as first:
+            pass
+        time.sleep(0.1)
+        with pool() as second:
+            pass
+        self.assertEqual(self.checked, [ first ])
+
+    def test_size_bounds_handles_lent_out(self):
+        pool    = self.pool(size=2)
+        lock    = threading.Lock()
+        state   = { 'out' : 0, 'most' : 0 }
+
+        def borrow():
+            with pool() as handle:
+                with lock:
+                    state['out'] += 1
+                    state['most'] = max(state['most'], state['out'])
+                time.sleep(0.01)
+                with lock:
+                    state['out'] -= 1
+
+        threads = [ threading.Thread(target=borrow) for n in range(8) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(state['most'], 2)
+        self.assertEqual(len(self.made), 2)
+
+    def test_backoff_after_failure(self):
+        pool = self.pool(backoff=(0.1, 0.1))
+        self.failing = True
+        self.assertRaises(IOError, borrow, pool)
+        self.assertRaises(Unavailable, borrow, pool)
+
+        self.failing = False
+        borrow(pool, force=True)
+        self.assertEqual(len(self.made), 1)
+
+        self.failing = True
+        pool.reset()
+        self.assertRaises(IOError, borrow, pool)
+        time.sleep(0.15)
+        self.failing = False
+        borrow(pool)
+        self.assertEqual(len(self.made), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,159 @@
+# MythTV Universal Control Server - EPG Mirror Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import threading
+import datetime
+import tempfile
+import os
+
+from UniversalControl_MythTV.EPGMirror import EPGMirror
+
+
+NOW = datetime.datetime(2011, 6, 1, 12, 0)
+
+def hours(n):
+    return NOW + datetime.timedelta(hours=n)
+
+
+class Entry(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class Backend(object):
+    """Stands in for the MythTV database."""
+
+    def __init__(self):
+        self.programmes = dict()
+        self.feed       = []
+
+    def add(self, chanid, start, length, title, **kwargs):
+        self.programmes[(chanid, start)] = Entry(chanid=chanid, starttime=start, endtime=start + datetime.timedelta(hours=length),
+                                                 title=title, **kwargs)
+
+    def guide(self, endafter=None, startbefore=None):
+        return [ entry for entry in self.programmes.values() if entry.endtime > endafter and entry.starttime < startbefore ]
+
+    def articles(self):
+        return list(self.feed)
+
+
+class EPGMirrorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = Backend()
+        self.backend.add(1001, hours(0), 1, 'News', category='News', programid='p1', seriesid='s1')
+        self.backend.add(1001, hours(1), 1, 'Film', category='Movie', programid='p2')
+        self.backend.add(1002, hours(0), 2, 'Sport', category='Sports', programid='p3', seriesid='s1')
+        self.backend.add(1002, hours(30), 1, 'Tomorrow', programid='p4')
+        self.backend.feed = [ Entry(url='http://a/1', feedtitle='Feed A', title='One'),
+                              Entry(url='http://b/1', feedtitle='Feed B', title='Two') ]
+        self.mirror = EPGMirror(self.backend, days=3, feed_id=lambda title : title.replace(' ', '').lower())
+
+    def titles(self, rows):
+        return [ row.title for row in rows ]
+
+    def test_first_sync_loads_everything(self):
+        changed = []
+        self.mirror.add_listener(changed.append)
+
+        self.assertEqual(self.mirror.sync(NOW), set([ 'program', 'netvision' ]))
+        self.assertEqual(changed, [ set([ 'program', 'netvision' ]) ])
+        self.assertEqual(self.titles(self.mirror.search_guide()), [ 'News', 'Sport', 'Film', 'Tomorrow' ])
+        self.assertEqual(self.mirror.sequences, { 'program' : 1, 'netvision' : 1 })
+
+    def test_unchanged_sync_changes_nothing(self):
+        self.mirror.sync(NOW)
+        changed = []
+        self.mirror.add_listener(changed.append)
+
+        self.assertEqual(self.mirror.sync(NOW), set())
+        self.assertEqual(changed, [])
+        self.assertEqual(self.mirror.sequence, 2)
+
+    def test_sync_applies_changes_and_expiry(self):
+        self.mirror.sync(NOW)
+        self.backend.add(1001, hours(1), 1, 'Different film', category='Movie')
+        del self.backend.programmes[(1002, hours(0))]
+
+        self.assertEqual(self.mirror.sync(NOW), set([ 'program' ]))
+        self.assertEqual(self.titles(self.mirror.search_guide()), [ 'News', 'Different film', 'Tomorrow' ])
+
+        self.mirror.sync(hours(27))
+        self.assertEqual(self.titles(self.mirror.search_guide()), [ 'Tomorrow' ])
+
+    def test_search_guide(self):
+        self.mirror.sync(NOW)
+
+        self.assertEqual(self.titles(self.mirror.search_guide(chanid=1001)), [ 'News', 'Film' ])
+        self.assertEqual(self.titles(self.mirror.search_guide(endafter=hours(1), startbefore=hours(2))), [ 'Sport', 'Film' ])
+        self.assertEqual(self.titles(self.mirror.search_guide(seriesid='s1')), [ 'News', 'Sport' ])
+        self.assertEqual(self.titles(self.mirror.search_guide(category='Movie')), [ 'Film' ])
+        self.assertEqual(self.mirror.search_guide(programid='p2')[0].starttime, hours(1))
+
+    def test_articles_by_feed(self):
+        self.mirror.sync(NOW)
+
+        self.assertEqual(self.titles(self.mirror.articles()), [ 'One', 'Two' ])
+        self.assertEqual(self.titles(self.mirror.articles('feedb')), [ 'Two' ])
+
+    def test_fixture_round_trip(self):
+        self.mirror.sync(NOW)
+        (fd, filename) = tempfile.mkstemp(suffix='.sql')
+        os.close(fd)
+        try:
+            self.mirror.dump(filename)
+            fixture = EPGMirror.from_dump(filename)
+        finally:
+            os.remove(filename)
+
+        self.assertEqual(fixture.sync(NOW), set())
+        self.assertEqual(self.titles(fixture.search_guide()), self.titles(self.mirror.search_guide()))
+
+    def test_searches_during_syncs_see_whole_syncs(self):
+        self.mirror.sync(NOW)
+        errors = []
+        stop   = threading.Event()
+
+        def search():
+            try:
+                while not stop.is_set():
+                    self.assertTrue(len(self.mirror.search_guide(chanid=1001)) in (2, 3))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [ threading.Thread(target=search) for n in range(4) ]
+        for thread in threads:
+            thread.start()
+        for n in range(20):
+            if n % 2:
+                del self.backend.programmes[(1001, hours(2))]
+            else:
+                self.backend.add(1001, hours(2), 1, 'Late film')
+            self.mirror.sync(NOW)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# MythTV Universal Control Server - Fan Out Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import threading
+import itertools
+import time
+
+from UniversalControl_MythTV.FanOut import FanOut
+
+
+class FanOutTest(unittest.TestCase):
+
+    def test_run_returns_results_in_order(self):
+        fanout = FanOut(workers=4)
+        calls  = [ (lambda n=n : time.sleep(0.01*(4 - n)) or n) for n in range(4) ]
+        self.assertEqual(fanout.run(calls), [ 0, 1, 2, 3 ])
+
+    def test_run_without_workers_runs_in_the_calling_thread(self):
+        fanout  = FanOut(workers=0)
+        threads = []
+        fanout.run([ lambda : threads.append(threading.current_thread()) ])
+        self.assertEqual(threads, [ threading.current_thread() ])
+
+    def test_run_is_concurrent(self):
+        fanout = FanOut(workers=4)
+        began  = time.time()
+        fanout.run([ lambda : time.sleep(0.1) ] * 4)
+        self.assertTrue(time.time() - began < 0.3)
+
+    def test_failed_and_late_sources_give_the_default(self):
+        messages = []
+        fanout   = FanOut(workers=3, log=messages.append)
+        release  = threading.Event()
+
+        def fail():
+            raise ValueError("source failed")
+
+        results = fanout.run([ lambda : 'ok', fail, release.wait ], deadline=0.1, default='default')
+        release.set()
+
+        self.assertEqual(results, [ 'ok', 'default', 'default' ])
+        self.assertTrue(any([ 'Abandoned 1 of 3' in message for message in messages ]))
+        self.assertTrue(any([ 'source failed' in message for message in messages ]))
+
+    def test_abandoned_calls_are_not_started(self):
+        fanout  = FanOut(workers=1)
+        release = threading.Event()
+        made    = []
+
+        fanout.run([ release.wait, lambda : made.append(1) ], deadline=0.05)
+        release.set()
+        fanout.run([ lambda : None ])
+
+        self.assertEqual(made, [])
+
+    def test_prefetch_reads_up_to_limit_then_continues(self):
+        fanout = FanOut(workers=2)
+        (iterables, complete) = fanout.prefetch([ lambda : xrange(10), lambda : xrange(3) ], 5)
+
+        self.assertTrue(complete)
+        self.assertEqual([ list(iterable) for iterable in iterables ], [ range(10), range(3) ])
+
+    def test_prefetch_cuts_short_late_and_failed_sources(self):
+        fanout  = FanOut(workers=3)
+        release = threading.Event()
+
+        def slow():
+            yield 1
+            release.wait()
+            yield 2
+
+        def broken():
+            yield 'a'
+            raise ValueError("source failed")
+
+        (iterables, complete) = fanout.prefetch([ lambda : xrange(10), slow, broken ], 5, deadline=0.1)
+        release.set()
+
+        self.assertFalse(complete)
+        self.assertEqual([ list(itertools.islice(iterable, 20)) for iterable in iterables ], [ range(10), [ 1 ], [ 'a' ] ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+# MythTV Universal Control Server - Frontend Channel Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import threading
+import time
+
+from UniversalControl_MythTV.Connections import Pool
+from UniversalControl_MythTV.FrontendChannel import FrontendChannel, Full, Timeout
+
+
+class Fatal(Exception):
+    pass
+
+
+class Frontend(object):
+    """Stands in for a frontend control connection, recording what is sent to it."""
+
+    def __init__(self):
+        self.sent = []
+
+    def sendQuery(self, query):
+        self.sent.append(('query', query))
+        return 'answer to %s' % (query,)
+
+    def sendPlay(self, play):
+        self.sent.append(('play', play))
+
+    def sendJump(self, jump):
+        self.sent.append(('jump', jump))
+
+
+class FrontendChannelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.frontend  = Frontend()
+        self.available = True
+        self.connected = []
+        self.pool      = Pool('frontend', self.factory, size=1, fatal=(Fatal,))
+
+    def factory(self):
+        if not self.available:
+            raise IOError("no frontend")
+        return self.frontend
+
+    def channel(self, **kwargs):
+        channel = FrontendChannel(self.pool, connected=self.connected.append, **kwargs)
+        channel.start()
+        return channel
+
+    def block(self, channel):
+        """Queues a command which holds up the worker until the returned event is set."""
+        started = threading.Event()
+        release = threading.Event()
+        channel.send(lambda fe : started.set() or release.wait())
+        started.wait()
+        return release
+
+    def test_commands_are_sent_in_order(self):
+        channel = self.channel()
+        futures = [ channel.play('play speed normal'), channel.jump('mainmenu'), channel.query('location') ]
+
+        self.assertEqual([ future.result(1) for future in futures ], [ True, True, 'answer to location' ])
+        self.assertEqual(self.frontend.sent, [ ('play', 'play speed normal'), ('jump', 'mainmenu'), ('query', 'location') ])
+
+    def test_keyed_commands_are_coalesced(self):
+        channel = self.channel()
+        release = self.block(channel)
+
+        futures = [ channel.play('volume %d%%' % (n,), key='volume') for n in range(5) ]
+        queries = [ channel.query('location') for n in range(3) ]
+        release.set()
+
+        self.assertEqual([ future.result(1) for future in futures ], [ True ] * 5)
+        self.assertEqual([ future.result(1) for future in queries ], [ 'answer to location' ] * 3)
+        self.assertEqual(self.frontend.sent, [ ('play', 'volume 4%'), ('query', 'location') ])
+        self.assertEqual(channel.coalesced, 6)
+
+    def test_full_queue(self):
+        channel = self.channel(size=2)
+        release = self.block(channel)
+
+        futures = [ channel.play('a'), channel.play('b'), channel.play('c') ]
+        self.assertTrue(futures[2].failed())
+        self.assertRaises(Full, futures[2].result)
+        release.set()
+        self.assertEqual([ future.result(1) for future in futures[:2] ], [ True, True ])
+
+    def test_failures(self):
+        channel = self.channel()
+        release = self.block(channel)
+
+        def fail(exception):
+            def call(fe):
+                raise exception
+            return call
+
+        futures = [ channel.send(fail(ValueError())), channel.play('a'), channel.send(fail(Fatal())), channel.play('b') ]
+        release.set()
+
+        self.assertRaises(ValueError, futures[0].result, 1)
+        self.assertEqual(futures[1].result(1), True)
+        self.assertRaises(Fatal, futures[2].result, 1)
+        self.assertRaises(Fatal, futures[3].result, 1)
+
+    def test_no_frontend(self):
+        self.available = False
+        channel = self.channel()
+
+        self.assertRaises(IOError, channel.play('a').result, 1)
+        # connected is called once the command has failed
+        for n in range(100):
+            if self.connected:
+                break
+            time.sleep(0.01)
+        self.assertEqual(self.connected, [ False ])
+
+    def test_connected_may_borrow_the_frontend(self):
+        borrowed = []
+
+        def connected(state):
+            with self.pool() as fe:
+                borrowed.append(state)
+
+        channel = FrontendChannel(self.pool, connected=connected)
+        channel.start()
+
+        self.assertEqual(channel.play('a').result(1), True)
+        self.assertEqual(channel.play('b').result(1), True)
+        self.assertEqual(borrowed[:1], [ True ])
+
+    def test_future(self):
+        channel = self.channel()
+        release = self.block(channel)
+
+        future = channel.play('a')
+        self.assertRaises(Timeout, future.result, 0.01)
+        called = []
+        future.add_done_callback(called.append)
+        release.set()
+        future.result(1)
+
+        self.assertEqual(called, [ future ])
+        future.add_done_callback(called.append)
+        self.assertEqual(called, [ future, future ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# MythTV Universal Control Server - Frontend Status Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import datetime
+
+from UniversalControl_MythTV.FrontendStatus import parse_location, parse_volume, parse_livetv
+from UniversalControl_MythTV import FrontendStatusCorpus
+
+
+class FrontendStatusTest(unittest.TestCase):
+
+    def test_corpus(self):
+        self.assertEqual(FrontendStatusCorpus.check(), [])
+
+    def test_malformed_replies_never_raise(self):
+        self.assertEqual(FrontendStatusCorpus.fuzz(2000, seed=0), [])
+
+    def test_live_tv_location(self):
+        location = parse_location("Playback LiveTV 1:06:57 of 1:07:03 -1/3x 5168 2010-09-03T11:00:00 10429 "
+                                  "/var/lib/mythtv/livetv/5168_20100903110000.mpg 0.5 (@15:31:54.109Z) "
+                                  "Subtitles: 0:[None] *1:[Subtitle 1: English]*")
+
+        self.assertEqual(location.kind, 'playback')
+        self.assertEqual(location.mode, 'LiveTV')
+        self.assertEqual((location.position, location.length), (4017, 4023))
+        self.assertAlmostEqual(location.speed, -1.0/3)
+        self.assertEqual(location.chanid, 5168)
+        self.assertEqual(location.starttime, datetime.datetime(2010, 9, 3, 11, 0, 0))
+        self.assertEqual(location.frame, 10429)
+        self.assertEqual(location.framerate, 0.5)
+        self.assertEqual(location.timestamp, (15, 31, 54, 109000))
+        self.assertEqual(location.subtitles, [ (0, 'None', False), (1, 'Subtitle 1: English', True) ])
+        self.assertTrue(location.subtitled())
+
+    def test_other_locations(self):
+        self.assertEqual(parse_location("Playback Video 0:03 pause myth://Videos@127.0.0.1:6543/a.ts 94 25").speed, 0.0)
+        self.assertEqual(parse_location("Playback Video 0:03 1x myth://Videos@127.0.0.1:6543/a.ts 94 25").length, None)
+        self.assertEqual(parse_location("Playback Recorded 0:01 of 0:02 1/0x 1 2010-09-03T11:00:00 1 f 25").speed, None)
+
+        game = parse_location("game Sonic_the_Hedgehog Genesis")
+        self.assertEqual((game.kind, game.game, game.system), ('game', 'Sonic_the_Hedgehog', 'Genesis'))
+        self.assertEqual(parse_location("mainmenu").location, 'mainmenu')
+        self.assertEqual(parse_location("ERROR: unknown").kind, 'error')
+        self.assertEqual(parse_location("").kind, 'unknown')
+        self.assertEqual(parse_location(None).kind, 'unknown')
+
+    def test_volume(self):
+        self.assertEqual(parse_volume("42%"), 42)
+        self.assertEqual(parse_volume("loud"), None)
+        self.assertEqual(parse_volume(None), None)
+
+    def test_livetv(self):
+        entries = parse_livetv("1001 2010-09-03T11:00:00 2010-09-03T12:00:00 News\r\n"
+                               "garbage\r\n"
+                               "1002 2010-09-03T11:00:00 2010-13-03T12:00:00 Bad date\r\n"
+                               "1003 2010-09-03T11:30:00 2010-09-03T12:00:00 Film: The Sequel")
+
+        self.assertEqual([ (entry.chanid, entry.title) for entry in entries ], [ (1001, 'News'), (1003, 'Film: The Sequel') ])
+        self.assertEqual(entries[1].starttime, datetime.datetime(2010, 9, 3, 11, 30))
+        self.assertEqual(parse_livetv(None), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
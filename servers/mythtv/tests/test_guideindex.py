@@ -0,0 +1,100 @@
+# MythTV Universal Control Server - Guide Index Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import random
+import datetime
+
+from UniversalControl_MythTV.GuideIndex import GuideIndex, ChannelGuide
+
+
+T = datetime.datetime(2011, 6, 1, 6, 0)
+
+def minutes(n):
+    return T + datetime.timedelta(minutes=n)
+
+
+class ChannelGuideTest(unittest.TestCase):
+
+    def test_between_and_at(self):
+        guide = ChannelGuide([ (minutes(60), minutes(90), 'b'),
+                               (minutes(0),  minutes(60), 'a'),
+                               (minutes(90), minutes(120), 'c') ])
+
+        self.assertEqual(guide.between(minutes(30), minutes(100)), [ 'a', 'b', 'c' ])
+        self.assertEqual(guide.between(minutes(60), minutes(90)), [ 'b' ])
+        self.assertEqual(guide.between(None, minutes(60)), [ 'a' ])
+        self.assertEqual(guide.between(minutes(90), None), [ 'c' ])
+        self.assertEqual(guide.at(minutes(60)), 'b')
+        self.assertEqual(guide.at(minutes(120)), None)
+        self.assertEqual(guide.at(minutes(-1)), None)
+
+    def test_matches_a_scan_with_overlapping_entries(self):
+        generator = random.Random(0)
+        for trial in range(50):
+            entries = []
+            for n in range(generator.randint(0, 30)):
+                start = generator.randint(0, 200)
+                entries.append((start, start + generator.randint(1, 60), n))
+            guide = ChannelGuide(entries)
+            ordered = sorted(entries, key=lambda entry : entry[0])
+
+            for query in range(20):
+                (start, end) = sorted([ generator.randint(-10, 270), generator.randint(-10, 270) ])
+                self.assertEqual(sorted(guide.between(start, end)),
+                                 sorted([ entry[2] for entry in ordered if entry[1] > start and entry[0] < end ]))
+
+                showing = [ entry for entry in ordered if entry[0] <= start < entry[1] ]
+                if showing:
+                    self.assertTrue(guide.at(start) in [ entry[2] for entry in showing if entry[0] == showing[-1][0] ])
+                else:
+                    self.assertEqual(guide.at(start), None)
+
+
+class GuideIndexTest(unittest.TestCase):
+
+    def test_sync_reports_changed_channels(self):
+        index = GuideIndex()
+        self.assertFalse(index.loaded)
+
+        self.assertEqual(sorted(index.sync([ ('s1', minutes(0), minutes(30), 'a'),
+                                             ('s2', minutes(0), minutes(30), 'b') ])), [ 's1', 's2' ])
+        self.assertTrue(index.loaded)
+
+        self.assertEqual(index.sync([ ('s1', minutes(0), minutes(30), 'a2'),
+                                      ('s2', minutes(0), minutes(30), 'b') ]), [])
+        self.assertEqual(index.at('s1', minutes(10)), 'a2')
+
+        self.assertEqual(sorted(index.sync([ ('s1', minutes(0), minutes(45), 'a'),
+                                             ('s3', minutes(0), minutes(30), 'c') ])), [ 's1', 's2', 's3' ])
+        self.assertEqual(index.between('s2'), [])
+
+    def test_readers_keep_the_guide_they_picked_up(self):
+        index = GuideIndex()
+        index.sync([ ('s1', minutes(0), minutes(30), 'old') ])
+        guide = index.channel('s1')
+
+        index.sync([ ('s1', minutes(0), minutes(30), 'new') ])
+
+        self.assertEqual(guide.between(), [ 'old' ])
+        self.assertEqual(index.between('s1'), [ 'new' ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+# MythTV Universal Control Server - Id Index Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import threading
+
+from UniversalControl_MythTV.IdIndex import IdIndex
+
+
+class IdIndexTest(unittest.TestCase):
+
+    def payloads(self, records):
+        return sorted([ record.payload for record in records ])
+
+    def test_find_by_kind(self):
+        index = IdIndex()
+        index.sync('guide', [ (1, 's1', { 'global-content-id' : 'crid://a', 'global-series-id' : 'crid://s' }, 'one'),
+                              (2, 's2', { 'global-content-id' : 'crid://b', 'global-series-id' : 'crid://s' }, 'two'),
+                              (3, 's2', { 'global-content-id' : None, 'other' : 'crid://a' }, 'three') ])
+
+        self.assertEqual(self.payloads(index.find('global-content-id', 'crid://a')), [ 'one' ])
+        self.assertEqual(self.payloads(index.find('global-series-id', 'crid://s')), [ 'one', 'two' ])
+        self.assertEqual(index.find('global-series-id', 'crid://a'), [])
+        self.assertEqual(index.find('other', 'crid://a'), [])
+        self.assertEqual(index.records[3].ids, {})
+
+    def test_groups(self):
+        index = IdIndex()
+        index.sync('guide',   [ (1, 's1', { 'global-app-id' : 'app' }, 'guide') ])
+        index.sync('storage', [ (2, 's1', { 'global-app-id' : 'app' }, 'storage') ])
+
+        self.assertEqual(self.payloads(index.find('global-app-id', 'app')), [ 'guide', 'storage' ])
+        self.assertEqual(self.payloads(index.find('global-app-id', 'app', groups=[ 'storage' ])), [ 'storage' ])
+
+        index.sync('storage', [])
+        self.assertEqual(self.payloads(index.find('global-app-id', 'app')), [ 'guide' ])
+        self.assertEqual(len(index), 1)
+
+    def test_sync_only_counts_changes(self):
+        index = IdIndex()
+        self.assertEqual(index.sync('guide', [ (1, 's1', { 'series-id' : 'x' }, 'old') ]), 1)
+        self.assertEqual(index.sync('guide', [ (1, 's1', { 'series-id' : 'x' }, 'new') ]), 0)
+        self.assertEqual(self.payloads(index.find('series-id', 'x')), [ 'new' ])
+
+        self.assertEqual(index.sync('guide', [ (1, 's1', { 'series-id' : 'y' }, 'new') ]), 1)
+        self.assertEqual(index.find('series-id', 'x'), [])
+        self.assertEqual(index.postings.keys(), [ ('series-id', 'y') ])
+
+    def test_key_moving_between_groups(self):
+        index = IdIndex()
+        index.sync('guide',   [ (1, 's1', { 'series-id' : 'x' }, 'guide') ])
+        index.sync('storage', [ (1, 's1', { 'series-id' : 'x' }, 'storage') ])
+
+        self.assertEqual([ (record.group, record.payload) for record in index.find('series-id', 'x') ], [ ('storage', 'storage') ])
+
+    def test_concurrent_sync_and_find(self):
+        index  = IdIndex()
+        errors = []
+        stop   = threading.Event()
+
+        def find():
+            try:
+                while not stop.is_set():
+                    for record in index.find('series-id', 'x'):
+                        self.assertEqual(record.ids['series-id'], 'x')
+            except Exception as e:
+                errors.append(e)
+
+        threads = [ threading.Thread(target=find) for n in range(4) ]
+        for thread in threads:
+            thread.start()
+        for n in range(200):
+            index.sync('guide', [ (k, 's1', { 'series-id' : 'x' if (k + n) % 2 else 'y' }, k) for k in range(20) ])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(index.find('series-id', 'x')), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# MythTV Universal Control Server - NetVision Catalogue Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import threading
+
+from UniversalControl_MythTV.EPGMirror import ArticleRow
+from UniversalControl_MythTV.NetVisionCatalogue import NetVisionCatalogue
+
+
+def article(feed, url, title):
+    return ArticleRow(url=url, feedtitle=feed, title=title)
+
+
+class NetVisionCatalogueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.made = []
+        self.catalogue = NetVisionCatalogue(self.programme,
+                                            lambda title : title.lower(),
+                                            lambda url : url.rsplit('/', 1)[-1])
+
+    def programme(self, article):
+        self.made.append(article.url)
+        return { 'title' : article.title }
+
+    def titles(self, feed):
+        return [ programme['title'] for programme in self.catalogue.programmes(feed) ]
+
+    def test_feeds_in_article_order(self):
+        self.assertEqual(self.catalogue.sync([ article('A', 'http://a/2', 'Two'),
+                                               article('A', 'http://a/1', 'One'),
+                                               article('B', 'http://b/1', 'Other one'),
+                                               article('A', 'http://a/2', 'Duplicate') ]), 3)
+
+        self.assertEqual(len(self.catalogue), 3)
+        self.assertEqual(self.titles('a'), [ 'Two', 'One' ])
+        self.assertEqual(self.titles('c'), [])
+        self.assertEqual([ (feed, cid) for (feed, cid, programme) in self.catalogue.items() ], [ ('a', '2'), ('a', '1'), ('b', '1') ])
+
+    def test_article_lookup(self):
+        self.catalogue.sync([ article('A', 'http://a/1', 'One'), article('B', 'http://b/1', 'Other one') ])
+
+        self.assertEqual(self.catalogue.article('1').title, 'One')
+        self.assertEqual(self.catalogue.article('1', feed='b').title, 'Other one')
+        self.assertEqual(self.catalogue.article('2'), None)
+        self.assertEqual(self.catalogue.article('1', feed='c'), None)
+
+    def test_only_new_and_changed_articles_are_made(self):
+        self.catalogue.sync([ article('A', 'http://a/1', 'One'), article('A', 'http://a/2', 'Two') ])
+        kept = self.catalogue.programmes('a')[0]
+        del self.made[:]
+
+        self.assertEqual(self.catalogue.sync([ article('A', 'http://a/1', 'One'),
+                                               article('A', 'http://a/3', 'Three') ]), 2)
+        self.assertEqual(self.made, [ 'http://a/3' ])
+        self.assertTrue(self.catalogue.programmes('a')[0] is kept)
+
+        self.assertEqual(self.catalogue.sync([ article('A', 'http://a/1', 'One again'),
+                                               article('A', 'http://a/3', 'Three') ]), 1)
+        self.assertEqual(self.titles('a'), [ 'One again', 'Three' ])
+        self.assertEqual(self.catalogue.sync([]), 2)
+        self.assertEqual(len(self.catalogue), 0)
+
+    def test_readers_see_whole_syncs(self):
+        errors = []
+        stop   = threading.Event()
+
+        def read():
+            try:
+                while not stop.is_set():
+                    self.assertTrue(self.titles('a') in ([], [ 'One', 'Two' ], [ 'Three' ]))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [ threading.Thread(target=read) for n in range(4) ]
+        for thread in threads:
+            thread.start()
+        for n in range(200):
+            if n % 2:
+                self.catalogue.sync([ article('A', 'http://a/1', 'One'), article('A', 'http://a/2', 'Two') ])
+            else:
+                self.catalogue.sync([ article('A', 'http://a/3', 'Three') ])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+# MythTV Universal Control Server - Playhead Tracker Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import datetime
+
+from UniversalControl_MythTV.PlayheadTracker import PlayheadTracker
+
+
+T = datetime.datetime(2011, 6, 1, 12, 0, 0)
+
+def later(seconds):
+    return T + datetime.timedelta(seconds=seconds)
+
+
+class PlayheadTrackerTest(unittest.TestCase):
+
+    def tracker(self):
+        return PlayheadTracker(tolerance=1.0, shortest=1.0, longest=30.0, idle=5.0)
+
+    def test_idle(self):
+        tracker = self.tracker()
+        self.assertEqual(tracker.interval(), 5.0)
+        self.assertEqual(tracker.predict(T), None)
+        self.assertEqual(tracker.bound(), None)
+        self.assertTrue(tracker.due())
+
+    def test_prediction(self):
+        tracker = self.tracker()
+        self.assertEqual(tracker.observe('a', 'aposition', 100.0, 2.0, T), None)
+        self.assertEqual(tracker.predict(later(10)), 120.0)
+
+        tracker.observe('b', 'rposition', -50.0, 1.0, T)
+        self.assertEqual(tracker.predict(later(10)), -50.0)
+
+    def test_exact_model_checks_least_often(self):
+        tracker = self.tracker()
+        tracker.observe('a', 'aposition', 0.0, 1.0, T)
+        self.assertEqual(tracker.observe('a', 'aposition', 10.0, 1.0, later(10)), 0.0)
+        self.assertEqual(tracker.interval(), 30.0)
+        self.assertFalse(tracker.due())
+
+    def test_drift_shortens_the_interval(self):
+        tracker = self.tracker()
+        tracker.observe('a', 'aposition', 0.0, 1.0, T)
+        tracker.observe('a', 'aposition', 10.5, 1.0, later(10))
+
+        self.assertAlmostEqual(tracker.rate, 0.025)
+        self.assertAlmostEqual(tracker.interval(), 30.0)
+        tracker.observe('a', 'aposition', 21.5, 1.0, later(20))
+        self.assertAlmostEqual(tracker.rate, 0.0625)
+        self.assertAlmostEqual(tracker.interval(), 16.0)
+        self.assertAlmostEqual(tracker.bound(), 1.0)
+
+    def test_jump(self):
+        tracker = self.tracker()
+        tracker.observe('a', 'aposition', 0.0, 1.0, T)
+        self.assertEqual(tracker.observe('a', 'aposition', 300.0, 1.0, later(10)), 290.0)
+
+        self.assertEqual(tracker.jumps, 1)
+        self.assertEqual(tracker.rate, 0.0)
+        self.assertEqual(tracker.interval(), 1.0)
+        self.assertEqual(tracker.bound(), 1.0)
+
+        tracker.observe('a', 'aposition', 301.0, 1.0, later(11))
+        self.assertEqual(tracker.interval(), 30.0)
+
+    def test_new_model_on_change(self):
+        tracker = self.tracker()
+        tracker.observe('a', 'aposition', 0.0, 1.0, T)
+        tracker.observe('a', 'aposition', 10.5, 1.0, later(10))
+
+        self.assertEqual(tracker.observe('a', 'aposition', 500.0, 0.0, later(11)), None)
+        self.assertEqual(tracker.rate, 0.0)
+        self.assertEqual(tracker.interval(), 30.0)
+        self.assertEqual(tracker.predict(later(100)), 500.0)
+        self.assertEqual(tracker.observe('b', 'aposition', 0.0, 0.0, later(12)), None)
+
+    def test_forget(self):
+        tracker = self.tracker()
+        tracker.observe('a', 'aposition', 0.0, 1.0, T)
+        tracker.forget()
+
+        self.assertEqual(tracker.interval(), 5.0)
+        self.assertEqual(tracker.checks, 2)
+        self.assertEqual(tracker.observe('a', 'aposition', 10.0, 1.0, later(10)), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# MythTV Universal Control Server - Query Compiler Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import datetime
+
+from UniversalControl_MythTV.EPGMirror import EPGMirror
+from UniversalControl_MythTV.QueryCompiler import QueryCompiler
+
+from test_epgmirror import Backend, NOW, hours
+
+
+CATEGORIES = { 'Movie' : ('mov', 'Movie'),
+               'News'  : ('new', 'News and Factual'),
+               'Arts/Culture' : ('new', 'News and Factual'), }
+
+
+class QueryCompilerTest(unittest.TestCase):
+
+    def setUp(self):
+        backend = Backend()
+        backend.add(1001, hours(0), 1, 'News', description='Headlines', category='News', programid='p1')
+        backend.add(1001, hours(1), 1, 'Film', description='A western', category='Movie', programid='p2', seriesid='s2')
+        backend.add(1002, hours(0), 1, 'Gallery', description='News from the art world', category='Arts/Culture')
+        backend.add(1002, hours(1), 1, 'Film club', category='Movie', programid='')
+        backend.add(1003, hours(0), 2, 'Late news', category='News', programid='p5')
+        self.mirror = EPGMirror(backend, days=1)
+        self.mirror.sync(NOW)
+        self.compiler = QueryCompiler(CATEGORIES)
+
+    def titles(self, params, chanids=None, timecorrect=datetime.timedelta(0)):
+        (rows, more) = self.compiler.compile(dict({ 'results' : 10, 'offset' : 0 }, **params), chanids, timecorrect).execute(self.mirror)
+        return ([ row.title for row in rows ], more)
+
+    def test_unfiltered_in_start_order(self):
+        self.assertEqual(self.titles({}), ([ 'News', 'Gallery', 'Late news', 'Film', 'Film club' ], False))
+
+    def test_uncompilable_parameters(self):
+        self.assertEqual(self.compiler.compile({ 'cid' : [ 'x' ], 'results' : 1 }), None)
+        self.assertEqual(self.compiler.compile({ 'series-id' : [ 'x' ], 'results' : 1 }), None)
+
+    def test_paging(self):
+        self.assertEqual(self.titles({ 'results' : 2 }), ([ 'News', 'Gallery' ], True))
+        self.assertEqual(self.titles({ 'results' : 2, 'offset' : 4 }), ([ 'Film club' ], False))
+
+        query = self.compiler.compile({ 'results' : 2, 'offset' : 0 })
+        (rows, more) = query.execute(self.mirror)
+        (rows, more) = query.after(rows[-1]).execute(self.mirror)
+        self.assertEqual(([ row.title for row in rows ], more), ([ 'Late news', 'Film' ], True))
+
+    def test_filters(self):
+        self.assertEqual(self.titles({}, chanids=[ 1002 ])[0], [ 'Gallery', 'Film club' ])
+        self.assertEqual(self.titles({ 'category' : [ 'new' ] })[0], [ 'News', 'Gallery', 'Late news' ])
+        self.assertEqual(self.titles({ 'category' : [ 'xxx' ] })[0], [])
+        self.assertEqual(self.titles({ 'AV' : False })[0], [])
+        self.assertEqual(self.titles({ 'start' : hours(1.5), 'end' : hours(2) })[0], [ 'Late news', 'Film', 'Film club' ])
+
+    def test_global_ids_keep_programmes_without_them(self):
+        self.assertEqual(self.titles({ 'gcid' : [ 'crid://p2' ] })[0], [ 'Gallery', 'Film', 'Film club' ])
+        self.assertEqual(self.titles({ 'gsid' : [ 'crid://s2' ] })[0], [ 'News', 'Gallery', 'Late news', 'Film', 'Film club' ])
+        self.assertEqual(self.titles({ 'gcid' : [ 'dvb://x' ] })[0], [ 'Gallery', 'Film club' ])
+
+    def test_text(self):
+        self.assertEqual(self.titles({ 'text' : [ 'news' ] })[0], [ 'News', 'Gallery', 'Late news' ])
+        self.assertEqual(self.titles({ 'text' : [ 'news' ], 'field' : [ 'title' ] })[0], [ 'News', 'Late news' ])
+        self.assertEqual(self.titles({ 'text' : [ 'film', 'club' ] })[0], [ 'Film club' ])
+
+    def test_timecorrect(self):
+        self.assertEqual(self.titles({ 'start' : hours(2.5), 'end' : hours(3) }, timecorrect=datetime.timedelta(hours=1))[0],
+                         [ 'Late news', 'Film', 'Film club' ])
+
+
+if __name__ == "__main__":
+    unittest.main()
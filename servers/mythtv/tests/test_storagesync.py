@@ -0,0 +1,86 @@
+# MythTV Universal Control Server - Storage Sync Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import datetime
+
+from UniversalControl_MythTV.StorageSync import StorageSync
+
+
+T = datetime.datetime(2011, 6, 1, 12, 0)
+
+def minutes(n):
+    return T + datetime.timedelta(minutes=n)
+
+
+class StorageSyncTest(unittest.TestCase):
+
+    def entries(self, items, built):
+        def make(key):
+            def call():
+                built.append(key)
+                return 'item %s' % (key,)
+            return call
+        return [ (key, fingerprint, make(key)) for (key, fingerprint) in items ]
+
+    def test_only_new_and_changed_items_are_built(self):
+        sync  = StorageSync()
+        built = []
+
+        self.assertEqual(sync.update(self.entries([ ('a', 1), ('b', 1) ], built)), ({ 'a' : 'item a', 'b' : 'item b' }, []))
+        self.assertEqual(sync.update(self.entries([ ('a', 1), ('b', 2), ('c', 1) ], built)), ({ 'b' : 'item b', 'c' : 'item c' }, []))
+
+        (changed, removed) = sync.update(self.entries([ ('b', 2) ], built))
+        self.assertEqual((changed, sorted(removed)), ({}, [ 'a', 'c' ]))
+        self.assertEqual(sorted(built), [ 'a', 'b', 'b', 'c' ])
+
+        self.assertEqual(sync.update(self.entries([ ('a', 1), ('b', 2) ], built)), ({ 'a' : 'item a' }, []))
+
+    def test_item_which_fails_to_build_is_retried(self):
+        sync = StorageSync()
+
+        def fail():
+            raise ValueError("cannot build")
+
+        self.assertRaises(ValueError, sync.update, [ ('a', 1, fail) ])
+        self.assertEqual(sync.update([ ('a', 1, lambda : 'item a') ]), ({ 'a' : 'item a' }, []))
+
+    def test_stale(self):
+        sync = StorageSync(full_period=datetime.timedelta(hours=1))
+        self.assertTrue(sync.stale((10, T), T))
+
+        sync.synced((10, T), T)
+        self.assertFalse(sync.stale((10, T), minutes(30)))
+        self.assertTrue(sync.stale((11, T), minutes(30)))
+        self.assertTrue(sync.stale(None, minutes(30)))
+        self.assertTrue(sync.stale((10, T), minutes(60)))
+
+    def test_left_out_item_forces_a_sync_when_due(self):
+        sync = StorageSync()
+        sync.synced((10, T), T, recheck=minutes(10))
+
+        self.assertFalse(sync.stale((10, T), minutes(9)))
+        self.assertTrue(sync.stale((10, T), minutes(10)))
+
+        sync.synced((10, T), minutes(10))
+        self.assertFalse(sync.stale((10, T), minutes(20)))
+
+
+if __name__ == "__main__":
+    unittest.main()
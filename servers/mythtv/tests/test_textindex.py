@@ -0,0 +1,134 @@
+# MythTV Universal Control Server - Text Index Tests
+# Copyright (C) 2011 British Broadcasting Corporation
+#
+# Contributors: See Contributors File
+#
+#   This program is free software; you can redistribute it and/or modify
+#   it under the terms of the GNU General Public License as published by
+#   the Free Software Foundation; you may use version 2 of the licsense only
+#
+#   This program is distributed in the hope that it will be useful,
+#   but WITHOUT ANY WARRANTY; without even the implied warranty of
+#   MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#   GNU General Public License for more details.
+#
+#   You should have received a copy of the GNU General Public License along
+#   with this program; if not, write to the Free Software Foundation, Inc.,
+#   51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
+#
+
+import unittest
+import threading
+import datetime
+
+from UniversalControl_MythTV import TextIndex as TextIndexModule
+from UniversalControl_MythTV.TextIndex import TextIndex, tokenise
+
+
+T = datetime.datetime(2011, 6, 1, 12, 0)
+
+def hours(n):
+    return datetime.timedelta(hours=n)
+
+def entry(key, title, synopsis='', sid='s1', start=None, length=1):
+    end = (start + hours(length)) if start is not None else None
+    return (key, sid, key, title, synopsis, start, end, 'payload %s' % (key,))
+
+
+class TextIndexTest(unittest.TestCase):
+
+    def keys(self, documents):
+        return sorted([ document.key for document in documents ])
+
+    def test_tokenise(self):
+        self.assertEqual(tokenise('Doctor Who: the_end (2011)'), frozenset([ u'DOCTOR', u'WHO', u'THE', u'END', u'2011' ]))
+        self.assertEqual(tokenise(None), frozenset())
+
+    def test_sync_only_counts_changes(self):
+        index = TextIndex()
+        self.assertEqual(index.sync('guide', [ entry(1, 'News'), entry(2, 'Weather') ]), 2)
+        self.assertEqual(index.sync('guide', [ entry(1, 'News'), entry(2, 'Weather') ]), 0)
+        self.assertEqual(index.sync('guide', [ entry(1, 'News at Ten') ]), 2)
+        self.assertEqual(len(index), 1)
+
+    def test_substring_search(self):
+        index = TextIndex()
+        index.sync('guide', [ entry(1, 'Newsnight', 'Politics'),
+                              entry(2, 'Weather', 'Forecast for the news'),
+                              entry(3, 'Film', 'Drama') ])
+
+        self.assertEqual(self.keys(index.search([ 'news' ])), [ 1, 2 ])
+        self.assertEqual(self.keys(index.search([ 'ews' ], fields=('title',))), [ 1 ])
+        self.assertEqual(self.keys(index.search([ 'news drama' ])), [])
+        self.assertEqual(self.keys(index.search([ 'am' ])), [ 3 ])
+
+    def test_search_sees_words_added_and_removed_by_sync(self):
+        index = TextIndex()
+        index.sync('guide', [ entry(1, 'Newsnight') ])
+        self.assertEqual(self.keys(index.search([ 'night' ])), [ 1 ])
+
+        index.sync('guide', [ entry(1, 'Breakfast') ])
+        self.assertEqual(self.keys(index.search([ 'night' ])), [])
+        self.assertEqual(self.keys(index.search([ 'fast' ])), [ 1 ])
+
+        index.sync('guide', [ entry(1, 'Newsnight'), entry(2, 'Breakfast') ])
+        self.assertEqual(self.keys(index.search([ 'night' ])), [ 1 ])
+        self.assertEqual(self.keys(index.search([ 'fast' ])), [ 2 ])
+
+    def test_facets(self):
+        index = TextIndex()
+        index.sync('guide',   [ entry(1, 'News', sid='s1', start=T),
+                                entry(2, 'News', sid='s2', start=T + hours(5)) ])
+        index.sync('storage', [ entry(3, 'News', sid='s1') ])
+
+        self.assertEqual(self.keys(index.search([ 'news' ], groups=[ 'guide' ])), [ 1, 2 ])
+        self.assertEqual(self.keys(index.search([ 'news' ], sids=[ 's1' ])), [ 1, 3 ])
+        self.assertEqual(self.keys(index.search([ 'news' ], start=T + hours(2))), [ 2, 3 ])
+        self.assertEqual(self.keys(index.search([ 'news' ], end=T + hours(2))), [ 1, 3 ])
+
+    def test_prefix_search_orders_by_distance_from_near(self):
+        index = TextIndex()
+        index.sync('guide', [ entry(1, 'News', start=T),
+                              entry(2, 'Newsround', start=T + hours(3)),
+                              entry(3, 'Newsnight', start=T + hours(1)),
+                              entry(4, 'Renew', start=T + hours(1)),
+                              entry(5, 'Newsreel') ])
+
+        for limit in (TextIndexModule.PREFIX_POSTINGS_LIMIT, 0):
+            saved = TextIndexModule.PREFIX_POSTINGS_LIMIT
+            TextIndexModule.PREFIX_POSTINGS_LIMIT = limit
+            try:
+                found = [ document.key for document in index.prefix_search([ 'new' ], near=T + hours(3)) ]
+            finally:
+                TextIndexModule.PREFIX_POSTINGS_LIMIT = saved
+            self.assertEqual(found, [ 2, 3, 1, 5 ])
+
+    def test_concurrent_sync_and_search(self):
+        index  = TextIndex()
+        errors = []
+        stop   = threading.Event()
+
+        def search():
+            try:
+                while not stop.is_set():
+                    for document in index.search([ 'ne' ]):
+                        self.assertTrue(u'NE' in ''.join(document.title))
+                    list(index.prefix_search([ 'n' ]))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [ threading.Thread(target=search) for n in range(4) ]
+        for thread in threads:
+            thread.start()
+        for n in range(50):
+            index.sync('guide', [ entry(k, 'News %d' % (n + k,), start=T + hours(k)) for k in range(n % 7, 20) ])
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.keys(index.search([ 'news' ])), range(49 % 7, 20))
+
+
+if __name__ == "__main__":
+    unittest.main()